@@ -0,0 +1,144 @@
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from munch import Munch
+
+import dref_parsing.parser_utils as pu
+from dref_parsing import tracing
+
+# ****************************************************************************************
+# PARSER BENCHMARK
+# ****************************************************************************************
+# Parses PDFs of a local corpus and compares the excerpts to the true ones
+# (Ops Learning dataset, see data/Ops_learning_Dataset_codes.feather).
+# For each document and in total it reports:
+#  - excerpts (Challenges and Lessons Learnt separately):
+#    exact, partial (start or substring match), missed (true not found), extra (parsed not in true)
+#  - sectors of exactly matched excerpts: ok / bad
+#  - wall time, time of each stage (spans of dref_parsing.tracing), 
+#    peak memory (of Python objects, by tracemalloc)
+# Pages of a PDF are extracted in the benchmark process (no page workers),
+# so that the memory of all the parsing is measured.
+# Report is a dict (json). Gates are thresholds on the totals, the report says if all of them passed.
+
+learnings = ['CH', 'LL']
+
+def read_true_excerpts(filename):
+    if str(filename).endswith('.feather'):
+        return pd.read_feather(filename)
+    return pd.read_csv(filename)
+
+count_keys = ['n_true', 'n_parsed', 'exact', 'partial', 'missed', 'extra', 'sector_ok', 'sector_bad']
+
+# Counts of excerpts comparison for one Learning
+def match_counts(match):
+    n_missed = len(match.missed)
+    return dict(n_true=match.nt, n_parsed=match.np,
+                exact=match.nexact, partial=match.n_notexact - n_missed,
+                missed=n_missed, extra=len(match.extra),
+                sector_ok=int(match.nsec_ok), sector_bad=int(match.nsec_bad))
+
+# Parse one PDF from disk and compare it with the true excerpts
+def benchmark_lead(q, lead, folder='', n=30, trace_memory=True):
+    result = dict(lead=lead, error=None)
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with tracing.new_trace(lead) as trace:
+        try:
+            PDFextras = pu.get_PDFextras([lead], Munch(), source='disk', folder=folder)
+            txt = pu.get_PDFtext_from_lead(lead, source='disk', folder=folder)
+            exs_parsed, _ = pu.get_CHLLs_from_text(txt, lead=lead, PDFextras=PDFextras)
+            with tracing.span('compare'):
+                for Learning in learnings:
+                    pp = pu.compare_CHs(q, exs_parsed, lead=lead, Learning=Learning, n=n)
+                    result[Learning] = match_counts(pu.assess_match_all(pp))
+        except Exception as e:
+            result['error'] = f'{type(e).__name__}: {e}'
+
+    result['seconds'] = time.perf_counter() - start
+    result['stages'] = trace.seconds
+    if trace_memory:
+        result['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+# Sum of document results
+def summarize(results):
+    ok = [r for r in results if r['error'] is None]
+    totals = dict(n_documents=len(results), n_errors=len(results)-len(ok))
+
+    for Learning in learnings:
+        counts = [r[Learning] for r in ok]
+        totals[Learning] = {key: sum(c[key] for c in counts) for key in count_keys}
+
+    n_true  = sum(totals[Learning]['n_true'] for Learning in learnings)
+    n_exact = sum(totals[Learning]['exact']  for Learning in learnings)
+    n_sec   = sum(totals[Learning]['sector_ok'] + totals[Learning]['sector_bad'] for Learning in learnings)
+    n_sec_ok= sum(totals[Learning]['sector_ok'] for Learning in learnings)
+    totals['exact_rate'] = n_exact / n_true if n_true else None
+    totals['sector_accuracy'] = n_sec_ok / n_sec if n_sec else None
+
+    totals['seconds'] = sum(r['seconds'] for r in results)
+    totals['seconds_per_document'] = totals['seconds'] / len(results) if results else None
+    totals['stages'] = {}
+    for r in results:
+        for stage, seconds in r['stages'].items():
+            totals['stages'][stage] = totals['stages'].get(stage, 0) + seconds
+    if results and 'peak_memory_mb' in results[0]:
+        totals['peak_memory_mb'] = max(r['peak_memory_mb'] for r in results)
+    return totals
+
+# Gates: name -> (key in totals, is threshold a minimum or a maximum)
+gate_keys = {'min_exact_rate':          ('exact_rate', 'min'),
+             'min_sector_accuracy':     ('sector_accuracy', 'min'),
+             'max_seconds_per_document':('seconds_per_document', 'max'),
+             'max_peak_memory_mb':      ('peak_memory_mb', 'max'),
+             'max_errors':              ('n_errors', 'max')}
+
+def check_gates(totals, thresholds):
+    gates = {}
+    for name, threshold in thresholds.items():
+        if threshold is None:
+            continue
+        key, kind = gate_keys[name]
+        value = totals.get(key)
+        if value is None:
+            passed = False
+        else:
+            passed = value >= threshold if kind == 'min' else value <= threshold
+        gates[name] = dict(value=value, threshold=threshold, passed=passed)
+    return gates
+
+# Runs the benchmark over all leads that have both a PDF in folder and true excerpts
+def run_benchmark(q, folder='', leads=None, limit=None, n=30, trace_memory=True, thresholds=None, verbose=True):
+    # stages are timed by tracing spans, even if tracing of the apps is switched off,
+    # pages are extracted without worker processes (their memory is not traced)
+    tracing_enabled, page_workers = tracing.tracing_enabled, pu.page_workers
+    tracing.tracing_enabled = True
+    pu.page_workers = 1
+    try:
+        leads_true = set(q['Lead Title'].unique())
+        if leads is None:
+            leads = pu.get_leads_from_folder(folder)
+        leads = [lead for lead in leads if lead in leads_true]
+        if limit is not None:
+            leads = leads[:limit]
+
+        results = []
+        for i, lead in enumerate(leads):
+            result = benchmark_lead(q, lead, folder=folder, n=n, trace_memory=trace_memory)
+            results.append(result)
+            if verbose:
+                status = result['error'] or ', '.join(f"{Learning}: {result[Learning]['exact']}/{result[Learning]['n_true']} exact"
+                                                      for Learning in learnings)
+                print(f"[{i+1}/{len(leads)}] {lead}: {status}, {result['seconds']:.1f}s", file=sys.stderr)
+    finally:
+        tracing.tracing_enabled, pu.page_workers = tracing_enabled, page_workers
+
+    totals = summarize(results)
+    gates = check_gates(totals, thresholds or {})
+    return dict(documents=results, totals=totals, gates=gates,
+                passed=all(gate['passed'] for gate in gates.values()))
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import dref_parsing.parser_utils as pu
+from dref_parsing import benchmark
+
+# ****************************************************************************************
+# COMMAND LINE INTERFACE
+# ****************************************************************************************
+# dref-parse batch MDRDO013 MDRBO014 --output parsed.csv
+# dref-parse batch --pdf-dir ../data/PDF-2020 --output parsed_2020 --format parquet
+# dref-parse batch --all --workers 8 --output all_drefs.csv
+# dref-parse batch MDRDO013 --workers 1 --page-workers 4 --output parsed.csv
+#
+# Documents are parsed in parallel worker processes. GO API data is downloaded
+# only once (in the main process) and given to every worker.
+# Results are written as soon as each document is parsed:
+#  - csv:     rows are appended to one file
+#  - parquet: one part file per document in the output folder
+#             (pd.read_parquet(folder) reads all of them)
+# Every processed document is recorded in the progress log <output>.progress.jsonl,
+# with the error if parsing failed. On restart, documents parsed successfully
+# are skipped, failed ones are retried. Rows of a document that was not recorded
+# (the run was killed in between) are removed from the csv output.
+
+
+# ****************************************************************************************
+# Documents to parse
+# ****************************************************************************************
+
+# Leads of all DREF Final Reports available in GO
+def get_leads_from_GO():
+    merged = pu.get_pdf_url('')
+    return list(merged.code.drop_duplicates())
+
+
+def read_leads_file(filename):
+    with open(filename) as f:
+        leads = [line.strip() for line in f]
+    return [lead for lead in leads if lead != '']
+
+
+# ****************************************************************************************
+# Parallel workers
+# ****************************************************************************************
+
+# Runs in each worker process: use GO API snapshot of the main process instead of downloading it.
+# Pages of a PDF are not split between processes any more, documents already are.
+def init_batch_worker(snapshot):
+    pu.set_GO_snapshot(snapshot)
+    pu.page_workers = 1
+
+
+# Parse one document. Errors are returned (not raised) to be written to the progress log
+def parse_lead(lead, source='api', folder=''):
+    start = time.perf_counter()
+    try:
+        all_parsed = pu.parse_PDF_combined(lead, source=source, folder=folder)
+        output = pu.format_parsed_output(all_parsed)
+        error = None
+    except Exception as e:
+        output = None
+        error = f'{type(e).__name__}: {e}'
+    return lead, output, error, time.perf_counter() - start
+
+
+# Parse all leads, yield results as soon as they are ready (in any order)
+def parse_leads(leads, source='api', folder='', n_workers=None):
+    snapshot = pu.get_GO_snapshot()
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    if n_workers <= 1:
+        for lead in leads:
+            yield parse_lead(lead, source=source, folder=folder)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_batch_worker,
+                             initargs=(snapshot,)) as executor:
+        futures = [executor.submit(parse_lead, lead, source=source, folder=folder) for lead in leads]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+# ****************************************************************************************
+# Incremental output
+# ****************************************************************************************
+
+class BatchOutput:
+    "Writes results of the batch parsing document by document, keeps the progress log"
+
+    def __init__(self, output, fmt='csv'):
+        self.output = output
+        self.fmt = fmt
+        self.progress_file = output.rstrip('/\\') + '.progress.jsonl'
+        if fmt == 'parquet':
+            os.makedirs(output, exist_ok=True)
+
+    # Leads that were already parsed successfully.
+    # csv rows written after the last recorded lead (the previous run was killed in between)
+    # are dropped, these leads are parsed again
+    def done_leads(self):
+        done = set()
+        if not os.path.exists(self.progress_file):
+            open(self.progress_file, 'a').close()
+            return done
+        csv_size = 0
+        with open(self.progress_file) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may be cut if the previous run was killed
+                    continue
+                if record['error'] is None:
+                    done.add(record['lead'])
+                # progress logs of older versions don't know the size
+                csv_size = record.get('csv_size')
+        if self.fmt == 'csv' and csv_size is not None and os.path.exists(self.output) \
+                and os.path.getsize(self.output) > csv_size:
+            with open(self.output, 'r+') as f:
+                f.truncate(csv_size)
+        return done
+
+    # Start from scratch: remove the output and the progress log of previous runs
+    def clear(self):
+        if self.fmt == 'csv':
+            files = [self.output]
+        else:
+            files = glob.glob(os.path.join(self.output, '*.parquet'))
+            files += glob.glob(os.path.join(self.output, '.*.parquet.tmp'))
+        for filename in files + [self.progress_file]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def write(self, lead, output, error, seconds):
+        csv_size = None
+        if self.fmt == 'csv':
+            with open(self.output, 'a', newline='', encoding='utf-8') as f:
+                if output is not None:
+                    output.to_csv(f, header=f.tell() == 0, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+                csv_size = os.fstat(f.fileno()).st_size
+        else:
+            part_file = os.path.join(self.output, f'{lead}.parquet')
+            if output is not None:
+                # written under a hidden name first, read_parquet(folder) never sees a partial file
+                tmp_file = os.path.join(self.output, f'.{lead}.parquet.tmp')
+                output.reset_index(drop=True).to_parquet(tmp_file, index=False)
+                os.replace(tmp_file, part_file)
+            elif os.path.exists(part_file):
+                os.remove(part_file)
+
+        # progress is written after the results are on disk,
+        # so a lead that is marked as done always has its results in the output.
+        # For csv the size of the output is recorded, to drop later rows on resume
+        record = dict(lead=lead, n_excerpts=0 if output is None else len(output),
+                      error=error, seconds=round(seconds, 2))
+        if csv_size is not None:
+            record['csv_size'] = csv_size
+        with open(self.progress_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# Parse documents and write results, skipping the ones done in previous runs.
+# Without resume, the output of previous runs is replaced
+def run_batch(leads, output, fmt='csv', source='api', folder='', n_workers=None, resume=True):
+    writer = BatchOutput(output, fmt=fmt)
+    if not resume:
+        writer.clear()
+    done = writer.done_leads()
+    todo = [lead for lead in dict.fromkeys(leads) if lead not in done]
+    print(f'{len(todo)} documents to parse ({len(done)} already done)')
+
+    n_errors = 0
+    results = parse_leads(todo, source=source, folder=folder, n_workers=n_workers)
+    for i, (lead, parsed, error, seconds) in enumerate(results):
+        writer.write(lead, parsed, error, seconds)
+        if error is None:
+            print(f'[{i+1}/{len(todo)}] {lead}: {len(parsed)} excerpts, {seconds:.1f}s')
+        else:
+            n_errors += 1
+            print(f'[{i+1}/{len(todo)}] {lead}: ERROR {error}')
+
+    print(f'Done: {len(todo)-n_errors} parsed, {n_errors} errors (see {writer.progress_file})')
+    return n_errors
+
+
+# ****************************************************************************************
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='dref-parse', description='Parsing PDFs of DREF Final Reports')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch = subparsers.add_parser('batch', help='Parse many DREF Final Reports in parallel')
+    batch.add_argument('leads', nargs='*', help='Appeal codes (MDR*****) of the reports')
+    batch.add_argument('--leads-file', help='File with appeal codes, one per line')
+    batch.add_argument('--pdf-dir', help='Parse all PDF files from this folder (named by appeal codes) '
+                                         'instead of downloading them from GO')
+    batch.add_argument('--all', action='store_true', help='Parse all DREF Final Reports available in GO')
+    batch.add_argument('-o', '--output', required=True,
+                       help='Output csv file, or output folder for parquet')
+    batch.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                       help='Output format (default: parquet if output ends with .parquet, otherwise csv)')
+    batch.add_argument('-j', '--workers', type=int, default=None,
+                       help='Number of worker processes (default: number of CPUs)')
+    batch.add_argument('--page-workers', type=int, default=None,
+                       help='Number of processes extracting the pages of a large PDF, '
+                            'used when documents are parsed one by one (--workers 1)')
+    batch.add_argument('--no-resume', action='store_true',
+                       help='Parse all documents again, replacing the output and progress log of previous runs')
+
+    bench = subparsers.add_parser('benchmark', help='Compare parsed excerpts to the true ones, measure time and memory')
+    bench.add_argument('leads', nargs='*', help='Appeal codes to use (default: all PDFs of the folders)')
+    bench.add_argument('--pdf-dir', action='append',
+                       help='Folder with PDFs named by appeal codes, can be given several times '
+                            '(default: all_pdf_folders of parser_utils)')
+    bench.add_argument('--truth', default='data/Ops_learning_Dataset_codes.feather',
+                       help='True excerpts (feather or csv file of the Ops Learning dataset)')
+    bench.add_argument('--limit', type=int, default=None, help='Use only the first LIMIT documents')
+    bench.add_argument('-o', '--output', help='Output json file (default: print to stdout)')
+    bench.add_argument('--no-memory', action='store_true',
+                       help="Don't measure peak memory (tracemalloc slows down parsing)")
+    bench.add_argument('--min-exact-rate', type=float, help='Gate: minimum share of exactly parsed true excerpts')
+    bench.add_argument('--min-sector-accuracy', type=float, help='Gate: minimum share of correct sectors')
+    bench.add_argument('--max-seconds-per-document', type=float, help='Gate: maximum mean time per document')
+    bench.add_argument('--max-peak-memory-mb', type=float, help='Gate: maximum peak memory of a document')
+    bench.add_argument('--max-errors', type=int, help='Gate: maximum number of documents that failed')
+    return parser
+
+
+def run_batch_command(parser, args):
+    leads = list(args.leads)
+    if args.leads_file:
+        leads += read_leads_file(args.leads_file)
+    if args.pdf_dir:
+        leads += pu.get_leads_from_folder(args.pdf_dir)
+    if args.all:
+        leads += get_leads_from_GO()
+    if len(leads) == 0:
+        parser.error('no documents to parse: give appeal codes, --leads-file, --pdf-dir or --all')
+
+    if args.page_workers is not None:
+        pu.page_workers = args.page_workers
+
+    fmt = args.format
+    if fmt is None:
+        fmt = 'parquet' if args.output.rstrip('/\\').endswith('.parquet') else 'csv'
+
+    n_errors = run_batch(leads, args.output, fmt=fmt,
+                         source='disk' if args.pdf_dir else 'api', folder=args.pdf_dir or '',
+                         n_workers=args.workers, resume=not args.no_resume)
+    return 1 if n_errors else 0
+
+
+def run_benchmark_command(parser, args):
+    q = benchmark.read_true_excerpts(args.truth)
+    thresholds = {name: getattr(args, name) for name in benchmark.gate_keys}
+    report = benchmark.run_benchmark(q, folder=args.pdf_dir or '', leads=args.leads or None,
+                                     limit=args.limit, trace_memory=not args.no_memory,
+                                     thresholds=thresholds)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for name, gate in report['gates'].items():
+        print(f"{name}: {gate['value']} ({'passed' if gate['passed'] else 'FAILED'}, threshold {gate['threshold']})",
+              file=sys.stderr)
+    return 0 if report['passed'] else 1
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'batch':
+        return run_batch_command(parser, args)
+    return run_benchmark_command(parser, args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
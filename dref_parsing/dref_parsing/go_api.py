@@ -0,0 +1,209 @@
+import os
+import asyncio
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from dref_parsing.tracing import span
+
+# ****************************************************************************************
+# IFRC GO API CLIENT
+# ****************************************************************************************
+# All requests to GO (and downloads of PDFs) go through one pooled HTTP session:
+#  - connections are kept alive and reused,
+#  - each request has a timeout,
+#  - failed requests (connection errors, 429 and 5xx) are retried with exponential backoff,
+#  - not more than max_concurrency requests run at the same time.
+# Results of API calls are fetched page by page: the first page gives the total count,
+# the other pages are fetched concurrently (by offsets) and merged in the original order.
+#
+# AsyncGOClient does the same with httpx (HTTP/2 if the package h2 is installed),
+# for fetching many pages or documents concurrently from async code.
+#
+# Settings are taken from the environment, so that the apps can be pointed
+# to a local stub server (GO_API_URL) e.g. for tests.
+
+go_api_url      = os.environ.get('GO_API_URL', 'https://goadmin.ifrc.org/api/v2/')
+go_timeout      = float(os.environ.get('GO_API_TIMEOUT', 60))
+go_retries      = int(os.environ.get('GO_API_RETRIES', 5))
+go_backoff      = float(os.environ.get('GO_API_BACKOFF', 0.5))
+go_concurrency  = int(os.environ.get('GO_API_CONCURRENCY', 4))
+go_page_size    = int(os.environ.get('GO_API_PAGE_SIZE', 5000))
+
+retry_statuses = [429, 500, 502, 503, 504]
+
+
+# HTTP session with a pool of kept-alive connections, retrying failed GET requests
+# (connection errors, 429 and 5xx) with exponential backoff.
+# Also used by the GO API client of ea_parsing
+def retrying_session(retries=None, backoff=None, pool_size=None):
+    retry = Retry(total=go_retries if retries is None else retries,
+                  backoff_factor=go_backoff if backoff is None else backoff,
+                  status_forcelist=retry_statuses, allowed_methods=['GET'],
+                  raise_on_status=False)
+    pool_size = pool_size or go_concurrency
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class GOClient:
+    "Pooled HTTP session for GO API calls and PDF downloads"
+
+    def __init__(self, base_url=None, timeout=None, retries=None, backoff=None,
+                 max_concurrency=None, page_size=None):
+        self.base_url = base_url or go_api_url
+        self.timeout = timeout or go_timeout
+        self.max_concurrency = max_concurrency or go_concurrency
+        self.page_size = page_size or go_page_size
+        self.session = retrying_session(retries, backoff, self.max_concurrency)
+
+    def get(self, url, params=None):
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def get_json(self, call, params=None):
+        return self.get(self.base_url + call + '/', params=params).json()
+
+    # Content of a document (e.g. PDF report)
+    def get_document(self, url):
+        with span('pdf_download'):
+            return self.get(url).content
+
+    # Download a document into a binary file, chunk by chunk (not keeping it in memory)
+    def download(self, url, file, chunk_size=2**20):
+        with span('pdf_download'):
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size):
+                    file.write(chunk)
+
+    # All results of API call (e.g. 'appeal'), fetching pages concurrently
+    def get_results(self, call, params=None):
+        with span('go_api'):
+            return self.get_all_pages(call, params=params)
+
+    def get_all_pages(self, call, params=None):
+        params = dict(params or {}, format='json', limit=self.page_size)
+        first = self.get_json(call, dict(params, offset=0))
+        results = list(first['results'])
+        if first.get('next') is None:
+            return results
+
+        offsets = page_offsets(first)
+        if offsets is None:
+            # total count (or page size) unknown: follow the pages one by one
+            url = first['next']
+            while url:
+                page = self.get(url).json()
+                results += page['results']
+                url = page['next']
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pages = executor.map(lambda offset: self.get_json(call, dict(params, offset=offset)), offsets)
+            for page in pages:
+                results += page['results']
+        return results
+
+
+# Offsets of the pages after the first one, None if total count is not given.
+# GO caps the limit of results per page, so the pages step by the number of results
+# the server returned on the first page, not by the limit asked for
+def page_offsets(first_page):
+    count = first_page.get('count')
+    page_size = len(first_page['results'])
+    if count is None or page_size == 0:
+        return None
+    return list(range(page_size, count, page_size))
+
+
+# ****************************************************************************************
+class AsyncGOClient:
+    "The same as GOClient, for async code (needs httpx)"
+
+    def __init__(self, base_url=None, timeout=None, retries=None, backoff=None,
+                 max_concurrency=None, page_size=None):
+        import httpx
+        self.base_url = base_url or go_api_url
+        self.retries = go_retries if retries is None else retries
+        self.backoff = go_backoff if backoff is None else backoff
+        self.page_size = page_size or go_page_size
+        self.max_concurrency = max_concurrency or go_concurrency
+        self.semaphore = None # created in the event loop, at the first request
+        self.client = httpx.AsyncClient(timeout=timeout or go_timeout,
+                                        http2=importlib.util.find_spec('h2') is not None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    # GET with retries: exponential backoff after connection errors, 429 and 5xx
+    async def get(self, url, params=None):
+        import httpx
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                async with self.semaphore:
+                    response = await self.client.get(url, params=params)
+                if (response.status_code not in retry_statuses) or last_attempt:
+                    response.raise_for_status()
+                    return response
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def get_json(self, call, params=None):
+        response = await self.get(self.base_url + call + '/', params=params)
+        return response.json()
+
+    async def get_document(self, url):
+        response = await self.get(url)
+        return response.content
+
+    # Contents of many documents, in the order of urls
+    async def get_documents(self, urls):
+        return await asyncio.gather(*[self.get_document(url) for url in urls])
+
+    async def get_results(self, call, params=None):
+        params = dict(params or {}, format='json', limit=self.page_size)
+        first = await self.get_json(call, dict(params, offset=0))
+        results = list(first['results'])
+        if first.get('next') is None:
+            return results
+
+        offsets = page_offsets(first)
+        if offsets is None:
+            url = first['next']
+            while url:
+                page = (await self.get(url)).json()
+                results += page['results']
+                url = page['next']
+            return results
+
+        pages = await asyncio.gather(*[self.get_json(call, dict(params, offset=offset)) for offset in offsets])
+        for page in pages:
+            results += page['results']
+        return results
+
+
+# ****************************************************************************************
+# Client shared by all calls of the process (created at the first call)
+go_client = None
+
+def get_client():
+    global go_client
+    if go_client is None:
+        go_client = GOClient()
+    return go_client
@@ -0,0 +1,91 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# ****************************************************************************************
+# STUB OF THE IFRC GO API
+# ****************************************************************************************
+# Local HTTP server answering API calls like GO, for tests of the GO API clients
+# of both apps (they can also be pointed to it with GO_API_URL):
+#
+#     with StubGOServer({'appeal': appeals}) as server:
+#         results = GOClient(base_url=server.base_url).get_results('appeal')
+#
+#  - results of a call (e.g. 'appeal') are filtered by query parameters named as
+#    fields of the records (e.g. code=MDRXX001), and paginated by limit & offset,
+#  - as GO, the server caps the limit at max_limit results per page,
+#  - the first failures requests fail with 503,
+#  - with no_count, pages don't give the total count,
+#  - paths ending with .pdf return a tiny PDF header.
+
+
+class StubGOHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server.stub
+        server.requests.append(self.path)
+        if server.failures > 0:
+            server.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        url = urlparse(self.path)
+        if url.path.endswith('.pdf'):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b'%PDF-1.4')
+            return
+
+        call = url.path.rstrip('/').split('/')[-1]
+        if call not in server.records:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        params = parse_qs(url.query)
+        results = [record for record in server.records[call]
+                   if all(str(record[key]) == values[0] for key, values in params.items() if key in record)]
+        limit = min(int(params.get('limit', [server.max_limit])[0]), server.max_limit)
+        offset = int(params.get('offset', [0])[0])
+        next_url = None
+        if offset + limit < len(results):
+            query = '&'.join(f'{key}={values[0]}' for key, values in params.items() if key not in ['limit', 'offset'])
+            next_url = f'http://{self.headers["Host"]}{url.path}?{query}&limit={limit}&offset={offset + limit}'
+
+        body = json.dumps({
+            'count': None if server.no_count else len(results),
+            'next': next_url,
+            'results': results[offset:offset + limit]
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubGOServer:
+    "GO API stub running in a background thread (context manager)"
+
+    def __init__(self, records, max_limit=5):
+        self.records = records
+        self.max_limit = max_limit
+        self.failures = 0
+        self.no_count = False
+        self.requests = []
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGOHandler)
+        self.server.stub = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}/api/v2/'
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
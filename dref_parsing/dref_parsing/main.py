@@ -1,13 +1,17 @@
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, BackgroundTasks
 
 from dref_parsing.parser_utils import *
+from dref_parsing.tracing import add_tracing
+from dref_parsing.outputs import OutputFormat, output_response
 
 
 app = FastAPI()
+add_tracing(app)
 
 
 @app.post("/parse/")
 async def run_parsing(
+    output_format: OutputFormat = Query(OutputFormat.json, description="Format of the output"),
     Appeal_code: str = Query(
         'MDRDO013',
         title="Appeal code",
@@ -19,7 +23,8 @@ async def run_parsing(
     <b>Input</b>: Appeal code of the report, MDR*****  
     <b>Output</b>:  
     &nbsp;&nbsp; a dictionary of excerpts extracted from the PDF with its features: 'Learning', 'DREF_Sector',  
-    &nbsp;&nbsp; and global features: 'Hazard', 'Country', 'Date', 'Region', 'Appeal code'
+    &nbsp;&nbsp; and global features: 'Hazard', 'Country', 'Date', 'Region', 'Appeal code'.  
+    &nbsp;&nbsp; Instead of json, the output can be streamed as csv, ndjson, Apache Arrow or Parquet (output_format)
 
     The app uses IFRC GO API to determine the global features (call 'appeal')  
     and to get the URL of the PDF report (call 'appeal_document')
@@ -48,9 +53,8 @@ async def run_parsing(
     except:
         raise HTTPException(status_code=500, detail="PDF Parsing didn't work by some reason")
 
-    df2 = all_parsed[['Modified Excerpt', 'Learning', 'DREF_Sector', 'lead', 'Hazard', 'Country', 'Date', 'Region']]#,'position', 'DREF_Sector_id']]
-    df2 = df2.rename(columns={'lead':'Appeal code','Modified Excerpt':'Excerpt'})
-    return df2.to_dict()
+    df2 = format_parsed_output(all_parsed)
+    return output_response(df2, output_format, filename=lead)
 
     # Other possible formats for output:
     return df2.to_csv(sep='|').split('\n')
@@ -60,20 +64,18 @@ async def run_parsing(
 
 
 @app.post("/refresh/")
-async def reload_GO_API_data():
-    try:
-        initialize_apdo(refresh=True)
-        initialize_aadf(refresh=True)
-
-        # NB: we need to do import again, 
-        # otherwise updated apdo, aadf won't be accessible here
-        # (even though they got updated in parser_utils)
-        from dref_parsing.parser_utils import apdo, aadf
-        output = f'GO API Reload: {len(aadf)} items in appeal, {len(apdo)} items in appeal_documents'
-        output += ' (only DREF Final Reports are selected)'
-    except:
-        raise HTTPException(status_code=500, detail="Error while accessing GO API data")
-    return output 
+async def reload_GO_API_data(background_tasks: BackgroundTasks, 
+    full: bool = Query(False, description="Download all GO data again, not only the records changed since the last sync")):
+    """
+    Sync data from GO database in background.
+    Only records changed since the last sync are downloaded (all of them if full=true).
+    Records deleted in GO are removed only by a full sync (full=true).
+    The output tells the result of the previous sync.
+    """
+    if GO_sync_status.running:
+        return 'GO API sync is already running. ' + GO_API_data_summary()
+    background_tasks.add_task(sync_GO_API_data, full=full)
+    return 'GO API sync started. ' + GO_API_data_summary()
 
     # Command to start API:
     # uvicorn main:app --reload
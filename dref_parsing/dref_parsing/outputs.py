@@ -0,0 +1,113 @@
+import io
+from enum import Enum
+
+from fastapi.responses import StreamingResponse
+
+# ****************************************************************************************
+# OUTPUT FORMATS OF THE APPS
+# ****************************************************************************************
+# Parsed (and tagged) excerpts are given back as
+#  - json:    dict of columns (df.to_dict()), as the apps always did,
+#  - csv:     csv file,
+#  - ndjson:  one json record per line,
+#  - arrow:   Apache Arrow IPC stream,
+#  - parquet: Parquet file.
+# All formats but json are serialized chunk by chunk (output_chunk_rows rows at a time)
+# and streamed, so the response starts before the whole output is serialized.
+# arrow & parquet need pyarrow.
+
+output_chunk_rows = 1000
+
+# This Enum class allows us to see a dropdown menu with possible choices
+class OutputFormat(str, Enum):
+    json = "json"
+    csv = "csv"
+    ndjson = "ndjson"
+    arrow = "arrow"
+    parquet = "parquet"
+
+media_types = {OutputFormat.csv:     'text/csv',
+               OutputFormat.ndjson:  'application/x-ndjson',
+               OutputFormat.arrow:   'application/vnd.apache.arrow.stream',
+               OutputFormat.parquet: 'application/vnd.apache.parquet'}
+
+
+def iter_chunks(df, chunk_rows=None):
+    if chunk_rows is None: chunk_rows = output_chunk_rows
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start+chunk_rows]
+
+def iter_csv(df):
+    # NB: comma as a separator works OK even if there exist commas in some excerpts
+    # since pandas is smart to insert quotes where needed
+    yield df.iloc[:0].to_csv(index=False, sep=',')
+    for chunk in iter_chunks(df):
+        yield chunk.to_csv(index=False, header=False, sep=',')
+
+def iter_ndjson(df):
+    for chunk in iter_chunks(df):
+        lines = chunk.to_json(orient='records', lines=True, force_ascii=False)
+        yield lines if lines.endswith('\n') else lines + '\n'
+
+
+class ChunkSink(io.RawIOBase):
+    "Binary file for writers of pyarrow: keeps written bytes until they are taken for streaming"
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    # position in the whole output (writers use it for offsets, e.g. in parquet footer)
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_arrow(df):
+    import pyarrow as pa
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in iter_chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.take()
+    yield sink.take()
+
+def iter_parquet(df):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        # each chunk is a row group
+        for chunk in iter_chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.take()
+    yield sink.take()
+
+output_writers = {OutputFormat.csv:     iter_csv,
+                  OutputFormat.ndjson:  iter_ndjson,
+                  OutputFormat.arrow:   iter_arrow,
+                  OutputFormat.parquet: iter_parquet}
+
+
+# Response of an app with df in the output format
+def output_response(df, output_format, filename='export'):
+    output_format = OutputFormat(output_format)
+    if output_format == OutputFormat.json:
+        return df.to_dict()
+
+    response = StreamingResponse(output_writers[output_format](df), media_type=media_types[output_format])
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}.{output_format.value}"
+    return response
@@ -1,19 +1,30 @@
 import pandas as pd
 import numpy as np
+import os
 import sys
 import io
 import glob
-import requests
+import itertools
+import threading
+import bisect
+import contextlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from ast import literal_eval
+from types import MappingProxyType
 
 import datetime
 import dateutil.parser 
 from munch import Munch
 
-import tika.parser
-import pdfminer.high_level
 from pdfminer.high_level import extract_pages
 from pdfminer.layout import LTTextContainer, LTImage, LTFigure, LTTextBox, LTTextBoxHorizontal
+from pdfminer.pdfpage import PDFPage
+
+from dref_parsing.text_extraction import extract_pdf_text, is_pdf_filename, as_pdf_stream, \
+                                         temporary_pdf_file, pdf_as_file
+from dref_parsing.tracing import span
+from dref_parsing.go_api import get_client
 
 pbflag = '!!!Page_Break!!!'
 all_bullets = ['•','●','▪','-']
@@ -23,9 +34,14 @@ all_pdf_folders = ['../data/PDF-2020',
                    '../data/PDF-new-template',
                    '../data/PDF-download-2021',
                    '../data/PDF-download-2020']
-                   
-aadf = pd.DataFrame()
-apdo = pd.DataFrame()
+
+# Number of processes used to extract page layouts of a PDF (1 = no parallel processing)
+# and the minimal number of pages for which it is worth starting the processes.
+# Off by default: the endpoints of the apps are async and run in the event loop of the server process,
+# so a pool per PDF would fork the whole server for every parsed document.
+# Enabled by DREF_PAGE_WORKERS or by the --page-workers option of the command line interface
+page_workers = int(os.environ.get('DREF_PAGE_WORKERS', 1))
+min_pages_parallel = 8
 
 
 class ExceptionNotInAPI(Exception):
@@ -34,6 +50,12 @@ class ExceptionNotInAPI(Exception):
 class ExceptionNoURLforPDF(Exception):
     "URL for PDF file is not available (with API appeal_document call)"
 
+class ExceptionNoPDFfile(Exception):
+    "PDF file for the lead is not found on disk"
+
+class ExceptionNoPDFextras(Exception):
+    "Header & footer (PDFextras) were not detected for the lead"
+
 # ****************************************************************************************
 # STRING OPERATIONS
 # ****************************************************************************************
@@ -201,7 +223,7 @@ def findall_patterns(patterns, s0, region=True, n=30, nback=-1, pattern2='', ign
 
 # Download PDF and optionally save to file
 def download_pdf(url, filename=''):
-    pdf_data = requests.get(url).content
+    pdf_data = get_client().get_document(url)
     if filename != '':
         with open(filename, 'wb') as handler:
             handler.write(pdf_data)
@@ -228,78 +250,190 @@ def filter_DREF_Final_Reports(df, names=DREF_Final_Report_names):
 
 
 # get all API results as a df
-def download_api_results(call='appeal'):
-    href = "https://goadmin.ifrc.org/api/v2/"+call+"/?format=json&limit=300000"
-    aa = requests.get(href).json()    
-    aadf = pd.DataFrame(aa['results'])
+# (pages of results are fetched concurrently, see go_api)
+def download_api_results(call='appeal', params=None):
+    aa = get_client().get_results(call, params=params)
+    aadf = pd.DataFrame(aa)
     return aadf
 
-# If global variable aadf is empty, we download it from GO API.
-# Always download if refresh=True
-def initialize_aadf(refresh = False):
-
-    # Old version:
-    # if (not 'aadf' in locals()) and (not 'aadf' in globals()): 
-    #     return download_api_results()
+# Appeal records are flattened into typed columns: nested dicts of GO (dtype, country, region) 
+# are replaced by their names as categorical columns, start_date is parsed to datetime.
+# Other columns are not used and are dropped, to keep the snapshot small
+# Hazard of each appeal is decoded on load too (see get_hazard_from_names)
+appeal_columns = ['id', 'code', 'name', 'dtype_name', 'hazard', 'country_name', 'region_name', 'start_date']
+appeal_categories = ['dtype_name', 'hazard', 'country_name', 'region_name']
+
+# Preprocessing of downloaded appeal results
+def preprocess_aadf(aadf):
+    aadf = aadf.assign(dtype_name   = aadf['dtype'].str.get('name'),
+                       country_name = aadf['country'].str.get('name'),
+                       region_name  = aadf['region'].str.get('region_name'),
+                       start_date   = pd.to_datetime(aadf['start_date'].str[:10], errors='coerce'))
+    aadf['hazard'] = get_hazards_of_appeals(aadf)
+    return aadf[appeal_columns].astype({column: 'category' for column in appeal_categories})
+
+# Preprocessing of downloaded appeal_document results
+def preprocess_apdo(apdo):
+    apdo = filter_DREF_Final_Reports(apdo)
+    apdo.appeal = apdo.appeal.astype(str)
+    return apdo
 
-    global aadf
-    length_ini = len(aadf)
-    if refresh or (len(aadf) == 0): 
-        aadf = download_api_results(call='appeal')
+# ****************************************************************************************
+# Snapshot of GO API data.
+# Data of appeal & appeal_document calls is kept in a GOSnapshot, that is never
+# changed after it is built. A sync builds a new snapshot aside and replaces the current one
+# by one assignment, so requests running during a sync keep reading the snapshot 
+# they started with (each request takes it once, by get_GO_snapshot).
+
+class GOSnapshot:
+    "GO API data of one sync: appeal (aadf) and DREF Final Reports of appeal_document (apdo)"
+
+    def __init__(self, aadf=None, apdo=None, watermarks=None):
+        self.aadf = pd.DataFrame() if aadf is None else aadf
+        self.apdo = pd.DataFrame() if apdo is None else apdo
+        self.watermarks = MappingProxyType(dict(watermarks or {})) # call -> ISO time of sync
+        self.created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+        # appeals merged with their documents (for PDF URLs)
+        self.merged = pd.DataFrame()
+        if len(self.aadf) > 0 and len(self.apdo) > 0:
+            appeals = self.apdo['appeal'].apply(lambda x: literal_eval(x) if isinstance(x, str) else x)
+            self.merged = self.aadf.merge(self.apdo.assign(appeal=appeals),
+                                          left_on=self.aadf['id'].astype(int), right_on=appeals.str['id'])
+
+    def is_empty(self):
+        return len(self.aadf) == 0 or len(self.apdo) == 0
+
+
+GO_snapshot = GOSnapshot()
+GO_snapshot_lock = threading.Lock() # only one snapshot is built at a time
+
+# The current snapshot, downloaded from GO if there is none yet
+def get_GO_snapshot():
+    snapshot = GO_snapshot
+    if snapshot.is_empty():
+        with GO_snapshot_lock:
+            if GO_snapshot.is_empty():
+                sync_GO_snapshot(full=True)
+        snapshot = GO_snapshot
+    return snapshot
+
+# Use GO API data that was already downloaded 
+# (e.g. by the parent process of parsing workers)
+def set_GO_snapshot(snapshot):
+    global GO_snapshot
+    GO_snapshot = snapshot
 
-    # For Debugging:
-    if False:
-        if refresh:
-            aadf.start_date = aadf.start_date.apply(lambda x: 'r'+x)
+# ****************************************************************************************
+# Incremental sync of GO API data.
+# After the first (full) download, only records changed since the last sync are downloaded,
+# using these filters of GO API calls, and merged into aadf/apdo by id.
+# The watermark is the time when the last sync started, minus sync_overlap
+# (to be safe against clocks of GO and of the app being different; 
+#  records downloaded twice are deduplicated by the merge)
+# NB: the filter names are assumed from the GO models (modified_at, created_at),
+# they are not documented. GO ignores unknown filters, so if a filter is not supported, 
+# all records are downloaded and merged, which gives the same data as a full sync.
+# Records deleted in GO are not in the changed records, so they stay in the snapshot 
+# until a full sync (full=True, i.e. /refresh/?full=true)
+GO_modified_since_filters = {'appeal': 'modified_at__gte',
+                             'appeal_document': 'created_at__gte'}
+sync_overlap = datetime.timedelta(hours=1)
+
+# Status of the last sync, for the /refresh/ endpoints
+GO_sync_status = Munch(running=False, finished_at=None, full=None, n_updated=None, error=None)
+
+# Records of new replace records of old with the same id, other records are appended
+def merge_api_results(old, new):
+    if len(new) == 0:
+        return old
+    if len(old) == 0:
+        return new
+    merged = pd.concat([old[~old['id'].isin(new['id'])], new], ignore_index=True)
+    # categories of old and new records may differ, then concat gives object columns
+    categorical = [column for column in new.columns if isinstance(new[column].dtype, pd.CategoricalDtype)]
+    return merged.astype({column: 'category' for column in categorical})
+
+# Download results of call changed since the watermark 'since' (all results if full=True,
+# or if there was no sync yet) and merge them into df (a new df is returned, df is not changed).
+# Returns the updated df, the number of downloaded records and the new watermark
+def sync_api_results(df, call='appeal', since=None, preprocess=None, full=False):
+    started = datetime.datetime.now(datetime.timezone.utc)
+
+    full = full or (since is None) or (len(df) == 0)
+    params = None if full else {GO_modified_since_filters[call]: since}
+    new = download_api_results(call=call, params=params)
+    if preprocess is not None and len(new) > 0:
+        new = preprocess(new)
+    merged = new if full else merge_api_results(df, new)
+
+    return merged, len(new), (started - sync_overlap).isoformat()
+
+# Build a new snapshot with records changed in GO since the last sync (all records if full=True)
+# and make it the current one. Returns the number of downloaded records
+def sync_GO_snapshot(full=False):
+    old = GO_snapshot
+    aadf, n_aadf, since_aadf = sync_api_results(old.aadf, call='appeal', preprocess=preprocess_aadf,
+                                                since=old.watermarks.get('appeal'), full=full)
+    apdo, n_apdo, since_apdo = sync_api_results(old.apdo, call='appeal_document', preprocess=preprocess_apdo,
+                                                since=old.watermarks.get('appeal_document'), full=full)
+    set_GO_snapshot(GOSnapshot(aadf, apdo, watermarks={'appeal': since_aadf, 'appeal_document': since_apdo}))
+    return {'appeal': n_aadf, 'appeal_document': n_apdo}
+
+# Sync in background: if a sync is already running, does nothing and returns False
+def sync_GO_API_data(full=False):
+    if not GO_snapshot_lock.acquire(blocking=False):
+        return False
+    try:
+        GO_sync_status.update(running=True, full=full, error=None)
+        GO_sync_status.n_updated = sync_GO_snapshot(full=full)
+    except Exception as e:
+        GO_sync_status.error = f'{type(e).__name__}: {e}'
+    finally:
+        GO_sync_status.update(running=False, finished_at=datetime.datetime.now(datetime.timezone.utc).isoformat())
+        GO_snapshot_lock.release()
+    return True
+
+# Short description of GO API data and of its last sync
+def GO_API_data_summary():
+    snapshot = GO_snapshot
+    output = f'GO API data: {len(snapshot.aadf)} items in appeal, {len(snapshot.apdo)} items in appeal_documents'
+    output += ' (only DREF Final Reports are selected).'
+    if GO_sync_status.finished_at is not None:
+        output += f' Last sync finished at {GO_sync_status.finished_at}'
+        if GO_sync_status.error is not None:
+            output += f' with error: {GO_sync_status.error}'
         else:
-            if length_ini == 0:
-                aadf.start_date = aadf.start_date.apply(lambda x: 'L0'+x)
-            else:
-                aadf.start_date = aadf.start_date.apply(lambda x: 'L1'+x)
-    return 
-
-# If global variable apdo is empty, we download it from GO API & preprocess
-# Always download if refresh=True
-def initialize_apdo(refresh = False):
-    global apdo
-    if refresh or (len(apdo) == 0): 
-        apdo = download_api_results(call='appeal_document')
-        apdo = filter_DREF_Final_Reports(apdo)
-        apdo.appeal = apdo.appeal.astype(str)
-    return 
+            output += f', updated records: {GO_sync_status.n_updated}'
+    return output
 
 
 # For a given lead get all global features using an API call
-def get_global_features(lead):
+def get_global_features(lead, snapshot=None):
 
     if lead == 'Unknown':
         hazard = country = region = start_date = 'Unknown'
     else:
-        initialize_aadf()
-        if not lead in aadf.code.unique():
+        aadf = (snapshot or get_GO_snapshot()).aadf
+        row = aadf[aadf.code==lead]
+        if len(row)==0:
             print('print ERROR: '+lead+' is not among API codes')
             raise ExceptionNotInAPI(f'Error: {lead} is not among API codes')
-        
-        row = aadf[aadf.code==lead]
         if len(row)!=1:
             print(f'WARNING: {lead} is present in API codes {len(row)} times (must be 1)')
-            row = row[0:1]
+        row = row.iloc[0]
         
-        hazard = get_hazard_from_names(row.name.values[0], row.dtype.values[0]['name'])
-        country = row.country.values[0]['name']
-        region = row.region.values[0]['region_name']
-        start_date = row.start_date.values[0][:10]
+        hazard = row.hazard
+        country = row.country_name
+        region = row.region_name
+        start_date = 'Unknown' if pd.isnull(row.start_date) else row.start_date.strftime('%Y-%m-%d')
     
     output = Munch(lead=lead, Hazard=hazard, Country=country, Region=region, Date=start_date)
     return output
 
 # URL for PDF file, can be used by tika.parser instead of PDF filename
-def get_pdf_url(lead):
-    initialize_aadf()
-    initialize_apdo()
-
-    apdo['appeal'] = apdo['appeal'].apply(lambda x: literal_eval(x) if isinstance(x, str) else x)
-    merged = aadf.merge(apdo, left_on=aadf['id'].astype(int), right_on=apdo.appeal.str['id'])
+def get_pdf_url(lead, snapshot=None):
+    merged = (snapshot or get_GO_snapshot()).merged
     
     # Lets return all merged df if we dont specify a lead
     if lead=='':
@@ -314,20 +448,69 @@ def get_pdf_url(lead):
     return url
 
 # IO object for PDF data, can be used by tika & pdfminer instead of PDF filename
-def get_pdf_io_object(lead):
-    url = get_pdf_url(lead)
+def get_pdf_io_object(lead, snapshot=None):
+    url = get_pdf_url(lead, snapshot=snapshot)
     pdf_data = download_pdf(url) # bytes with PDF content
     pdf_io = io.BytesIO(pdf_data)
     return pdf_io
 
-# Complete PDF parsing
-def parse_PDF_combined(lead, PDFextras=Munch(), pdf_file = None):
-    gf_parsed = get_global_features(lead)
-    PDFextras = get_PDFextras([lead], PDFextras, source='api', renew=False, pdf_file = pdf_file)
-    exs_parsed, _ = get_CHLLs(lead=lead, PDFextras=PDFextras, source='api', pdf_file = pdf_file)
+# PDF of the lead downloaded from GO into a temporary file (removed after the block)
+@contextlib.contextmanager
+def downloaded_pdf_file(lead, snapshot=None):
+    url = get_pdf_url(lead, snapshot=snapshot)
+    with temporary_pdf_file() as filename:
+        with open(filename, 'wb') as f:
+            get_client().download(url, f)
+        yield filename
+
+# PDF filename of the lead, to be used by all steps of parsing:
+# uploaded PDF (pdf_file, as bytes or file-like object) is written once to a temporary file,
+# PDF from GO (source='api') is downloaded once to a temporary file,
+# PDF from folder (source='disk') is used as it is
+@contextlib.contextmanager
+def get_PDF_file(lead, pdf_file=None, source='api', folder='', snapshot=None):
+    if pdf_file:
+        with pdf_as_file(pdf_file) as filename:
+            yield filename
+    elif source=='disk':
+        yield get_PDFfilename_from_lead(lead, folder=folder)
+    else:
+        with downloaded_pdf_file(lead, snapshot=snapshot) as filename:
+            yield filename
+
+# Complete PDF parsing.
+# PDF is downloaded from GO (source='api') or read from folder (source='disk').
+# Headers & footers of PDFs from GO are kept in a bounded cache,
+# uploaded PDFs (pdf_file) are not cached, since all of them have lead 'Unknown'.
+# All GO data is taken from one snapshot, even if a sync replaces it meanwhile
+def parse_PDF_combined(lead, PDFextras=None, pdf_file = None, source='api', folder='', snapshot=None):
+    if PDFextras is None:
+        PDFextras = Munch() if pdf_file else PDFextras_cache
+    if snapshot is None and lead != 'Unknown':
+        snapshot = get_GO_snapshot()
+    with span('global_features'):
+        gf_parsed = get_global_features(lead, snapshot=snapshot)
+    # the PDF is downloaded (or written from the upload) once, for both steps
+    with get_PDF_file(lead, pdf_file=pdf_file, source=source, folder=folder, snapshot=snapshot) as filename:
+        PDFextras = get_PDFextras([lead], PDFextras, renew=False, pdf_file = filename)
+        exs_parsed, _ = get_CHLLs(lead=lead, PDFextras=PDFextras, pdf_file = filename)
     all_parsed = exs_parsed.merge(pd.DataFrame([gf_parsed]), on='lead')
     return all_parsed
 
+# Columns of parsed excerpts given to users, with their output names
+output_columns = {'Modified Excerpt':'Excerpt', 
+                  'Learning':'Learning', 
+                  'DREF_Sector':'DREF_Sector', 
+                  'lead':'Appeal code', 
+                  'Hazard':'Hazard', 
+                  'Country':'Country', 
+                  'Date':'Date', 
+                  'Region':'Region'}
+
+# Select & rename output columns of parse_PDF_combined
+def format_parsed_output(all_parsed):
+    return all_parsed[list(output_columns)].rename(columns=output_columns)
+
 # ****************************************************************************************
 # HAZARDS
 # ****************************************************************************************
@@ -376,47 +559,81 @@ def get_common_words(s1,s2):
     common = set(w1).intersection(set(w2))
     return common
 
+# Rules of get_hazard_from_names, built once:
+# hazard names and their synonyms,
+hazard_names = frozenset(all_hazards)
+hazard_synonyms = {'Flash Flood': 'Pluvial/Flash Flood', 'Pluvial': 'Pluvial/Flash Flood'}
+# hazards for keywords in (lowercase) hazard description of the title, checked in this order,
+hazard_keywords = [('hailstorm',   'Cold Wave'), # or 'Storm Surge'
+                   ('strong wind', 'Storm Surge'),
+                   ('attack',      'Civil Unrest'),
+                   ('outbreak',    'Epidemic')]
+# and the index of words: word -> first hazard (in all_hazards) with this word
+hazard_word_index = {}
+for i_hazard, hazard in enumerate(all_hazards):
+    for word in get_words_from_string(hazard):
+        hazard_word_index.setdefault(word, i_hazard)
+
 # Get Hazard by 'decoding' two strings obtained by API call
 def get_hazard_from_names(name, dtype_name):
-    if dtype_name in all_hazards:
+    if dtype_name in hazard_names:
         return dtype_name
     hazard_from_title = split_report_title(str(name))[1]
     hazard_from_title = hazard_from_title.replace('Floods','Flood').replace('Storms','Storm')
     
-    if hazard_from_title in all_hazards:
+    if hazard_from_title in hazard_names:
         return hazard_from_title
-    if hazard_from_title in ['Flash Flood','Pluvial']: 
-        return 'Pluvial/Flash Flood'  
-    if hazard_from_title.lower().count('hailstorm')>0: return 'Cold Wave' # or 'Storm Surge'
-    if hazard_from_title.lower().count('strong wind')>0: return 'Storm Surge'
-    if hazard_from_title.lower().count('attack')>0: return 'Civil Unrest'
-    if hazard_from_title.lower().count('outbreak')>0: return 'Epidemic'
-    
-    hazards_with_commons = [h for h in all_hazards if len(get_common_words(h,hazard_from_title))>0]
+    if hazard_from_title in hazard_synonyms: 
+        return hazard_synonyms[hazard_from_title]
+    hazard_lower = hazard_from_title.lower()
+    for keyword, hazard in hazard_keywords:
+        if keyword in hazard_lower: 
+            return hazard
     
-    if len(hazards_with_commons)>0:
-        return hazards_with_commons[0]
+    # first hazard that has a common word with the title
+    i_hazards = [hazard_word_index[w] for w in get_words_from_string(hazard_from_title) if w in hazard_word_index]
+    if len(i_hazards)>0:
+        return all_hazards[min(i_hazards)]
 
     return 'Other' #'Unknown'
+
+# Hazards of all appeals (each pair of title & disaster type is decoded once)
+def get_hazards_of_appeals(aadf):
+    dtype_names = aadf['dtype_name'].astype(object)
+    pairs = list(zip(aadf['name'], dtype_names.where(dtype_names.notna(), None)))
+    hazards = {pair: get_hazard_from_names(*pair) for pair in set(pairs)}
+    return pd.Series([hazards[pair] for pair in pairs], index=aadf.index, dtype='category')
         
 # ****************************************************************************************
 # SECTORS
 # ****************************************************************************************
 
+# Dict: Full sector name -> short name (sector ID)
+sector_ids = {'Health':'Health',
+              'Education':'Education',
+              'Shelter and Settlements':'Shelter', 
+              'Disaster Risk Reduction and Climate Action':'Disaster', 
+              'Water Sanitation and Hygiene':'WASH',
+              'Livelihoods and Basic Needs':'Live',
+              'Strategies for implementation':'Strategies',
+              'Protection, Gender and Inclusion':'PGI',
+              'Migration and Displacement':'Migration'}
+
+# If a section name contains one of these keywords (lower case),
+# it belongs to the corresponding sector. Checked in this order.
+sector_keywords = [('livelihoods', 'Live'),
+                   ('water',       'WASH'),
+                   ('shelter',     'Shelter'),
+                   ('inclusion',   'PGI'),
+                   ('protection',  'PGI'),
+                   ('disaster',    'Disaster'),
+                   ('health',      'Health')]
+
 # Get df with Sector long names and short names (id)
 # The long names include true names and nicknames
 def get_sectors_df():
 
-    # Dict: Full sector name -> short name (sector ID)
-    ids =  {'Health':'Health',
-            'Education':'Education',
-            'Shelter and Settlements':'Shelter', 
-            'Disaster Risk Reduction and Climate Action':'Disaster', 
-            'Water Sanitation and Hygiene':'WASH',
-            'Livelihoods and Basic Needs':'Live',
-            'Strategies for implementation':'Strategies',
-            'Protection, Gender and Inclusion':'PGI',
-            'Migration and Displacement':'Migration'}
+    ids = dict(sector_ids)
     n_true_names = len(ids) # these are true sector names
 
     # Add names of 'Strategy' sections too, to link them to 'Strategy' Sector
@@ -428,35 +645,45 @@ def get_sectors_df():
     sectors['true name'] = sectors.index < n_true_names
     return sectors
 
+# Read-only lookup tables built from get_sectors_df(), 
+# so that the df is not rebuilt for every excerpt.
+# They are filled by compile_sector_lookups() at import 
+# (call it again if sector names are changed)
+sector_id_from_name = MappingProxyType({}) # all names (incl. nicknames) -> id
+sector_name_from_id = MappingProxyType({}) # id -> true name
+
+def compile_sector_lookups():
+    global sector_id_from_name, sector_name_from_id
+    sectors = get_sectors_df()
+    true_sectors = sectors[sectors['true name']]
+    sector_id_from_name = MappingProxyType(dict(zip(sectors.name, sectors.id)))
+    sector_name_from_id = MappingProxyType(dict(zip(true_sectors.id, true_sectors.name)))
+
 # In case we need a list of all sector names
 def all_sector_names():
-    sectors = get_sectors_df()
-    return sectors[sectors['true name']].name.values
+    return np.array(list(sector_name_from_id.values()), dtype=object)
 
 # Get short sector name from a long name
 def shorten_sector(sector_name):
-    if sector_name.lower().count('livelihoods')>0: return 'Live'
-    if sector_name.lower().count('water')>0: return 'WASH'
-    if sector_name.lower().count('shelter')>0: return 'Shelter'
-    if sector_name.lower().count('inclusion')>0: return 'PGI'
-    if sector_name.lower().count('protection')>0: return 'PGI'
-    if sector_name.lower().count('disaster')>0: return 'Disaster'
-    if sector_name.lower().count('health')>0: return 'Health'
+    sector_name_lower = sector_name.lower()
+    for keyword, sector_id in sector_keywords:
+        if keyword in sector_name_lower: 
+            return sector_id
 
-    sectors = get_sectors_df()
-    if sector_name.strip() in sectors.id.values:
+    if sector_name.strip() in sector_name_from_id:
         return sector_name
-    if sector_name.strip() in sectors.name.values:
-        return sectors.set_index('name').loc[sector_name.strip(),'id']
-    
-    return 'Unknown'
+    return sector_id_from_name.get(sector_name.strip(), 'Unknown')
 
 def full_sector_name(sector_name):
-    sectors = get_sectors_df()
-    sectors = sectors[sectors['true name']]
-    if sector_name.strip() in sectors.id.values:
-        return sectors.set_index('id').loc[sector_name.strip(),'name']
-    return 'Unknown'
+    return sector_name_from_id.get(sector_name.strip(), 'Unknown')
+
+# Vectorized versions of shorten_sector and full_sector_name for a Series of names.
+# There are only a few distinct names per report, so each of them is resolved once
+def shorten_sectors(sector_names):
+    return sector_names.map({name: shorten_sector(name) for name in sector_names.unique()})
+
+def full_sector_names(sector_ids):
+    return sector_ids.map({sid: full_sector_name(sid) for sid in sector_ids.unique()})
 
 # ***************************************************
 # Find sections and auxiliary functions - for SECTORS
@@ -478,6 +705,8 @@ strategy_sections =['National Society Strengthening',
                     'International Disaster Response',
                     'Influence others as leading strategic']                    
 
+compile_sector_lookups()
+
 
 # True if there is no text (except possibly spaces) when searching for LB backwards
 def are_there_only_spaces_before_LB(s):
@@ -836,32 +1065,15 @@ def get_PDFfilename_from_lead(lead, folder=''):
         print('WARNING: more than 1 file for '+lead+': ', filenames)
     if len(filenames)==0:
         print('ERROR: No PDF files with name ', folder,"/"+lead+'*.pdf')
-        sys.exit(-1)
+        raise ExceptionNoPDFfile(f"no PDF files for lead = {lead} in {folder}")
     return filenames[0]
 
-# get PDF text from lead (from disk or from API) 
-def get_PDFtext_from_lead(lead, source='disk', folder='', method='tika'):
+# get PDF text from lead (from disk or from API).
+# method is the name of text backend (see text_extraction), None for the default one
+def get_PDFtext_from_lead(lead, source='disk', folder='', method=None, snapshot=None):
 
-    if source=='disk':
-        filename = get_PDFfilename_from_lead(lead, folder=folder)
-
-        # Two methods to extract text, they give very similar results.
-        # TODO: check which method is better
-        if method == 'tika':
-            txt = tika.parser.from_file(filename)['content'] 
-        else:
-            txt = pdfminer.high_level.extract_text(filename)        
-
-    else:
-        # source = 'api'.
-        # can choose between 2 options:
-
-        # Option 1
-        #url = get_pdf_url(lead)
-        #txt = tika.parser.from_file(url)['content'] 
-        # Option 2
-        pdf_io = get_pdf_io_object(lead)
-        txt = tika.parser.from_buffer(pdf_io)['content'] 
+    with get_PDF_file(lead, source=source, folder=folder, snapshot=snapshot) as filename:
+        txt = extract_pdf_text(filename, backend=method)
     return txt
 
 
@@ -872,23 +1084,62 @@ def get_PDFtext_from_lead(lead, source='disk', folder='', method='tika'):
 # 3 - perfect match
 # 2 - both strings start with the same substring of length n
 # 1 - substring is contained in a string
+# Each string is lowercased only once. Instead of comparing every pair of strings,
+# starts (and whole strings for 3) are looked up in dicts, and for 1 each start 
+# is searched once in all strings of the other list (see find_starts_in_strings)
 def build_comp_matrix(chs_true, chs_parsed, n=30):
-    matr = np.zeros((len(chs_true),len(chs_parsed)))
-    for i in range(len(chs_true)):
-        start = chs_true[i][:n]
-        for j in range(len(chs_parsed)):
-            # If start of true is contained in parsed (or viceversa)
-            if chs_parsed[j].lower().count(start.lower())>0:
-                matr[i,j] = 1
-            if chs_true[i].lower().count(chs_parsed[j][:n].lower())>0:
-                matr[i,j] = 1
-
-            #else: print(start, ' ||| ', chs_parsed[j][:n])
-            if chs_parsed[j][:n].lower() == chs_true[i][:n].lower():
-                matr[i,j] = 2
-            if chs_parsed[j].strip('.') == chs_true[i].strip('.'):
-                matr[i,j] = 3                   
-    return matr.astype(int)
+    matr = np.zeros((len(chs_true),len(chs_parsed)), dtype=int)
+
+    starts_true   = [ch[:n].lower() for ch in chs_true]
+    starts_parsed = [ch[:n].lower() for ch in chs_parsed]
+    lower_true    = [ch.lower() for ch in chs_true]
+    lower_parsed  = [ch.lower() for ch in chs_parsed]
+
+    # If start of true is contained in parsed (or viceversa)
+    for i, j in find_starts_in_strings(starts_true, lower_parsed):
+        matr[i,j] = 1
+    for j, i in find_starts_in_strings(starts_parsed, lower_true):
+        matr[i,j] = 1
+
+    starts_index = index_strings(starts_parsed)
+    for i, start in enumerate(starts_true):
+        matr[i, starts_index.get(start, [])] = 2
+
+    stripped_index = index_strings([ch.strip('.') for ch in chs_parsed])
+    for i, ch in enumerate(chs_true):
+        matr[i, stripped_index.get(ch.strip('.'), [])] = 3
+    return matr
+
+# dict: string -> positions where it occurs in the list
+def index_strings(strings):
+    index = {}
+    for k, s in enumerate(strings):
+        index.setdefault(s, []).append(k)
+    return index
+
+# All pairs (k, l) such that starts[k] is contained in strings[l].
+# Strings are joined into one text (with a separator that is not in the starts), 
+# each start is searched in it, and each occurrence is mapped back to its string
+def find_starts_in_strings(starts, strings, sep='\x00'):
+    if len(strings)==0:
+        return []
+    text = sep.join(strings)
+    offsets = list(itertools.accumulate([0] + [len(s)+1 for s in strings])) # where each string starts in text
+
+    pairs = []
+    for start, ks in index_strings(starts).items():
+        if sep in start:
+            ls = [l for l, s in enumerate(strings) if start in s]
+        else:
+            ls = []
+            i = text.find(start)
+            while i >= 0:
+                l = bisect.bisect_right(offsets, i) - 1
+                ls.append(l)
+                # continue from the next string
+                i = text.find(start, offsets[l+1]) if l+1 < len(strings) else -1
+        pairs += [(k, l) for k in ks for l in ls]
+    return pairs
 
 # ****************************************************************************************
 # For Excerpts.
@@ -906,18 +1157,24 @@ def assess_match(matr, verbose=1):
     startT = []
     if np==0:
         missed = [i for i in range(nt)]
-    else:
-        for i in range(nt):
-            if matr.sum(axis=1)[i] == 0: missed.append(i) # if ALL are zeros
-            if matr.max(axis=1)[i] == 3: exact.append(i)
-            if matr.max(axis=1)[i] != 3: not_exact.append(i)
-            if matr.max(axis=1)[i] >= 2: startT.append(i)
+    elif nt>0:
+        # sums & maxima over rows are computed once for all rows
+        row_sum = matr.sum(axis=1)
+        row_max = matr.max(axis=1)
+        missed    = (row_sum == 0).nonzero()[0].tolist() # if ALL are zeros
+        exact     = (row_max == 3).nonzero()[0].tolist()
+        not_exact = (row_max != 3).nonzero()[0].tolist()
+        startT    = (row_max >= 2).nonzero()[0].tolist()
     
     extra = []
     startP = []
-    for j in range(np):
-        if matr.sum(axis=0)[j] == 0: extra.append(j)
-        if matr.max(axis=0)[j] >= 2: startP.append(j)
+    if nt==0:
+        extra = [j for j in range(np)]
+    elif np>0:
+        col_sum = matr.sum(axis=0)
+        col_max = matr.max(axis=0)
+        extra  = (col_sum == 0).nonzero()[0].tolist()
+        startP = (col_max >= 2).nonzero()[0].tolist()
 
     return Munch(nt=nt, np=np, nexact=len(exact), n_notexact=len(not_exact), 
                  missed=missed, extra=extra, not_exact=not_exact, exact=exact)
@@ -937,34 +1194,43 @@ def assess_match_all(pp):
 # Get Parsed CH & LL.
 # source = api or disk
 def get_CHLLs(lead='MDRCD028', Learnings=['CH','LL'], PDFextras=Munch(), 
-              do_remove_footer=True, source='api', folder='', pdf_file = None):
+              do_remove_footer=True, source='api', folder='', pdf_file = None, snapshot=None):
 
     if pdf_file:
-        # get text directly from bytes of PDF file
-        txt = tika.parser.from_buffer(pdf_file)['content']
+        # get text directly from PDF file (filename, bytes or file-like object)
+        txt = extract_pdf_text(pdf_file)
     else:
         # get text from lead (by downloading the corresponding PDF file first)
-        txt = get_PDFtext_from_lead(lead, source=source, folder=folder) 
+        txt = get_PDFtext_from_lead(lead, source=source, folder=folder, snapshot=snapshot) 
     
+    return get_CHLLs_from_text(txt, lead=lead, Learnings=Learnings, PDFextras=PDFextras, 
+                               do_remove_footer=do_remove_footer)
+
+# Get Parsed CH & LL from the text of PDF
+def get_CHLLs_from_text(txt, lead='MDRCD028', Learnings=['CH','LL'], PDFextras=Munch(), do_remove_footer=True):
+
     if do_remove_footer:
         if not lead in PDFextras.keys():
             print(f'ERROR: Lead {lead} not in PDFextra')
-            sys.exit(-1)
-        txt = remove_footer(txt, PDFextras[lead])
-        txt = remove_header(txt, PDFextras[lead])
+            raise ExceptionNoPDFextras(f"lead = {lead} is not in PDFextras")
+        with span('remove_header_footer'):
+            txt = remove_footer(txt, PDFextras[lead])
+            txt = remove_header(txt, PDFextras[lead])
 
     parsed = []
-    if 'CH' in Learnings: parsed += [(ch[0], ch[1], 'Challenges'    ) for ch in get_CHs_from_text(txt)]
-    if 'LL' in Learnings: parsed += [(ch[0], ch[1], 'Lessons Learnt') for ch in get_LLs_from_text(txt)]
+    with span('excerpts'):
+        if 'CH' in Learnings: parsed += [(ch[0], ch[1], 'Challenges'    ) for ch in get_CHs_from_text(txt)]
+        if 'LL' in Learnings: parsed += [(ch[0], ch[1], 'Lessons Learnt') for ch in get_LLs_from_text(txt)]
 
     # Add section names
-    secs = find_sections(txt)
+    with span('sections'):
+        secs = find_sections(txt)
     exs_parsed = [(ch[0], ch[1], ch[2], section_from_position(secs, ch[0])) for ch in parsed]
     exs_parsed = pd.DataFrame(exs_parsed, columns=['position','Modified Excerpt','Learning','section'])
 
     # Convert section name to full and short DREF_sector:
-    exs_parsed['DREF_Sector_id'] = exs_parsed.section.apply       (lambda x: shorten_sector(x))
-    exs_parsed['DREF_Sector']    = exs_parsed.DREF_Sector_id.apply(lambda x: full_sector_name(x))
+    exs_parsed['DREF_Sector_id'] = shorten_sectors  (exs_parsed.section)
+    exs_parsed['DREF_Sector']    = full_sector_names(exs_parsed.DREF_Sector_id)
     #del exs_parsed['section']
 
     exs_parsed['lead'] = lead
@@ -975,11 +1241,16 @@ def get_CHLLs(lead='MDRCD028', Learnings=['CH','LL'], PDFextras=Munch(),
 # Extract challenges (or LLs) and compare them to the true ones
 # Learning='CH' or 'LL'
 def get_CHs_and_compare(q, lead='MDRCD028', Learning='CH', PDFextras=Munch(), verbose=0, n=30, do_remove_footer=True, folder=''):
+    exs_parsed, _ = get_CHLLs(lead=lead, Learnings=[Learning], PDFextras=PDFextras, 
+                              do_remove_footer=do_remove_footer, source='disk', folder=folder)
+    return compare_CHs(q, exs_parsed, lead=lead, Learning=Learning, n=n)
 
-    LearningLong = Learning.replace('CH','Challenges').replace('LL','Lessons Learnt')
+# Compare parsed challenges (or LLs) to the true ones.
+# exs_parsed may include other Learnings, only the given one is compared
+def compare_CHs(q, exs_parsed, lead='MDRCD028', Learning='CH', n=30):
 
-    exs_parsed, chs_parsed = get_CHLLs(lead=lead, Learnings=[Learning], PDFextras=PDFextras, 
-                                       do_remove_footer=do_remove_footer, source='disk', folder=folder)
+    LearningLong = Learning.replace('CH','Challenges').replace('LL','Lessons Learnt')
+    exs_parsed = exs_parsed[exs_parsed.Learning==LearningLong].reset_index(drop=True)
     
     q1 = q[q['Lead Title']==lead]
     chs_true = list(q1[q1.Learning==LearningLong]['Modified Excerpt'].unique())
@@ -989,10 +1260,10 @@ def get_CHs_and_compare(q, lead='MDRCD028', Learning='CH', PDFextras=Munch(), ve
     # Excerpts with sectors
     exs_true = q1.groupby(by=['Modified Excerpt','DREF_Sector','Learning'], sort=False).count()[['Date']].reset_index()
     exs_true.rename(columns = {'Date':'count'}, inplace=True)
-    exs_true['DREF_Sector_id'] = exs_true.DREF_Sector.apply(lambda x: shorten_sector(x))
+    exs_true['DREF_Sector_id'] = shorten_sectors(exs_true.DREF_Sector)
 
     # Leave only text:
-    chs_parsed = [ch[1] for ch in chs_parsed] 
+    chs_parsed = list(exs_parsed['Modified Excerpt'])
     matr = build_comp_matrix(chs_true, chs_parsed, n=n)
 
     pp = Munch(lead=lead, matr=matr, chs_true = chs_true, chs_parsed=chs_parsed, 
@@ -1019,6 +1290,18 @@ def read_pdfs_from_folder(folder='../data/PDF'):
     pdfs['ext'] = pdfs.title.apply(lambda x: x[8:])
     return pdfs
 
+# Leads of PDF files in folder (or list of folders), excludes duplicates named *_copy.pdf
+def get_leads_from_folder(folder=''):
+    if folder=='':  folder = all_pdf_folders
+    folders = [folder] if type(folder)==str else folder
+
+    filenames = []
+    for f in folders:
+        filenames += glob.glob(os.path.join(f, 'MD*.pdf'))
+    filenames = [f for f in filenames if f.count('_copy.pdf')==0]
+    leads = [os.path.basename(f)[:8] for f in sorted(filenames)]
+    return list(dict.fromkeys(leads))
+
 # Get leads that are both (1) in PDF folder and (2) in dataset
 def get_pdf_names(q, folder='../data/PDF-2020'):
     
@@ -1145,30 +1428,77 @@ def get_LLs_from_text(txt):
 # Selects the first and last elements from each page:
 # They are presumable header and footer.
 # Also, postheader - what comes after header.
-def get_header_footer_candidates(filename = "../data/PDF-2020/MDRCD030dfr.pdf"):
+# Returns None for the elements that are absent on the page
+def get_page_header_footer(page_layout):
+    header = footer = postheader = None
+    for element in page_layout:
+        if isinstance(element, LTTextContainer):
+            element_text = element.get_text()
+            # ignoring empty elements
+            if strip_all_empty(element_text) != '':
+                if header is None:
+                    header = element_text
+                elif postheader is None:
+                    postheader = element_text
+                footer = element_text
+    return header, footer, postheader
+
+# Number of pages in PDF (filename or bytes)
+def count_pdf_pages(pdf):
+    if is_pdf_filename(pdf):
+        with open(pdf, 'rb') as fp:
+            return sum(1 for page in PDFPage.get_pages(fp))
+    return sum(1 for page in PDFPage.get_pages(as_pdf_stream(pdf)))
+
+# Each worker process keeps the PDF (filename or bytes) it was started with
+worker_pdf = None
+
+def init_page_worker(pdf):
+    global worker_pdf
+    worker_pdf = pdf
+
+def get_pages_header_footer(page_numbers):
+    pdf = worker_pdf if is_pdf_filename(worker_pdf) else io.BytesIO(worker_pdf)
+    return [get_page_header_footer(page_layout) 
+            for page_layout in extract_pages(pdf, page_numbers=page_numbers)]
+
+# Header, footer & postheader candidates page by page. 
+# Large PDFs are split into chunks of pages processed by n_workers processes,
+# the chunks are merged back in the page order.
+# If a page has no text, the candidates of the previous page are repeated.
+def iter_header_footer_candidates(filename, n_workers=None):
+    if n_workers is None: n_workers = page_workers
+
+    pdf = filename
+    if not is_pdf_filename(pdf):
+        # processes need bytes, not a file-like object
+        pdf = pdf if isinstance(pdf, bytes) else pdf.getvalue()
+
+    n_pages = count_pdf_pages(pdf) if n_workers > 1 else 0
+
+    previous = ('', '', '')
+    if n_pages >= min_pages_parallel:
+        # contiguous chunks, about two per worker
+        chunk_size = -(-n_pages // (2 * n_workers))
+        chunks = [range(i, min(i + chunk_size, n_pages)) for i in range(0, n_pages, chunk_size)]
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_page_worker, initargs=(pdf,)) as executor:
+            for candidates in itertools.chain.from_iterable(executor.map(get_pages_header_footer, chunks)):
+                previous = tuple(c if c is not None else p for c, p in zip(candidates, previous))
+                yield previous
+    else:
+        for page_layout in extract_pages(as_pdf_stream(pdf)):
+            candidates = get_page_header_footer(page_layout)
+            previous = tuple(c if c is not None else p for c, p in zip(candidates, previous))
+            yield previous
+
+def get_header_footer_candidates(filename = "../data/PDF-2020/MDRCD030dfr.pdf", n_workers=None):
     headers = []
     footers = []
     postheaders = []
-    for page_layout in extract_pages(filename):
-        postheader_now = False
-        header_now = True
-        for element in page_layout:
-            if isinstance(element, LTTextContainer):
-                # ignoring empty elements
-                if strip_all_empty(element.get_text()) != '':
-                    element_text = element.get_text()
-                    if postheader_now:
-                        postheader = element_text
-                        postheader_now = False
-                    if header_now:
-                        header = element_text
-                        header_now = False
-                        postheader_now = True
-
-        footer = element_text
+    for header, footer, postheader in iter_header_footer_candidates(filename, n_workers=n_workers):
         headers.append(header)
-        postheaders.append(postheader)
         footers.append(footer)
+        postheaders.append(postheader)
     return headers, footers, postheaders    
 
 #***************************************************************
@@ -1194,36 +1524,86 @@ def has_digit_dot_digit(s):
                 return True
     return False
 
+#***************************************************************
+# Running counts of footer (or header) candidates, added page by page.
+# Only the distinct candidates are kept, together with their variants 
+# cut at numbers (see before_number, after_number), so a PDF of any length 
+# takes memory proportional to the number of distinct candidates.
+# Among equally frequent candidates the one seen first wins.
+class RepeatableElementCounter:
+    number_options = ['', 'stop_before', 'stop_after']
+
+    def __init__(self):
+        self.n = 0
+        self.counts = {numbers: Counter() for numbers in self.number_options}
+
+    def add(self, element):
+        self.n += 1
+        self.counts[''][element] += 1
+        self.counts['stop_before'][before_number(element)] += 1
+        self.counts['stop_after' ][after_number(element) ] += 1
+
+    # The most repeatable candidate if it repeats more than threshold
+    def repeatable_element(self, threshold=0.5, numbers=''):
+        if self.n == 0:
+            return ''
+        element, count = self.counts[numbers].most_common(1)[0]
+        if count > threshold * self.n:
+            return element.rstrip('\n')
+        else:
+            return ''
+
+    # The longest of repeatable candidates, with or without page numbers
+    def repeatable_element_auto(self, threshold=0.3):
+        output1 = self.repeatable_element(threshold=threshold, numbers='')
+        output2 = self.repeatable_element(threshold=threshold, numbers='stop_before')
+        output3 = self.repeatable_element(threshold=threshold, numbers='stop_after')
+        if len(output1)>len(output2) and len(output1)>len(output3):
+            return output1 
+        else:
+            return output2 if len(output2)>len(output3) else output3
+
 #***************************************************************
 # Out of many footer-candidates (which are simply the last text elements on a page)
 # finds one that repeats more than threshold 
 def repeatable_element(footers0, threshold=0.5, numbers=''):
-    
-    if numbers == '':
-        footers = footers0
-    if numbers == 'stop_before':
-        footers = [before_number(f) for f in footers0]
-    if numbers == 'stop_after':
-        footers = [after_number(f) for f in footers0]
-        
-    vc = pd.DataFrame({'footer':footers}).footer.value_counts()
-    if vc[0] > threshold * len(footers):
-        return vc.index[0].rstrip('\n')
-    else:
-        return ''
+    counter = RepeatableElementCounter()
+    for footer in footers0:
+        counter.add(footer)
+    return counter.repeatable_element(threshold=threshold, numbers=numbers)
 
 #***************************************************************
 # Footers or headers may include page number. This function figures out whether they do
 # and identifies the most repeatable footer(header) ignoring occasional varying page number.
 # Threshold 0.3 means that a text is decided to be a footer if it occurs at the bottom of at least 30% of pages
 def repeatable_element_auto(footers0, threshold=0.3):
-    output1 = repeatable_element(footers0=footers0, threshold=threshold, numbers='')
-    output2 = repeatable_element(footers0=footers0, threshold=threshold, numbers='stop_before')
-    output3 = repeatable_element(footers0=footers0, threshold=threshold, numbers='stop_after')
-    if len(output1)>len(output2) and len(output1)>len(output3):
-        return output1 
-    else:
-        return output2 if len(output2)>len(output3) else output3
+    counter = RepeatableElementCounter()
+    for footer in footers0:
+        counter.add(footer)
+    return counter.repeatable_element_auto(threshold=threshold)
+
+#***************************************************************
+# Reads PDF page by page and finds its header and footer,
+# without keeping the candidates of all pages in memory
+def detect_header_footer(filename, n_workers=None):
+    headers = RepeatableElementCounter()
+    footers = RepeatableElementCounter()
+    for header, footer, postheader in iter_header_footer_candidates(filename, n_workers=n_workers):
+        headers.add(header)
+        footers.add(footer)
+    return Munch(version=PDFextra_version, 
+                 header=headers.repeatable_element_auto(), footer=footers.repeatable_element_auto())
+
+# PDFextras saved before version 2 keep the candidates of all pages (headers, footers, postheaders)
+# instead of the detected header and footer. Such entries are converted when they are used.
+PDFextra_version = 2
+
+def as_header_footer(PDFextra):
+    if 'header' in PDFextra and 'footer' in PDFextra:
+        return Munch(version=PDFextra_version, header=PDFextra['header'], footer=PDFextra['footer'])
+    return Munch(version=PDFextra_version,
+                 header=repeatable_element_auto(PDFextra.get('headers', [])), 
+                 footer=repeatable_element_auto(PDFextra.get('footers', [])))
 
 # ***********************************************************
 # Removes footers from the text, replaces them by pbflag.
@@ -1293,39 +1673,77 @@ def extend_header_with_linebreaks(header, txt):
     
 # ************************************************************************
 # For Footer and Header:
-# Determine it by finding most repeatable item from page to page.
+# They are determined as the most repeatable item from page to page (see detect_header_footer)
 # Remove it, i.e. replace by a pagebreak flag
 def remove_footer(txt, PDFextra):
-    footer = repeatable_element_auto(PDFextra.footers)
+    footer = as_header_footer(PDFextra)['footer']
     #footer = extend_header_with_linebreaks(footer, txt)
     return cut_footers(txt, footer, n=300, 
                        before = 'stop_at_linebreak', after = 'stop_at_linebreak')           
 
 def remove_header(txt, PDFextra):
-    header = repeatable_element_auto(PDFextra.headers)
+    header = as_header_footer(PDFextra)['header']
     #header = extend_header_with_linebreaks(header, txt)
     return cut_footers(txt, header, n=300, 
                        before = 'stop_at_linebreak', after = 'stop_at_linebreak')           
 
 # ************************************************************************
-# Load PDFextras for all leads where it's missing.
+# Dict-like cache that keeps only maxsize most recently used items.
+# Used for PDFextras of the app, so that it doesn't grow with every parsed lead.
+# Even reading reorders the items, so all access is locked: the app parses leads in parallel threads
+class BoundedCache(OrderedDict):
+    def __init__(self, maxsize=128, *args, **kwargs):
+        self.maxsize = maxsize
+        self.lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        with self.lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.maxsize:
+                self.popitem(last=False)
+
+    def __delitem__(self, key):
+        with self.lock:
+            super().__delitem__(key)
+
+    def __contains__(self, key):
+        with self.lock:
+            return super().__contains__(key)
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self[key] if super().__contains__(key) else default
+
+    def keys(self):
+        with self.lock:
+            return list(super().keys())
+
+PDFextras_cache = BoundedCache(maxsize=256)
+
+# ************************************************************************
+# Load PDFextras (header & footer) for all leads where it's missing.
 # Keep existing values if renew=False.
 # (Makes sense since it takes long time to process all PDFs)
-def get_PDFextras(leads, PDFextras, renew=False, source='disk', folder='', pdf_file = None):
+# Entries saved in the old format are converted.
+def get_PDFextras(leads, PDFextras, renew=False, source='disk', folder='', pdf_file = None, snapshot=None):
     for lead in leads:
-        if renew or (not lead in PDFextras.keys()):
-            # get pdf_io which is either filename or a file-like object
-            if pdf_file:
-                # if pdf_file (as bytes) is given:
-                pdf_io = io.BytesIO(pdf_file)
-            else:
-                # otherwise, read pdf file from disk, or download
-                if source=='disk':
-                    pdf_io = get_PDFfilename_from_lead(lead, folder=folder)
-                else:
-                    pdf_io = get_pdf_io_object(lead) # IO object with PDF data
-            headers, footers, postheaders  = get_header_footer_candidates(filename = pdf_io)
-            PDFextras[lead] = Munch(headers = headers, footers=footers, postheaders = postheaders)
+        PDFextra = None if renew else PDFextras.get(lead)
+        if PDFextra is not None:
+            if PDFextra.get('version') != PDFextra_version:
+                PDFextras[lead] = as_header_footer(PDFextra)
+        else:
+            # pdf_file if given, otherwise read pdf file from disk, or download
+            with get_PDF_file(lead, pdf_file=pdf_file, source=source, folder=folder, snapshot=snapshot) as filename:
+                with span('header_footer'):
+                    PDFextras[lead] = detect_header_footer(filename = filename)
     return PDFextras    
 
 
@@ -0,0 +1,116 @@
+import os
+import io
+import shutil
+import tempfile
+import contextlib
+from abc import ABC, abstractmethod
+
+from pdfminer.high_level import extract_pages
+from pdfminer.layout import LTTextContainer
+
+from dref_parsing.tracing import span
+
+# ****************************************************************************************
+# TEXT EXTRACTION BACKENDS
+# ****************************************************************************************
+# Challenges & Lessons Learned are parsed from the plain text of the PDF.
+# The text can be extracted by different backends, but all of them must give
+# the layout the parser relies on:
+#  - lines of a paragraph are separated by a single linebreak,
+#  - paragraphs (text boxes) are separated by an empty line,
+#  - each page starts after a linebreak and ends with a linebreak.
+#
+# 'tika'     - Apache Tika, needs Java; tika starts a local Tika server on the first call
+# 'pdfminer' - pure Python (pdfminer.six), no JVM and no HTTP round-trip.
+#              It uses the same layout analysis as get_header_footer_candidates,
+#              so headers/footers are found in its text exactly as they were detected
+#
+# Backend is chosen by the environment variable DREF_TEXT_BACKEND (default 'pdfminer',
+# so Java is needed only if DREF_TEXT_BACKEND=tika)
+
+default_text_backend = os.environ.get('DREF_TEXT_BACKEND', 'pdfminer')
+
+
+# PDF can be given as a filename, as bytes or as a file-like object
+def is_pdf_filename(pdf):
+    return isinstance(pdf, (str, os.PathLike))
+
+def as_pdf_stream(pdf):
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return io.BytesIO(pdf)
+    return pdf
+
+# Temporary PDF filename, the file is removed after the block
+@contextlib.contextmanager
+def temporary_pdf_file():
+    fd, filename = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        yield filename
+    finally:
+        os.remove(filename)
+
+# PDF as a filename. PDF given as bytes or as a file-like object (e.g. an upload)
+# is written once to a temporary file, so that all backends (and page workers) 
+# read this file instead of making their own copies of the PDF in memory
+@contextlib.contextmanager
+def pdf_as_file(pdf):
+    if is_pdf_filename(pdf):
+        yield pdf
+        return
+    with temporary_pdf_file() as filename:
+        with open(filename, 'wb') as f:
+            if isinstance(pdf, (bytes, bytearray, memoryview)):
+                f.write(pdf)
+            else:
+                shutil.copyfileobj(pdf, f)
+        yield filename
+
+
+class TextBackend(ABC):
+    "Extracts plain text from a PDF (filename, bytes or file-like object)"
+    name = ''
+
+    @abstractmethod
+    def extract_text(self, pdf):
+        pass
+
+
+class TikaBackend(TextBackend):
+    name = 'tika'
+
+    def extract_text(self, pdf):
+        # imported here, so that tika (and Java) are needed only if this backend is used
+        import tika.parser
+        if is_pdf_filename(pdf):
+            return tika.parser.from_file(str(pdf))['content']
+        return tika.parser.from_buffer(pdf)['content']
+
+
+class PdfminerBackend(TextBackend):
+    name = 'pdfminer'
+
+    def extract_text(self, pdf):
+        pages = []
+        for page_layout in extract_pages(as_pdf_stream(pdf)):
+            # each text box ends with a linebreak, one more gives an empty line after it
+            boxes = [element.get_text() + '\n' for element in page_layout
+                     if isinstance(element, LTTextContainer)]
+            pages.append('\n' + ''.join(boxes) + '\n')
+        return ''.join(pages)
+
+
+text_backends = {backend.name: backend for backend in [TikaBackend(), PdfminerBackend()]}
+
+def get_text_backend(name=None):
+    if name is None:
+        name = default_text_backend
+    if not name in text_backends:
+        raise ValueError(f"Unknown text backend '{name}', choose one of {list(text_backends)}")
+    return text_backends[name]
+
+# Extract text of the PDF with the given (or default) backend
+def extract_pdf_text(pdf, backend=None):
+    text_backend = get_text_backend(backend)
+    with span('text_' + text_backend.name):
+        return text_backend.extract_text(pdf)
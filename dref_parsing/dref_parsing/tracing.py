@@ -0,0 +1,150 @@
+import os
+import time
+import contextvars
+from collections import deque
+
+# ****************************************************************************************
+# TRACING OF PIPELINE STAGES
+# ****************************************************************************************
+# Stages of parsing & tagging are wrapped in spans:
+#
+#     with span('text_extraction'):
+#         txt = ...
+#
+# Duration of each span is
+#  - added to the trace of the current request (if there is one, see new_trace),
+#    which the apps give back in the Server-Timing header and keep for /debug/timings/,
+#  - observed in the Prometheus histogram dref_stage_seconds (if prometheus_client is installed).
+#
+# Tracing is a diagnostic, switched on by the environment variable DREF_TRACING=1.
+# Otherwise span() returns one shared object that does nothing, and the apps
+# have neither the Server-Timing header nor the /metrics and /debug/timings/ routes.
+# Spans run in worker processes (e.g. pages of large PDFs) are not traced.
+
+tracing_enabled = os.environ.get('DREF_TRACING', '0') == '1'
+
+try:
+    import prometheus_client
+    stage_seconds = prometheus_client.Histogram(
+        'dref_stage_seconds', 'Time spent in each stage of PDF parsing and tagging', ['stage'])
+except ImportError:
+    prometheus_client = None
+    stage_seconds = None
+
+# Trace of the current request.
+# A context variable, so that concurrent requests of the app don't mix their spans
+current_trace = contextvars.ContextVar('dref_trace', default=None)
+
+# Last traces, for debugging
+recent_traces = deque(maxlen=100)
+
+
+class Trace:
+    "Durations of all spans run within one request, summed up by span name"
+
+    def __init__(self, name=''):
+        self.name = name
+        self.seconds = {}
+        self.counts = {}
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def to_dict(self):
+        return dict(name=self.name, seconds=dict(self.seconds), counts=dict(self.counts))
+
+    # Value of Server-Timing header, durations in milliseconds
+    def server_timing(self):
+        return ', '.join(f'{stage};dur={seconds*1000:.1f}' for stage, seconds in self.seconds.items())
+
+
+class Span:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(self.stage, seconds)
+        if stage_seconds is not None:
+            stage_seconds.labels(self.stage).observe(seconds)
+        return False
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+null_span = NullSpan()
+
+def span(stage):
+    if not tracing_enabled:
+        return null_span
+    return Span(stage)
+
+
+class new_trace:
+    "Collects spans of the block into a new Trace (context manager)"
+
+    def __init__(self, name=''):
+        self.trace = Trace(name)
+
+    def __enter__(self):
+        self.token = current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc_info):
+        current_trace.reset(self.token)
+        if tracing_enabled:
+            recent_traces.append(self.trace)
+        return False
+
+
+# ****************************************************************************************
+# For FastAPI apps.
+# Each request gets its trace, given back in the Server-Timing header
+async def server_timing_middleware(request, call_next):
+    if not tracing_enabled:
+        return await call_next(request)
+    with new_trace(request.url.path) as trace:
+        with span('total'):
+            response = await call_next(request)
+    response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+# Latest traces as a list of dicts (for a debug endpoint)
+def get_recent_traces(n=20):
+    return [trace.to_dict() for trace in list(recent_traces)[-n:]]
+
+# ASGI app with Prometheus metrics (to be mounted at /metrics), None if prometheus_client is missing
+def metrics_app():
+    if prometheus_client is None:
+        return None
+    return prometheus_client.make_asgi_app()
+
+# Adds tracing to a FastAPI app: Server-Timing header, /metrics and /debug/timings/.
+# Nothing is added if tracing is switched off
+def add_tracing(app):
+    if not tracing_enabled:
+        return
+    app.middleware('http')(server_timing_middleware)
+
+    metrics = metrics_app()
+    if metrics is not None:
+        app.mount('/metrics', metrics)
+
+    @app.get('/debug/timings/')
+    async def debug_timings(n: int = 20):
+        """
+        Durations of parsing (and tagging) stages for the latest requests, in seconds
+        """
+        return get_recent_traces(n)
@@ -0,0 +1,104 @@
+import os
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdftypes import resolve1
+
+# ****************************************************************************************
+# LIMITS OF UPLOADED PDFs
+# ****************************************************************************************
+# Uploads are never read into memory as a whole:
+#  - UploadSizeLimit (ASGI middleware) rejects request bodies larger than max_upload_size
+#    with 413, by Content-Length before anything is read, or while the body is streamed
+#    (Starlette spools the uploaded file to disk as it is received),
+#  - check_pdf_upload looks at the spooled file before parsing:
+#    it must start with the PDF header and have not more than max_upload_pages pages.
+#
+# Limits are taken from the environment: DREF_MAX_UPLOAD_MB, DREF_MAX_UPLOAD_PAGES
+
+max_upload_size  = int(float(os.environ.get('DREF_MAX_UPLOAD_MB', 50)) * 2**20)
+max_upload_pages = int(os.environ.get('DREF_MAX_UPLOAD_PAGES', 500))
+
+# PDF header may be preceded by some garbage, PDF readers look for it in the first 1024 bytes
+pdf_header = b'%PDF-'
+pdf_header_range = 1024
+
+
+class ExceptionNotPDF(Exception):
+    "Uploaded file is not a PDF"
+
+class ExceptionTooManyPages(Exception):
+    "Uploaded PDF has more than max_upload_pages pages"
+
+
+# Number of pages from the page tree of the PDF, without parsing the pages
+def count_pages_from_catalog(file):
+    document = PDFDocument(PDFParser(file))
+    pages = resolve1(document.catalog['Pages'])
+    return int(resolve1(pages['Count']))
+
+# Checks the uploaded PDF (file-like object) before parsing, the file is rewound afterwards
+def check_pdf_upload(file, max_pages=None):
+    if max_pages is None: max_pages = max_upload_pages
+
+    file.seek(0)
+    start = file.read(pdf_header_range)
+    file.seek(0)
+    if not pdf_header in start:
+        raise ExceptionNotPDF('File is not a PDF (no PDF header found)')
+
+    try:
+        n_pages = count_pages_from_catalog(file)
+    except Exception as e:
+        raise ExceptionNotPDF(f'PDF file can not be read: {type(e).__name__}')
+    finally:
+        file.seek(0)
+
+    if n_pages > max_pages:
+        raise ExceptionTooManyPages(f'PDF has {n_pages} pages, not more than {max_pages} are allowed')
+    return n_pages
+
+
+# ****************************************************************************************
+# For FastAPI apps.
+# ASGI middleware limiting the size of request bodies
+class UploadSizeLimit:
+    def __init__(self, app, max_size=None):
+        self.app = app
+        self.max_size = max_upload_size if max_size is None else max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope['headers']).get(b'content-length', b'')
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            return await self.send_too_large(scope, receive, send)
+
+        # Content-Length may be missing (chunked body): count bytes as they come
+        received = 0
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_size:
+                    # raised within the app, while the body is read;
+                    # FastAPI re-raises HTTPException of form parsing
+                    raise HTTPException(status_code=413, detail=self.detail())
+            return message
+
+        return await self.app(scope, receive_limited, send)
+
+    def detail(self):
+        return f'Uploaded file is too large, the limit is {self.max_size / 2**20:g} MB'
+
+    async def send_too_large(self, scope, receive, send):
+        response = JSONResponse({'detail': self.detail()}, status_code=413)
+        await response(scope, receive, send)
+
+# Adds the limit of uploads to a FastAPI app
+def add_upload_limit(app, max_size=None):
+    app.add_middleware(UploadSizeLimit, max_size=max_size)
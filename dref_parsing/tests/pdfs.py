@@ -0,0 +1,42 @@
+# Small PDFs generated for tests (no PDF library needed)
+
+
+def escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def page_content(paragraphs):
+    "Content stream of a page: paragraphs 150pt apart, lines of a paragraph 14pt apart"
+    content = []
+    for i, paragraph in enumerate(paragraphs):
+        lines = ' T* '.join(f'({escape(line)}) Tj' for line in paragraph.split('\n'))
+        content.append(f'BT /F1 11 Tf 14 TL 72 {700 - 150 * i} Td {lines} ET')
+    return '\n'.join(content).encode('latin-1')
+
+
+def make_pdf(pages):
+    "PDF bytes with pages given as lists of paragraphs (lines separated by a linebreak)"
+    n = len(pages)
+    # objects: 1 catalog, 2 pages, 3 font, then a page and its content for each page
+    page_ids = [4 + 2 * i for i in range(n)]
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (' '.join(f'{i} 0 R' for i in page_ids).encode(), n),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for page_id, paragraphs in zip(page_ids, pages):
+        content = page_content(paragraphs)
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (page_id + 1))
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (i + 1, obj)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return pdf
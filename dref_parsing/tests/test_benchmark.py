@@ -0,0 +1,126 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+from unittest import mock
+
+import pandas as pd
+from munch import Munch
+
+import dref_parsing.parser_utils as pu
+from dref_parsing import benchmark, cli, tracing
+
+
+LEAD = 'MDRXX001'
+
+# True excerpts: 2 challenges and 1 lesson learnt
+TRUE_EXCERPTS = pd.DataFrame({
+    'Lead Title': [LEAD] * 3,
+    'Learning': ['Challenges', 'Challenges', 'Lessons Learnt'],
+    'Modified Excerpt': ['The warehouse was too far from the affected area.',
+                         'Volunteers lacked training in first aid.',
+                         'Pre-positioned stock speeds up the response.'],
+    'DREF_Sector': ['Health', 'Health', 'Shelter and Settlements'],
+    'Date': ['2020-01-01'] * 3})
+
+# Parsed excerpts: 1 challenge found, 1 lesson learnt found with a wrong sector, 1 extra
+PARSED_EXCERPTS = pd.DataFrame({
+    'Learning': ['Challenges', 'Lessons Learnt', 'Lessons Learnt'],
+    'Modified Excerpt': ['The warehouse was too far from the affected area.',
+                         'Pre-positioned stock speeds up the response.',
+                         'Something else entirely was learnt here.'],
+    'DREF_Sector_id': ['Health', 'Health', 'Health'],
+    'position': [1, 2, 3]})
+
+
+def parse_stub(txt, lead, PDFextras):
+    with tracing.span('parse'):
+        return PARSED_EXCERPTS.copy(), None
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        patches = [mock.patch.object(pu, 'get_PDFextras', return_value=Munch()),
+                   mock.patch.object(pu, 'get_PDFtext_from_lead', return_value=''),
+                   mock.patch.object(pu, 'get_CHLLs_from_text', side_effect=parse_stub)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def run_benchmark(self, **kwargs):
+        return benchmark.run_benchmark(TRUE_EXCERPTS, leads=[LEAD, 'MDRXX002'], verbose=False, **kwargs)
+
+    def test_counts(self):
+        report = self.run_benchmark()
+        self.assertEqual(len(report['documents']), 1)
+        totals = report['totals']
+        self.assertEqual(totals['CH'], dict(n_true=2, n_parsed=1, exact=1, partial=0, missed=1, extra=0,
+                                            sector_ok=1, sector_bad=0))
+        self.assertEqual(totals['LL'], dict(n_true=1, n_parsed=2, exact=1, partial=0, missed=0, extra=1,
+                                            sector_ok=0, sector_bad=1))
+        self.assertAlmostEqual(totals['exact_rate'], 2 / 3)
+        self.assertAlmostEqual(totals['sector_accuracy'], 1 / 2)
+        self.assertEqual(totals['n_errors'], 0)
+        self.assertIn('parse', totals['stages'])
+        self.assertIn('compare', totals['stages'])
+        self.assertIn('peak_memory_mb', totals)
+
+    def test_errors_are_reported(self):
+        pu.get_CHLLs_from_text.side_effect = ValueError('broken PDF')
+        report = self.run_benchmark(trace_memory=False, thresholds=dict(max_errors=0))
+        self.assertEqual(report['documents'][0]['error'], 'ValueError: broken PDF')
+        self.assertEqual(report['totals']['n_errors'], 1)
+        self.assertNotIn('peak_memory_mb', report['totals'])
+        self.assertFalse(report['passed'])
+
+    def test_gates(self):
+        report = self.run_benchmark(thresholds=dict(min_exact_rate=0.5, min_sector_accuracy=0.9,
+                                                    max_errors=0, max_seconds_per_document=None))
+        gates = report['gates']
+        self.assertEqual(set(gates), {'min_exact_rate', 'min_sector_accuracy', 'max_errors'})
+        self.assertTrue(gates['min_exact_rate']['passed'])
+        self.assertFalse(gates['min_sector_accuracy']['passed'])
+        self.assertTrue(gates['max_errors']['passed'])
+        self.assertFalse(report['passed'])
+
+        report = self.run_benchmark(thresholds=dict(min_exact_rate=0.5, max_errors=0))
+        self.assertTrue(report['passed'])
+
+    def test_gate_without_value_fails(self):
+        gates = benchmark.check_gates(dict(exact_rate=None, n_errors=0),
+                                      dict(min_exact_rate=0.1, max_errors=0))
+        self.assertFalse(gates['min_exact_rate']['passed'])
+        self.assertTrue(gates['max_errors']['passed'])
+
+    def test_settings_are_restored(self):
+        seen = []
+
+        def benchmark_lead(*args, **kwargs):
+            seen.append((tracing.tracing_enabled, pu.page_workers))
+            raise RuntimeError('interrupted')
+
+        with mock.patch.object(tracing, 'tracing_enabled', False), mock.patch.object(pu, 'page_workers', 4):
+            with mock.patch.object(benchmark, 'benchmark_lead', side_effect=benchmark_lead):
+                with self.assertRaises(RuntimeError):
+                    self.run_benchmark()
+            self.assertEqual(seen, [(True, 1)])
+            self.assertFalse(tracing.tracing_enabled)
+            self.assertEqual(pu.page_workers, 4)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            truth = os.path.join(tmpdir, 'truth.csv')
+            TRUE_EXCERPTS.to_csv(truth, index=False)
+            output = os.path.join(tmpdir, 'report.json')
+            args = ['benchmark', LEAD, '--truth', truth, '-o', output, '--no-memory']
+
+            with redirect_stderr(io.StringIO()), redirect_stdout(io.StringIO()):
+                self.assertEqual(cli.main(args + ['--min-exact-rate', '0.5']), 0)
+                self.assertEqual(cli.main(args + ['--min-exact-rate', '0.9']), 1)
+            self.assertTrue(os.path.exists(output))
+
+
+if __name__ == '__main__':
+    unittest.main()
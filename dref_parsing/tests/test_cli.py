@@ -0,0 +1,145 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import pandas as pd
+
+import dref_parsing.parser_utils as pu
+from dref_parsing import cli
+
+
+def parsed_excerpts(lead, n=None):
+    n = int(lead[-1]) if n is None else n
+    return pd.DataFrame({'Modified Excerpt': [f'Excerpt {i} of {lead}' for i in range(n)],
+                         'Learning': 'Challenges', 'DREF_Sector': 'Health', 'lead': lead,
+                         'Hazard': 'Flood', 'Country': 'Nowhere', 'Date': '2020-01-01', 'Region': 'Africa'})
+
+
+def parse_stub(lead, source='api', folder=''):
+    if lead in parse_stub.failing:
+        raise ValueError(f'cannot parse {lead}')
+    parse_stub.parsed.append(lead)
+    return parsed_excerpts(lead)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        parse_stub.failing = set()
+        parse_stub.parsed = []
+        patches = [mock.patch.object(pu, 'parse_PDF_combined', side_effect=parse_stub),
+                   mock.patch.object(pu, 'get_GO_snapshot', return_value=None)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def run_batch(self, leads, output, **kwargs):
+        with redirect_stdout(io.StringIO()):
+            return cli.run_batch(leads, output, n_workers=1, **kwargs)
+
+    def read_progress(self, output):
+        with open(output + '.progress.jsonl') as f:
+            return [json.loads(line) for line in f]
+
+    def test_csv_resume(self):
+        output = os.path.join(self.tmpdir, 'parsed.csv')
+        parse_stub.failing = {'MDRXX003'}
+        self.assertEqual(self.run_batch(['MDRXX001', 'MDRXX002', 'MDRXX003'], output), 1)
+        self.assertEqual(len(pd.read_csv(output)), 3)
+        self.assertEqual([r['error'] is None for r in self.read_progress(output)], [True, True, False])
+
+        # only the failed lead is parsed again
+        parse_stub.failing = set()
+        parse_stub.parsed = []
+        self.assertEqual(self.run_batch(['MDRXX001', 'MDRXX002', 'MDRXX003'], output), 0)
+        self.assertEqual(parse_stub.parsed, ['MDRXX003'])
+        parsed = pd.read_csv(output)
+        self.assertEqual(parsed['Appeal code'].value_counts().to_dict(),
+                         {'MDRXX001': 1, 'MDRXX002': 2, 'MDRXX003': 3})
+
+    def test_csv_rows_without_progress_are_dropped(self):
+        output = os.path.join(self.tmpdir, 'parsed.csv')
+        self.run_batch(['MDRXX001'], output)
+        # the run was killed after the rows of MDRXX002 were written, before its progress
+        with open(output, 'a', newline='') as f:
+            pu.format_parsed_output(parsed_excerpts('MDRXX002')).to_csv(f, header=False, index=False)
+            f.write('MDRXX002 partial ro')
+
+        self.run_batch(['MDRXX001', 'MDRXX002'], output)
+        self.assertEqual(parse_stub.parsed, ['MDRXX001', 'MDRXX002'])
+        parsed = pd.read_csv(output)
+        self.assertEqual(parsed['Appeal code'].value_counts().to_dict(), {'MDRXX001': 1, 'MDRXX002': 2})
+
+    def test_csv_killed_during_first_document(self):
+        output = os.path.join(self.tmpdir, 'parsed.csv')
+        with mock.patch.object(cli.BatchOutput, 'write', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_batch(['MDRXX002'], output)
+        with open(output, 'w') as f:
+            f.write('Excerpt,Learni')
+
+        self.run_batch(['MDRXX002'], output)
+        self.assertEqual(len(pd.read_csv(output)), 2)
+
+    def test_old_progress_log_keeps_output(self):
+        output = os.path.join(self.tmpdir, 'parsed.csv')
+        pu.format_parsed_output(parsed_excerpts('MDRXX001')).to_csv(output, index=False)
+        with open(output + '.progress.jsonl', 'w') as f:
+            f.write(json.dumps(dict(lead='MDRXX001', n_excerpts=1, error=None, seconds=1.0)) + '\n')
+
+        self.run_batch(['MDRXX001', 'MDRXX002'], output)
+        self.assertEqual(parse_stub.parsed, ['MDRXX002'])
+        self.assertEqual(len(pd.read_csv(output)), 3)
+
+    def test_parquet(self):
+        output = os.path.join(self.tmpdir, 'parsed.parquet')
+        self.run_batch(['MDRXX001', 'MDRXX002'], output, fmt='parquet')
+        self.assertEqual(sorted(os.listdir(output)), ['MDRXX001.parquet', 'MDRXX002.parquet'])
+        self.assertEqual(len(pd.read_parquet(output)), 3)
+
+        # parsing again replaces the parts of previous runs
+        parse_stub.failing = {'MDRXX002'}
+        self.run_batch(['MDRXX002', 'MDRXX003'], output, fmt='parquet', resume=False)
+        self.assertEqual(os.listdir(output), ['MDRXX003.parquet'])
+        self.assertEqual([r['lead'] for r in self.read_progress(output)], ['MDRXX002', 'MDRXX003'])
+
+    def test_csv_no_resume(self):
+        output = os.path.join(self.tmpdir, 'parsed.csv')
+        self.run_batch(['MDRXX001', 'MDRXX002'], output)
+        parse_stub.parsed = []
+
+        self.run_batch(['MDRXX001', 'MDRXX002'], output, resume=False)
+        self.assertEqual(parse_stub.parsed, ['MDRXX001', 'MDRXX002'])
+        parsed = pd.read_csv(output)
+        self.assertEqual(parsed['Appeal code'].value_counts().to_dict(), {'MDRXX001': 1, 'MDRXX002': 2})
+        self.assertEqual([r['lead'] for r in self.read_progress(output)], ['MDRXX001', 'MDRXX002'])
+
+    def test_command(self):
+        pdf_dir = os.path.join(self.tmpdir, 'pdfs')
+        os.makedirs(pdf_dir)
+        for lead in ['MDRXX001', 'MDRXX002']:
+            open(os.path.join(pdf_dir, f'{lead}.pdf'), 'w').close()
+        leads_file = os.path.join(self.tmpdir, 'leads.txt')
+        with open(leads_file, 'w') as f:
+            f.write('MDRXX003\n\nMDRXX001\n')
+        output = os.path.join(self.tmpdir, 'parsed.csv')
+
+        parse_stub.failing = {'MDRXX003'}
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(cli.main(['batch', '--pdf-dir', pdf_dir, '--leads-file', leads_file,
+                                       '-o', output, '--workers', '1']), 1)
+            parse_stub.failing = set()
+            self.assertEqual(cli.main(['batch', '--leads-file', leads_file, '-o', output, '-j', '1']), 0)
+        self.assertEqual(sorted(parse_stub.parsed), ['MDRXX001', 'MDRXX002', 'MDRXX003'])
+        self.assertEqual(len(pd.read_csv(output)), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+
+from dref_parsing.go_api import GOClient, AsyncGOClient, page_offsets
+from dref_parsing.go_api_stub import StubGOServer
+
+
+APPEALS = [{'id': i, 'code': f'MDRXX{i:03d}'} for i in range(23)]
+
+
+class TestGOClients(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubGOServer({'appeal': APPEALS}, max_limit=5).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.base_url = self.server.base_url
+
+    def get_async_results(self, **kwargs):
+        async def get_results():
+            async with AsyncGOClient(base_url=self.base_url, **kwargs) as client:
+                return await client.get_results('appeal')
+        return asyncio.run(get_results())
+
+    def test_page_offsets_step_by_returned_results(self):
+        first_page = {'count': 23, 'next': 'next', 'results': APPEALS[:5]}
+        self.assertEqual(page_offsets(first_page), [5, 10, 15, 20])
+        self.assertIsNone(page_offsets(dict(first_page, count=None)))
+
+    def test_get_results_limit_capped_by_server(self):
+        """
+        The server returns fewer results per page than asked for: all pages are still fetched, in order.
+        """
+        results = GOClient(base_url=self.base_url, page_size=10).get_results('appeal')
+        self.assertEqual(results, APPEALS)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_get_results_without_count(self):
+        """
+        Without total count, the pages are followed one by one.
+        """
+        self.server.no_count = True
+        results = GOClient(base_url=self.base_url, page_size=10).get_results('appeal')
+        self.assertEqual(results, APPEALS)
+
+    def test_retry_failed_requests(self):
+        self.server.failures = 2
+        results = GOClient(base_url=self.base_url, page_size=10, backoff=0).get_results('appeal')
+        self.assertEqual(results, APPEALS)
+
+    def test_async_get_results_limit_capped_by_server(self):
+        results = self.get_async_results(page_size=10)
+        self.assertEqual(results, APPEALS)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_async_get_results_without_count(self):
+        self.server.no_count = True
+        self.assertEqual(self.get_async_results(page_size=10), APPEALS)
+
+    def test_async_retry_failed_requests(self):
+        self.server.failures = 2
+        self.assertEqual(self.get_async_results(page_size=10, backoff=0), APPEALS)
@@ -0,0 +1,130 @@
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import dref_parsing.parser_utils as pu
+
+
+def appeal(id, name, country, dtype='Flood'):
+    return {'id': id, 'code': f'MDRXX{id:03d}', 'name': name, 'dtype': {'name': dtype},
+            'country': {'name': country}, 'region': {'region_name': 'Africa'},
+            'start_date': '2021-03-01T00:00:00Z', 'status': 0}
+
+
+def document(id, appeal_id, name='DREF Final Report'):
+    return {'id': id, 'name': name, 'appeal': {'id': appeal_id},
+            'document_url': f'https://go.example.org/{appeal_id}.pdf'}
+
+
+class GOStub:
+    "Results of download_api_results: all records, or the changed ones if a filter is given"
+
+    def __init__(self, records):
+        self.records = records
+        self.changed = {'appeal': [], 'appeal_document': []}
+        self.calls = []
+
+    def download_api_results(self, call='appeal', params=None):
+        self.calls.append((call, params))
+        return pd.DataFrame(self.records[call] if params is None else self.changed[call])
+
+
+class TestSyncGOSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.go = GOStub({
+            'appeal': [appeal(1, 'Kenya: Floods', 'Kenya'), appeal(2, 'Chad: Cholera outbreak', 'Chad', 'Other')],
+            'appeal_document': [document(10, 1), document(11, 2), document(12, 2, name='Operation Update')],
+        })
+        patches = [mock.patch.object(pu, 'download_api_results', side_effect=self.go.download_api_results),
+                   mock.patch.object(pu, 'GO_snapshot', pu.GOSnapshot())]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def assert_categorical(self, aadf):
+        for column in pu.appeal_categories:
+            self.assertIsInstance(aadf[column].dtype, pd.CategoricalDtype, column)
+
+    def test_full_sync(self):
+        # records are counted after preprocessing (only DREF Final Reports are kept)
+        self.assertEqual(pu.sync_GO_snapshot(), {'appeal': 2, 'appeal_document': 2})
+        self.assertEqual(self.go.calls, [('appeal', None), ('appeal_document', None)])
+
+        snapshot = pu.get_GO_snapshot()
+        self.assertEqual(snapshot.aadf['code'].to_list(), ['MDRXX001', 'MDRXX002'])
+        self.assertEqual(snapshot.aadf['hazard'].to_list(), ['Flood', 'Epidemic'])
+        self.assert_categorical(snapshot.aadf)
+        self.assertEqual(snapshot.apdo['id'].to_list(), [10, 11])
+        self.assertEqual(snapshot.merged['document_url'].to_list(),
+                         ['https://go.example.org/1.pdf', 'https://go.example.org/2.pdf'])
+        self.assertEqual(set(snapshot.watermarks), {'appeal', 'appeal_document'})
+
+    def test_incremental_sync(self):
+        pu.sync_GO_snapshot()
+        first = pu.get_GO_snapshot()
+
+        # appeal 2 is changed, appeal 3 and its report are new
+        self.go.changed = {'appeal': [appeal(2, 'Niger: Cholera outbreak', 'Niger', 'Epidemic'),
+                                      appeal(3, 'Peru: Cold wave', 'Peru', 'Cold Wave')],
+                           'appeal_document': [document(13, 3)]}
+        self.go.calls = []
+        self.assertEqual(pu.sync_GO_snapshot(), {'appeal': 2, 'appeal_document': 1})
+        self.assertEqual(self.go.calls, [
+            ('appeal', {'modified_at__gte': first.watermarks['appeal']}),
+            ('appeal_document', {'created_at__gte': first.watermarks['appeal_document']}),
+        ])
+
+        snapshot = pu.get_GO_snapshot()
+        self.assertIsNot(snapshot, first)
+        aadf = snapshot.aadf.set_index('id')
+        self.assertEqual(aadf['code'].to_list(), ['MDRXX001', 'MDRXX002', 'MDRXX003'])
+        self.assertEqual(aadf['country_name'].to_list(), ['Kenya', 'Niger', 'Peru'])
+        self.assertEqual(aadf['hazard'].to_list(), ['Flood', 'Epidemic', 'Cold Wave'])
+        self.assertEqual(snapshot.apdo['id'].to_list(), [10, 11, 13])
+        self.assertEqual(len(snapshot.merged), 3)
+
+        # categories of old and new records are merged
+        self.assert_categorical(snapshot.aadf)
+        self.assertEqual(set(snapshot.aadf['country_name'].cat.categories), {'Kenya', 'Niger', 'Peru'})
+
+        # the previous snapshot is not changed
+        self.assertEqual(first.aadf['country_name'].to_list(), ['Kenya', 'Chad'])
+        self.assertEqual(len(first.apdo), 2)
+
+    def test_no_changes(self):
+        pu.sync_GO_snapshot()
+        first = pu.get_GO_snapshot()
+        self.assertEqual(pu.sync_GO_snapshot(), {'appeal': 0, 'appeal_document': 0})
+        pd.testing.assert_frame_equal(pu.get_GO_snapshot().aadf, first.aadf)
+
+    def test_deleted_records_are_removed_by_full_sync(self):
+        pu.sync_GO_snapshot()
+        self.go.records['appeal'] = self.go.records['appeal'][:1]
+
+        pu.sync_GO_snapshot()
+        self.assertEqual(len(pu.get_GO_snapshot().aadf), 2)
+
+        pu.sync_GO_snapshot(full=True)
+        self.assertEqual(pu.get_GO_snapshot().aadf['code'].to_list(), ['MDRXX001'])
+
+
+class TestMergeApiResults(unittest.TestCase):
+
+    def test_replace_and_append_by_id(self):
+        old = pd.DataFrame({'id': [1, 2, 3], 'name': ['a', 'b', 'c']}).astype({'name': 'category'})
+        new = pd.DataFrame({'id': [2, 4], 'name': ['B', 'd']}).astype({'name': 'category'})
+        merged = pu.merge_api_results(old, new)
+        self.assertEqual(merged['id'].to_list(), [1, 3, 2, 4])
+        self.assertEqual(merged['name'].to_list(), ['a', 'c', 'B', 'd'])
+        self.assertIsInstance(merged['name'].dtype, pd.CategoricalDtype)
+
+    def test_empty(self):
+        old = pd.DataFrame({'id': [1], 'name': ['a']})
+        self.assertIs(pu.merge_api_results(old, pd.DataFrame()), old)
+        self.assertIs(pu.merge_api_results(pd.DataFrame(), old), old)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import io
+import unittest
+from unittest import mock
+
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from dref_parsing import outputs
+from dref_parsing.outputs import OutputFormat, output_response
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def read_csv(body):
+    return pd.read_csv(io.BytesIO(body), keep_default_na=False)
+
+
+def read_ndjson(body):
+    return pd.read_json(io.BytesIO(body), lines=True, dtype=False)
+
+
+def read_arrow(body):
+    return pyarrow.ipc.open_stream(body).read_pandas()
+
+
+def read_parquet(body):
+    return pd.read_parquet(io.BytesIO(body))
+
+
+class TestOutputs(unittest.TestCase):
+
+    df = pd.DataFrame({
+        'Modified Excerpt': ['Roads were blocked, "so" trucks\ncould not pass', 'Équipe formée', 'Short', '', 'Last'],
+        'Learning': ['Challenges', 'Lessons Learnt', 'Challenges', 'Challenges', 'Lessons Learnt'],
+        'position': [0, 1, 2, 3, 4],
+        'score': [0.5, 1.25, 2.0, 0.0, 3.5],
+    })
+
+    def setUp(self):
+        # 5 rows in chunks of 2 rows
+        patch = mock.patch.object(outputs, 'output_chunk_rows', 2)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def get(self, df, output_format):
+        app = FastAPI()
+
+        @app.get('/export/')
+        async def export():
+            return output_response(df, output_format)
+
+        return TestClient(app).get('/export/')
+
+    def assert_round_trip(self, output_format, read, df=None):
+        df = self.df if df is None else df
+        chunks = list(outputs.output_writers[output_format](df))
+        self.assertGreater(len(chunks), 2)
+
+        response = self.get(df, output_format)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith(outputs.media_types[output_format]))
+        self.assertEqual(response.headers['content-disposition'],
+                         f'attachment; filename=export.{output_format.value}')
+        self.assertEqual(response.content, b''.join(chunk if isinstance(chunk, bytes) else chunk.encode()
+                                                    for chunk in chunks))
+        pd.testing.assert_frame_equal(read(response.content), df)
+
+    def test_csv(self):
+        self.assert_round_trip(OutputFormat.csv, read_csv)
+
+    def test_ndjson(self):
+        self.assert_round_trip(OutputFormat.ndjson, read_ndjson)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_arrow(self):
+        self.assert_round_trip(OutputFormat.arrow, read_arrow)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        self.assert_round_trip(OutputFormat.parquet, read_parquet)
+        body = self.get(self.df, OutputFormat.parquet).content
+        # each chunk is a row group
+        self.assertEqual(pyarrow.parquet.ParquetFile(io.BytesIO(body)).num_row_groups, 3)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_empty(self):
+        df = self.df.iloc[:0]
+        for output_format, read in [(OutputFormat.arrow, read_arrow), (OutputFormat.parquet, read_parquet)]:
+            body = self.get(df, output_format).content
+            self.assertEqual(list(read(body).columns), list(df.columns))
+        self.assertEqual(self.get(df, OutputFormat.csv).text.strip(), ','.join(df.columns))
+        self.assertEqual(self.get(df, OutputFormat.ndjson).text, '')
+
+    def test_json(self):
+        self.assertEqual(self.get(self.df, OutputFormat.json).json()['Learning']['1'], 'Lessons Learnt')
+
+
+class TestChunkSink(unittest.TestCase):
+
+    def test_take(self):
+        sink = outputs.ChunkSink()
+        sink.write(b'abc')
+        sink.write(memoryview(b'de'))
+        self.assertEqual(sink.take(), b'abcde')
+        sink.write(b'f')
+        self.assertEqual(sink.tell(), 6)
+        self.assertEqual(sink.take(), b'f')
+        self.assertEqual(sink.take(), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
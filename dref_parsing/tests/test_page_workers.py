@@ -0,0 +1,52 @@
+import io
+import unittest
+from unittest import mock
+
+import dref_parsing.parser_utils as pu
+from tests.pdfs import make_pdf
+
+
+def make_pages(n_pages):
+    "Pages with a header, a body and a footer; every fourth page is empty"
+    pages = []
+    for i in range(n_pages):
+        if i % 4 == 3:
+            pages.append([])
+        else:
+            pages.append([f'DREF Final Report {i % 2}', f'Body text of page {i + 1}', f'Page {i + 1}'])
+    return pages
+
+
+class TestHeaderFooterCandidates(unittest.TestCase):
+
+    def setUp(self):
+        self.pdf = make_pdf(make_pages(11))
+
+    def test_pooled_same_as_serial(self):
+        """
+        Candidates of pages processed by a pool of processes are the same, in the page order,
+        and empty pages repeat the candidates of the previous page across chunks too.
+        """
+        self.assertGreaterEqual(11, pu.min_pages_parallel)
+        serial = list(pu.iter_header_footer_candidates(self.pdf, n_workers=1))
+        self.assertEqual(len(serial), 11)
+        self.assertEqual(serial[3], serial[2])
+        self.assertEqual([footer.strip() for _, footer, _ in serial[:3]], ['Page 1', 'Page 2', 'Page 3'])
+
+        for workers in [2, 3, 6]:
+            pooled = list(pu.iter_header_footer_candidates(self.pdf, n_workers=workers))
+            self.assertEqual(pooled, serial, workers)
+
+    def test_file_like_pdf(self):
+        self.assertEqual(pu.get_header_footer_candidates(io.BytesIO(self.pdf), n_workers=3),
+                         pu.get_header_footer_candidates(self.pdf, n_workers=1))
+
+    def test_small_pdf_not_pooled(self):
+        with mock.patch.object(pu, 'ProcessPoolExecutor') as executor:
+            candidates = list(pu.iter_header_footer_candidates(make_pdf(make_pages(3)), n_workers=3))
+        executor.assert_not_called()
+        self.assertEqual(len(candidates), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
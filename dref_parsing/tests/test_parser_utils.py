@@ -0,0 +1,246 @@
+import random
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from munch import Munch
+
+import dref_parsing.parser_utils as pu
+
+
+class TestBoundedCache(unittest.TestCase):
+
+    def test_keeps_most_recently_used(self):
+        cache = pu.BoundedCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache['a']
+        cache['c'] = 3
+        self.assertEqual(cache.keys(), ['a', 'c'])
+        self.assertIsNone(cache.get('b'))
+
+    def test_concurrent_access(self):
+        cache = pu.BoundedCache(maxsize=8)
+        errors = []
+
+        def work(k):
+            try:
+                for i in range(2000):
+                    key = (k * i) % 20
+                    cache[key] = i
+                    cache.get((key + 1) % 20)
+                    if key in cache:
+                        cache.get(key)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(k,)) for k in range(1, 9)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(cache), 8)
+
+
+class TestPDFextras(unittest.TestCase):
+
+    old_PDFextra = Munch(headers=['Header\n'] * 4 + ['Other\n'],
+                         footers=[f'Footer {i}\n' for i in range(1, 6)],
+                         postheaders=[''] * 5)
+
+    def test_old_format_is_converted(self):
+        PDFextra = pu.as_header_footer(self.old_PDFextra)
+        self.assertEqual(PDFextra.version, pu.PDFextra_version)
+        self.assertEqual(PDFextra.header, 'Header')
+        self.assertTrue(PDFextra.footer.startswith('Footer'))
+
+    def test_old_format_is_converted_on_load(self):
+        PDFextras = Munch(MDRXX001=self.old_PDFextra)
+        with mock.patch.object(pu, 'detect_header_footer') as detect:
+            PDFextras = pu.get_PDFextras(['MDRXX001'], PDFextras)
+        detect.assert_not_called()
+        self.assertEqual(PDFextras.MDRXX001, pu.as_header_footer(self.old_PDFextra))
+
+    def test_old_format_is_removed_from_text(self):
+        txt = 'Header\nSome text\nFooter 1\nHeader\nMore text\nFooter 2\n'
+        self.assertEqual(pu.remove_header(txt, self.old_PDFextra),
+                         pu.remove_header(txt, pu.as_header_footer(self.old_PDFextra)))
+        self.assertNotIn('Header', pu.remove_header(txt, self.old_PDFextra))
+
+
+def old_build_comp_matrix(chs_true, chs_parsed, n=30):
+    "Matrix as built before, by comparing every pair of strings"
+    matr = np.zeros((len(chs_true), len(chs_parsed)))
+    for i in range(len(chs_true)):
+        start = chs_true[i][:n]
+        for j in range(len(chs_parsed)):
+            if chs_parsed[j].lower().count(start.lower()) > 0:
+                matr[i, j] = 1
+            if chs_true[i].lower().count(chs_parsed[j][:n].lower()) > 0:
+                matr[i, j] = 1
+            if chs_parsed[j][:n].lower() == chs_true[i][:n].lower():
+                matr[i, j] = 2
+            if chs_parsed[j].strip('.') == chs_true[i].strip('.'):
+                matr[i, j] = 3
+    return matr.astype(int)
+
+
+def old_assess_match(matr):
+    "Assessment as computed before, row by row and column by column"
+    nt, np_ = matr.shape
+    missed, exact, not_exact, extra = [], [], [], []
+    if np_ == 0:
+        missed = list(range(nt))
+    else:
+        for i in range(nt):
+            if matr.sum(axis=1)[i] == 0:
+                missed.append(i)
+            if matr.max(axis=1)[i] == 3:
+                exact.append(i)
+            if matr.max(axis=1)[i] != 3:
+                not_exact.append(i)
+    for j in range(np_):
+        if matr.sum(axis=0)[j] == 0:
+            extra.append(j)
+    return Munch(nt=nt, np=np_, nexact=len(exact), n_notexact=len(not_exact),
+                 missed=missed, extra=extra, not_exact=not_exact, exact=exact)
+
+
+class TestCompMatrix(unittest.TestCase):
+
+    words = ['Flood', 'flood', 'water', 'the', 'volunteers', 'Volunteers', 'were', 'trained', 'late', 'stocks', '.']
+
+    def random_excerpt(self, excerpts):
+        kind = random.randrange(6)
+        if kind == 0:
+            return ''
+        if excerpts and kind == 1:
+            # duplicate
+            return random.choice(excerpts)
+        if excerpts and kind == 2:
+            # partial start or middle of another excerpt, maybe with other case or a dot
+            other = random.choice(excerpts)
+            i = random.randrange(len(other) + 1)
+            part = other[i:i + random.randrange(1, 50)]
+            return random.choice([part, part.upper(), part + '.', '.' + part])
+        return ' '.join(random.choice(self.words) for _ in range(random.randrange(1, 15)))
+
+    def random_excerpts(self, excerpts=None):
+        excerpts = [] if excerpts is None else list(excerpts)
+        new = []
+        for _ in range(random.randrange(8)):
+            new.append(self.random_excerpt(excerpts + new))
+        return new
+
+    def test_same_as_old_implementation(self):
+        random.seed(0)
+        for _ in range(300):
+            chs_true = self.random_excerpts()
+            chs_parsed = self.random_excerpts(chs_true)
+            n = random.choice([5, 10, 30])
+            matr = pu.build_comp_matrix(chs_true, chs_parsed, n=n)
+            np.testing.assert_array_equal(matr, old_build_comp_matrix(chs_true, chs_parsed, n=n),
+                                          err_msg=f'{chs_true} {chs_parsed}')
+            if len(chs_true) > 0:
+                self.assertEqual(pu.assess_match(matr), old_assess_match(matr))
+
+    def test_separator_in_start(self):
+        chs_true = ['a\x00b', 'x']
+        chs_parsed = ['a\x00b c', 'b']
+        np.testing.assert_array_equal(pu.build_comp_matrix(chs_true, chs_parsed),
+                                      old_build_comp_matrix(chs_true, chs_parsed))
+
+    def test_no_true_excerpts(self):
+        matr = pu.build_comp_matrix([], ['Parsed excerpt', ''])
+        self.assertEqual(matr.shape, (0, 2))
+        self.assertEqual(pu.assess_match(matr).extra, [0, 1])
+
+
+def old_get_hazard_from_names(name, dtype_name):
+    "Hazard as decoded before, by checking the rules in order"
+    if dtype_name in pu.all_hazards:
+        return dtype_name
+    hazard_from_title = pu.split_report_title(str(name))[1]
+    hazard_from_title = hazard_from_title.replace('Floods', 'Flood').replace('Storms', 'Storm')
+    if hazard_from_title in pu.all_hazards:
+        return hazard_from_title
+    if hazard_from_title in ['Flash Flood', 'Pluvial']:
+        return 'Pluvial/Flash Flood'
+    if hazard_from_title.lower().count('hailstorm') > 0:
+        return 'Cold Wave'
+    if hazard_from_title.lower().count('strong wind') > 0:
+        return 'Storm Surge'
+    if hazard_from_title.lower().count('attack') > 0:
+        return 'Civil Unrest'
+    if hazard_from_title.lower().count('outbreak') > 0:
+        return 'Epidemic'
+    hazards_with_commons = [h for h in pu.all_hazards if len(pu.get_common_words(h, hazard_from_title)) > 0]
+    if len(hazards_with_commons) > 0:
+        return hazards_with_commons[0]
+    return 'Other'
+
+
+class TestHazards(unittest.TestCase):
+
+    # (title, disaster type, hazard)
+    table = [
+        ('Kenya: Floods', 'Flood', 'Flood'),
+        ('Kenya: Floods', 'Cyclone', 'Cyclone'),
+        ('Kenya: Floods', None, 'Flood'),
+        ('Kenya: Floods', 'Other', 'Flood'),
+        ('Chad - Storms', None, 'Storm Surge'),
+        ('Niger: Flash Flood', None, 'Pluvial/Flash Flood'),
+        ('Niger: Pluvial', 'Unknown', 'Pluvial/Flash Flood'),
+        ('Mali: Cholera outbreak', None, 'Epidemic'),
+        # several keywords: the first keyword rule wins
+        ('Peru: Hailstorm and strong wind', None, 'Cold Wave'),
+        ('Fiji: Strong wind after attack', None, 'Storm Surge'),
+        ('Sudan: Armed attack and outbreak', None, 'Civil Unrest'),
+        # several hazards with common words: the first hazard in all_hazards wins
+        ('Fiji: Tropical Cyclone Winston', None, 'Cyclone'),
+        ('Chad: Storm and Flood wave', None, 'Flood'),
+        ('Iran: Cold wave and fire', None, 'Fire'),
+        ('India: Heat wave', None, 'Cold Wave'),
+        ('Italy: Volcanic activity and earthquake', None, 'Earthquake'),
+        ('Chad: Population movement', None, 'Population Movement'),
+        # the title is split at the first separator in the order of split_report_title
+        ('Chad: Flood-Drought', None, 'Drought'),
+        # no hazard
+        ('Japan - Tsunami', 'Tsunami', 'Other'),
+        ('Nowhere: Complex Emergency', None, 'Other'),
+        ('Title', None, 'Other'),
+        ('', None, 'Other'),
+        (None, None, 'Other'),
+        (float('nan'), None, 'Other'),
+    ]
+
+    def test_table(self):
+        for name, dtype_name, hazard in self.table:
+            self.assertEqual(pu.get_hazard_from_names(name, dtype_name), hazard, (name, dtype_name))
+            self.assertEqual(old_get_hazard_from_names(name, dtype_name), hazard, (name, dtype_name))
+
+    def test_same_as_old_rules(self):
+        random.seed(0)
+        words = [word for hazard in pu.all_hazards for word in hazard.split(' ')] + \
+            ['Floods', 'Storms', 'Pluvial', 'outbreak', 'Hailstorm', 'strong', 'wind', 'attack', 'and', 'Complex', '-']
+        dtype_names = pu.all_hazards + ['Other', 'Tsunami', None]
+        for _ in range(5000):
+            hazard = ' '.join(random.choice(words) for _ in range(random.randrange(4)))
+            name = random.choice(['Country: ', 'Country - ', 'Country ', '']) + hazard
+            dtype_name = random.choice(dtype_names) if random.random() < 0.2 else None
+            self.assertEqual(pu.get_hazard_from_names(name, dtype_name),
+                             old_get_hazard_from_names(name, dtype_name), (name, dtype_name))
+
+    def test_hazards_of_appeals(self):
+        aadf = pd.DataFrame([(name, dtype_name) for name, dtype_name, _ in self.table] * 2,
+                            columns=['name', 'dtype_name']).astype({'dtype_name': 'category'})
+        hazards = pu.get_hazards_of_appeals(aadf)
+        self.assertEqual(hazards.dtype, 'category')
+        self.assertEqual(hazards.to_list(), [hazard for _, _, hazard in self.table] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
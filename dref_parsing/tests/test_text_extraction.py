@@ -0,0 +1,54 @@
+import unittest
+
+import dref_parsing.parser_utils as pu
+from dref_parsing.text_extraction import TextBackend, text_backends, get_text_backend, default_text_backend
+from tests.pdfs import make_pdf
+
+
+class TestTextBackends(unittest.TestCase):
+
+    def test_backend_must_extract_text(self):
+        class NoTextBackend(TextBackend):
+            name = 'none'
+
+        with self.assertRaises(TypeError):
+            NoTextBackend()
+
+    def test_get_text_backend(self):
+        self.assertEqual(set(text_backends), {'tika', 'pdfminer'})
+        self.assertEqual(default_text_backend, 'pdfminer')
+        self.assertIs(get_text_backend('pdfminer'), text_backends['pdfminer'])
+        with self.assertRaises(ValueError):
+            get_text_backend('unknown')
+
+
+class TestPdfminerBackend(unittest.TestCase):
+
+    pages = [
+        ['Challenges\nThe roads were blocked by the floods.', 'Volunteers could not reach the villages.'],
+        ['Lessons Learnt\nPrepositioned stocks were useful.'],
+    ]
+
+    def test_layout(self):
+        """
+        Lines of a paragraph are separated by a linebreak, paragraphs by an empty line,
+        and each page starts after a linebreak and ends with a linebreak.
+        """
+        text = text_backends['pdfminer'].extract_text(make_pdf(self.pages))
+        self.assertEqual(
+            text,
+            '\nChallenges\nThe roads were blocked by the floods.\n\nVolunteers could not reach the villages.\n\n\n'
+            '\nLessons Learnt\nPrepositioned stocks were useful.\n\n\n'
+        )
+
+    def test_paragraphs_split(self):
+        text = text_backends['pdfminer'].extract_text(make_pdf(self.pages))
+        page = text.split('\n\n\n\n')[0]
+        self.assertEqual(pu.split_text_by_separator(page.strip('\n')), [
+            'Challenges\nThe roads were blocked by the floods.',
+            'Volunteers could not reach the villages.',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from dref_parsing import tracing
+
+
+def get_app():
+    app = FastAPI()
+    tracing.add_tracing(app)
+
+    @app.get('/parse/')
+    async def parse():
+        with tracing.span('text_extraction'):
+            pass
+        with tracing.span('text_extraction'):
+            pass
+        return {'ok': True}
+
+    return app
+
+
+class TestSpans(unittest.TestCase):
+
+    @mock.patch.object(tracing, 'tracing_enabled', True)
+    def test_spans_summed_in_trace(self):
+        with tracing.new_trace('lead') as trace:
+            for _ in range(2):
+                with tracing.span('text_extraction'):
+                    pass
+            with tracing.span('sectors'):
+                pass
+        self.assertEqual(trace.counts, {'text_extraction': 2, 'sectors': 1})
+        self.assertEqual(trace.to_dict()['name'], 'lead')
+        self.assertIs(tracing.recent_traces[-1], trace)
+        self.assertRegex(trace.server_timing(), r'^text_extraction;dur=[0-9.]+, sectors;dur=[0-9.]+$')
+
+        # spans outside of a trace are not collected
+        with tracing.span('text_extraction'):
+            pass
+        self.assertEqual(trace.counts['text_extraction'], 2)
+
+    @mock.patch.object(tracing, 'tracing_enabled', False)
+    def test_disabled(self):
+        self.assertIs(tracing.span('text_extraction'), tracing.null_span)
+        with tracing.new_trace('lead') as trace:
+            with tracing.span('text_extraction'):
+                pass
+        self.assertEqual(trace.counts, {})
+
+    @unittest.skipIf(tracing.prometheus_client is None, 'prometheus_client is not installed')
+    @mock.patch.object(tracing, 'tracing_enabled', True)
+    def test_prometheus_histogram(self):
+        def count():
+            return tracing.prometheus_client.REGISTRY.get_sample_value(
+                'dref_stage_seconds_count', {'stage': 'test_stage'}) or 0
+
+        before = count()
+        with tracing.span('test_stage'):
+            pass
+        self.assertEqual(count(), before + 1)
+
+
+class TestAppTracing(unittest.TestCase):
+
+    @mock.patch.object(tracing, 'tracing_enabled', True)
+    def test_traced_request(self):
+        client = TestClient(get_app())
+        response = client.get('/parse/')
+        self.assertEqual(response.status_code, 200)
+        stages = [timing.split(';')[0] for timing in response.headers['Server-Timing'].split(', ')]
+        self.assertEqual(stages, ['text_extraction', 'total'])
+
+        timings = client.get('/debug/timings/', params={'n': 1}).json()
+        self.assertEqual(timings[0]['counts'], {'text_extraction': 2, 'total': 1})
+
+    @mock.patch.object(tracing, 'tracing_enabled', False)
+    def test_untraced_request(self):
+        client = TestClient(get_app())
+        response = client.get('/parse/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response.headers)
+        self.assertEqual(client.get('/debug/timings/').status_code, 404)
+        self.assertEqual(client.get('/metrics').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
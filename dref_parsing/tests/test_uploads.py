@@ -0,0 +1,105 @@
+import io
+import unittest
+
+from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi.testclient import TestClient
+
+from dref_parsing.uploads import add_upload_limit, check_pdf_upload, ExceptionNotPDF, ExceptionTooManyPages
+from tests.pdfs import make_pdf
+
+
+def get_app(max_size, max_pages):
+    "App checking uploads as the PARSE+TAG app does"
+    app = FastAPI()
+    add_upload_limit(app, max_size=max_size)
+
+    @app.post('/parse/')
+    async def parse(pdf_file: UploadFile = File(...)):
+        try:
+            n_pages = check_pdf_upload(pdf_file.file, max_pages=max_pages)
+        except ExceptionNotPDF as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ExceptionTooManyPages as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        return {'pages': n_pages, 'size': len(pdf_file.file.read())}
+
+    return app
+
+
+def multipart_body(content, boundary='dref-boundary'):
+    return (f'--{boundary}\r\nContent-Disposition: form-data; name="pdf_file"; filename="report.pdf"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+
+
+class TestUploads(unittest.TestCase):
+
+    max_size = 20000
+
+    def setUp(self):
+        self.client = TestClient(get_app(max_size=self.max_size, max_pages=3))
+        self.pdf = make_pdf([['Challenges\nThe roads were blocked.'], ['Lessons Learnt']])
+
+    def post(self, content):
+        return self.client.post('/parse/', files={'pdf_file': ('report.pdf', content, 'application/pdf')})
+
+    def test_small_pdf(self):
+        response = self.post(self.pdf)
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.json(), {'pages': 2, 'size': len(self.pdf)})
+
+    def test_pdf_header_after_garbage(self):
+        response = self.post(b'\x00' * 100 + self.pdf)
+        self.assertEqual(response.status_code, 200, response.text)
+
+    def test_not_pdf(self):
+        response = self.post(b'<html>Not a report</html>')
+        self.assertEqual(response.status_code, 415)
+        self.assertIn('no PDF header', response.json()['detail'])
+
+    def test_broken_pdf(self):
+        response = self.post(b'%PDF-1.4\nbroken')
+        self.assertEqual(response.status_code, 415)
+        self.assertIn('can not be read', response.json()['detail'])
+
+    def test_too_many_pages(self):
+        response = self.post(make_pdf([['Page']] * 4))
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('4 pages', response.json()['detail'])
+
+    def test_too_large_by_content_length(self):
+        response = self.post(self.pdf + b' ' * self.max_size)
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('too large', response.json()['detail'])
+
+    def test_too_large_chunked(self):
+        body = multipart_body(self.pdf + b' ' * self.max_size)
+
+        def chunks():
+            # streamed without Content-Length (Transfer-Encoding: chunked)
+            for start in range(0, len(body), 4096):
+                yield body[start:start + 4096]
+
+        response = self.client.post('/parse/', content=chunks(),
+                                    headers={'Content-Type': 'multipart/form-data; boundary=dref-boundary'})
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('too large', response.json()['detail'])
+
+    def test_small_chunked(self):
+        body = multipart_body(self.pdf)
+        response = self.client.post('/parse/', content=iter([body[:100], body[100:]]),
+                                    headers={'Content-Type': 'multipart/form-data; boundary=dref-boundary'})
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual(response.json()['pages'], 2)
+
+
+class TestCheckPDFUpload(unittest.TestCase):
+
+    def test_file_is_rewound(self):
+        file = io.BytesIO(make_pdf([['Page'], ['Page']]))
+        file.seek(10)
+        self.assertEqual(check_pdf_upload(file, max_pages=2), 2)
+        self.assertEqual(file.tell(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
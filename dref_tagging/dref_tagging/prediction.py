@@ -27,6 +27,12 @@ from typing import List, Sequence, Tuple, Union
 
 from dref_tagging.tag_utils import split_into_chunks, merge_predicted_tags
 
+try:
+    from dref_parsing.tracing import span
+except ImportError:
+    # tracing spans come with dref_parsing, without it they do nothing
+    from contextlib import nullcontext as span
+
 # **************************************************************************
 # SETUP / PREPARATIONS
 # **************************************************************************
@@ -88,7 +94,8 @@ def predict_tags_any_length(
     divided_text, text_indicies = split_into_chunks(eval_texts, max_len = max_len, verbose=0) 
 
     # make predictions on the chunks
-    returned_texts, predictions = predict_tags(divided_text, forcetag = forcetag)
+    with span('bert_tagging'):
+        returned_texts, predictions = predict_tags(divided_text, forcetag = forcetag)
 
     # merge the predictions
     merged_predictions = merge_predicted_tags(predictions, text_indicies) 
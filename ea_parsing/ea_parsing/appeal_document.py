@@ -1,20 +1,52 @@
-import requests
-from functools import cached_property
+import os
+import tempfile
+from array import array
+from functools import cached_property, lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import fitz
+import numpy as np
 import pandas as pd
 import ea_parsing.definitions
 from ea_parsing import utils
 from ea_parsing.sectors import Sectors
 from ea_parsing.lines import Lines
-from ea_parsing.lessons_learned_extractor import ChallengesLessonsLearnedExtractor
+from ea_parsing.lessons_learned_extractor import ChallengesLessonsLearnedExtractor, ALL_TITLE_TEXTS
+from dref_parsing.tracing import span
+from dref_parsing.go_api import GOClient
+
+
+@lru_cache(maxsize=None)
+def get_client(base_url, timeout):
+    """
+    Get the GO API client shared by all requests of the process (see dref_parsing.go_api.GOClient).
+    Connections are kept alive, failed requests (connection errors, 429 and 5xx)
+    are retried with exponential backoff, and pages of results are requested concurrently.
+    """
+    return GOClient(
+        base_url=base_url,
+        timeout=timeout,
+        retries=ea_parsing.definitions.GO_API_RETRIES,
+        backoff=0.5,
+        max_concurrency=ea_parsing.definitions.GO_API_CONCURRENCY
+    )
 
 
 class GOAPI:
-    def __init__(self):
+    def __init__(self, base_url=None, timeout=None):
         """
         Class to interact with the IFRC GO API.
+
+        Parameters
+        ----------
+        base_url : string (default=None)
+            Base URL of the API. Defaults to definitions.GO_API_URL.
+
+        timeout : float (default=None)
+            Timeout of a request in seconds. Defaults to definitions.GO_API_TIMEOUT.
         """
-        pass
+        self.base_url = base_url or ea_parsing.definitions.GO_API_URL
+        self.timeout = timeout or ea_parsing.definitions.GO_API_TIMEOUT
+        self.client = get_client(self.base_url, self.timeout)
 
     def get_appeal_data(self, mdr_code):
         """
@@ -27,9 +59,8 @@ class GOAPI:
         """
         # Get the results
         results = self._get_results(
-            url='https://goadmin.ifrc.org/api/v2/appeal/',
+            call='appeal',
             params={
-                'format': 'json',
                 'code': mdr_code
             }
         )
@@ -51,39 +82,302 @@ class GOAPI:
             ID of the appeal in IFRC GO.
         """
         documents = self._get_results(
-            url='https://goadmin.ifrc.org/api/v2/appeal_document/',
+            call='appeal_document',
             params={
-                'format': 'json',
                 'appeal': id
             }
         )
         return documents
 
-    def _get_results(self, url, params=None):
+    def get_document(self, url):
+        """
+        Download a document, e.g. a PDF report.
+
+        Parameters
+        ----------
+        url : string (required)
+            URL of the document.
         """
-        Get results from the GO API from the URL, looping through pages.
+        return self.client.get_document(url)
+
+    def download_document(self, url, file, chunk_size=2**20):
+        """
+        Download a document into a file chunk by chunk, without keeping the whole document in memory.
 
         Parameters
         ----------
         url : string (required)
-            URL to request.
+            URL of the document.
+
+        file : file object (required)
+            File opened for writing in binary mode.
+
+        chunk_size : int (default=2**20)
+            Size of the chunks in bytes.
+        """
+        self.client.download(url, file, chunk_size=chunk_size)
+
+    def _get_results(self, call, params=None):
+        """
+        Get all results of an API call, e.g. "appeal", from all pages.
+        The first page gives the total count, the other pages are requested concurrently
+        (see dref_parsing.go_api.GOClient.get_results).
+
+        Parameters
+        ----------
+        call : string (required)
+            API call, appended to the base URL.
 
         params : dict (default=None)
             Params to pass in the request.
         """
-        # Loop through pages until there are no pages left
-        results = []
-        while url:
-            response = requests.get(
-                url=url,
-                params=params
-            )
-            response.raise_for_status()
-            json = response.json()
-            results += json['results']
-            url = json['next']
+        return self.client.get_results(call, params=params)
+
+
+def open_document(pdf):
+    """
+    Open a PDF with fitz from bytes or from a file path.
+    """
+    if isinstance(pdf, (bytes, bytearray)):
+        return fitz.open(stream=pdf, filetype='pdf')
+    return fitz.open(pdf)
+
+
+class SpanColumns:
+    # Typed columns: name -> array typecode.
+    # Coordinates of PyMuPDF are single precision floats, so float32 keeps them exactly.
+    # Font size and the position in the whole document (total_y) are kept as float64.
+    typecodes = {
+        'size': 'd',
+        'flags': 'i',
+        'ascender': 'f',
+        'descender': 'f',
+        'bold': 'b',
+        'page_number': 'h',
+        'block_number': 'h',
+        'line_number': 'h',
+        'span_number': 'h',
+        'origin_x': 'f',
+        'origin_y': 'f',
+        'total_y': 'd',
+        'img': 'b',
+        'bbox_x1': 'f',
+        'bbox_y1': 'f',
+        'bbox_x2': 'f',
+        'bbox_y2': 'f',
+    }
+    dtypes = {'d': np.float64, 'f': np.float32, 'i': np.int32, 'h': np.int16, 'b': np.int8}
+    categorical_columns = ['font', 'color', 'highlight_color']
+    columns = [
+        'size', 'flags', 'font', 'color', 'ascender', 'descender', 'text', 'bold', 'highlight_color',
+        'page_number', 'block_number', 'line_number', 'span_number',
+        'origin_x', 'origin_y', 'total_y', 'img', 'bbox_x1', 'bbox_y1', 'bbox_x2', 'bbox_y2'
+    ]
 
-        return results
+    def __init__(self):
+        """
+        Columns of text spans, filled span by span.
+        Numbers are appended to typed arrays, fonts and colours are stored as category codes,
+        and the frame is built once at the end, instead of from a list of dicts per span.
+        """
+        self.arrays = {name: array(typecode) for name, typecode in self.typecodes.items()}
+        self.texts = []
+        self.codes = {name: array('i') for name in self.categorical_columns}
+        self.categories = {name: {} for name in self.categorical_columns}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _category_code(self, name, value):
+        # Missing values (None) have code -1
+        if value is None:
+            return -1
+        categories = self.categories[name]
+        return categories.setdefault(value, len(categories))
+
+    def append(self, text, **values):
+        """
+        Append a span, values of all the typed and categorical columns are required.
+        """
+        self.texts.append(text)
+        for name, values_array in self.arrays.items():
+            values_array.append(values[name])
+        for name, codes in self.codes.items():
+            codes.append(self._category_code(name, values[name]))
+
+    def extend(self, other, y_offset=0):
+        """
+        Append all spans of other, e.g. of the next page, moving them down by y_offset in the document.
+        """
+        self.texts.extend(other.texts)
+        for name, values_array in self.arrays.items():
+            if name == 'total_y':
+                values_array.extend(array('d', (y + y_offset for y in other.arrays[name])))
+            else:
+                values_array.extend(other.arrays[name])
+        for name, codes in self.codes.items():
+            categories = list(other.categories[name])
+            codes.extend(array('i', (
+                self._category_code(name, categories[code] if code >= 0 else None)
+                for code in other.codes[name]
+            )))
+
+    def to_frame(self):
+        """
+        Build the pandas DataFrame of the spans.
+        """
+        data = {}
+        for name in self.columns:
+            if name == 'text':
+                data[name] = pd.Series(self.texts, dtype=object)
+            elif name in self.codes:
+                data[name] = pd.Categorical.from_codes(
+                    np.frombuffer(self.codes[name], dtype=np.int32),
+                    categories=list(self.categories[name])
+                )
+            else:
+                typecode = self.typecodes[name]
+                data[name] = np.frombuffer(self.arrays[name], dtype=self.dtypes[typecode])
+                if name in ['bold', 'img']:
+                    data[name] = data[name].astype(bool)
+        return pd.DataFrame(data)
+
+
+def extract_page_spans(page_layout, page_number):
+    """
+    Extract the text spans of a page, with their styles, highlight colours and positions.
+    Returns the spans (SpanColumns) and the page height, which is used to get the position in the whole document.
+    """
+    page_spans = SpanColumns()
+
+    # Get drawings to get text highlights, and images.
+    # Spans look up the drawings and images they overlap in spatial indexes of the page.
+    coloured_drawings = [
+        drawing
+        for drawing in page_layout.get_drawings()
+        if (drawing['fill'] != (0.0, 0.0, 0.0))
+    ]
+    drawings_index = utils.BoxGrid([drawing['rect'] for drawing in coloured_drawings])
+    images_index = utils.BoxGrid([img['bbox'] for img in page_layout.get_image_info()])
+
+    # Loop through blocks
+    blocks = page_layout.get_text("dict", flags=11)["blocks"]
+    for block_number, block in enumerate(blocks):
+        for line_number, line in enumerate(block["lines"]):
+            spans = [span for span in line['spans'] if span['text'].strip()]
+            for span_number, span in enumerate(spans):
+
+                # Get the drawing with the largest overlap with the text
+                highlight_color_hex = None
+                largest_highlight = drawings_index.largest_overlap(span['bbox'])
+                if largest_highlight is not None:
+                    highlight_color = coloured_drawings[largest_highlight]['fill']
+                    if highlight_color:
+                        highlight_color_hex = '#%02x%02x%02x' % (
+                            int(255*highlight_color[0]),
+                            int(255*highlight_color[1]),
+                            int(255*highlight_color[2])
+                        )
+
+                # Check if the span is contained in any page images
+                contains_images = images_index.any_contains(span['bbox'])
+
+                # Append results
+                page_spans.append(
+                    text=span['text'].replace('\r', '\n'),
+                    size=span['size'],
+                    flags=span['flags'],
+                    font=span['font'],
+                    color="#%06x" % span['color'],
+                    ascender=span['ascender'],
+                    descender=span['descender'],
+                    bold=("black" in span['font'].lower()) or ("bold" in span['font'].lower()),
+                    highlight_color=highlight_color_hex,
+                    page_number=page_number,
+                    block_number=block_number,
+                    line_number=line_number,
+                    span_number=span_number,
+                    origin_x=span['origin'][0],
+                    origin_y=span['origin'][1],
+                    total_y=span['origin'][1],  # offset by the previous pages when merging pages
+                    img=contains_images,
+                    bbox_x1=span['bbox'][0],
+                    bbox_y1=span['bbox'][1],
+                    bbox_x2=span['bbox'][2],
+                    bbox_y2=span['bbox'][3]
+                )
+
+    return page_spans, page_layout.rect.height
+
+
+# Document opened in each worker process, see extract_pages_spans
+_worker_document = None
+
+
+def _init_page_worker(pdf):
+    global _worker_document
+    _worker_document = open_document(pdf)
+
+
+def _extract_pages_spans_in_worker(page_numbers):
+    return [
+        extract_page_spans(_worker_document[page_number], page_number)
+        for page_number in page_numbers
+    ]
+
+
+def extract_pages_spans(pdf, n_workers=None):
+    """
+    Extract spans from all pages of a PDF, yielding (spans, page height) in the page order.
+    Large documents are split into chunks of pages which are processed in parallel,
+    each worker process opening the document from the same file (or bytes).
+
+    Parameters
+    ----------
+    pdf : bytes or string (required)
+        PDF content, or path to the PDF file.
+
+    n_workers : int (default=None)
+        Number of worker processes. Defaults to definitions.PAGE_WORKERS.
+    """
+    if n_workers is None:
+        n_workers = ea_parsing.definitions.PAGE_WORKERS
+
+    doc = open_document(pdf)
+    n_pages = doc.page_count
+    if (n_workers <= 1) or (n_pages < ea_parsing.definitions.PARALLEL_MIN_PAGES):
+        for page_number, page_layout in enumerate(doc):
+            yield extract_page_spans(page_layout, page_number)
+        doc.close()
+        return
+    doc.close()
+
+    # Process chunks of pages in parallel, merging in the page order
+    chunks = utils.split_range(n_pages, 2*n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_page_worker, initargs=(pdf,)) as executor:
+        for pages_spans in executor.map(_extract_pages_spans_in_worker, chunks):
+            yield from pages_spans
+
+
+def extract_document_spans(pdf, n_workers=None):
+    """
+    Extract spans from all pages of a PDF into one frame,
+    with the vertical position of each span in the whole document (total_y).
+
+    Parameters
+    ----------
+    pdf : bytes or string (required)
+        PDF content, or path to the PDF file.
+
+    n_workers : int (default=None)
+        Number of worker processes, see extract_pages_spans.
+    """
+    spans = SpanColumns()
+    total_y = 0
+    for page_spans, page_height in extract_pages_spans(pdf, n_workers=n_workers):
+        spans.extend(page_spans, y_offset=total_y)
+        total_y += page_height
+    return spans.to_frame()
 
 
 class Appeal:
@@ -182,77 +476,17 @@ class AppealDocument:
         if not self.document_url:
             return None
 
-        # Extract lines from the PDF
-        data = []
-        total_y = 0
+        # Download the document to a temporary file, which PyMuPDF (and page workers) read from disk
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'document.pdf')
+            with open(filename, 'wb') as file:
+                GOAPI().download_document(self.document_url, file)
 
-        # Get the document content and open with fitz
-        document_url = self.document_url
-        document = requests.get(document_url)
-        doc = fitz.open(stream=document.content, filetype='pdf')
+            # Extract spans page by page, with the vertical position in the whole document
+            with span('pdf_layout'):
+                spans = extract_document_spans(pdf=filename)
 
-        # Loop through pages and paragraphs
-        for page_number, page_layout in enumerate(doc):
-
-            # Get drawings to get text highlights
-            coloured_drawings = [
-                drawing
-                for drawing in page_layout.get_drawings()
-                if (drawing['fill'] != (0.0, 0.0, 0.0))
-            ]
-            page_images = page_layout.get_image_info()
-
-            # Loop through blocks
-            blocks = page_layout.get_text("dict", flags=11)["blocks"]
-            for block_number, block in enumerate(blocks):
-                for line_number, line in enumerate(block["lines"]):
-                    spans = [span for span in line['spans'] if span['text'].strip()]
-                    for span_number, span in enumerate(spans):
-
-                        # Check if the text block is contained in a drawing
-                        highlights = []
-                        for drawing in coloured_drawings:
-                            if utils.get_overlap(span['bbox'], drawing['rect']):
-                                drawing['overlap'] = utils.get_overlap(span['bbox'], drawing['rect'])
-                                highlights.append(drawing)
-
-                        # Get largest overlap
-                        highlight_color_hex = None
-                        if highlights:
-                            largest_highlight = max(highlights, key=lambda x: x['overlap'])
-                            highlight_color = largest_highlight['fill']
-                            if highlight_color:
-                                highlight_color_hex = '#%02x%02x%02x' % (
-                                    int(255*highlight_color[0]),
-                                    int(255*highlight_color[1]),
-                                    int(255*highlight_color[2])
-                                )
-
-                        # Check if the span is contained in any page images
-                        contains_images = [img for img in page_images if utils.contains(img['bbox'], span['bbox'])]
-
-                        # Append results
-                        span['text'] = span['text'].replace('\r', '\n')
-                        span['bold'] = ("black" in span['font'].lower()) or ("bold" in span['font'].lower())
-                        span['color'] = "#%06x" % span['color']
-                        span['highlight_color'] = highlight_color_hex
-                        span['page_number'] = page_number
-                        span['block_number'] = block_number
-                        span['line_number'] = line_number
-                        span['span_number'] = span_number
-                        span['origin_x'] = span['origin'][0]
-                        span['origin_y'] = span['origin'][1]
-                        span['total_y'] = span['origin'][1]+total_y
-                        span['img'] = bool(contains_images)
-                        span['bbox_x1'] = span['bbox'][0]
-                        span['bbox_y1'] = span['bbox'][1]
-                        span['bbox_x2'] = span['bbox'][2]
-                        span['bbox_y2'] = span['bbox'][3]
-                        data.append(span)
-
-            total_y += page_layout.rect.height
-
-        return Lines(pd.DataFrame(data))
+        return Lines(spans)
 
     @cached_property
     def lines(self):
@@ -260,48 +494,55 @@ class AppealDocument:
         Process the raw lines to get the document content.
         """
         if self.lines_input is not None:
-            return Lines(self.lines_input)
+            lines = Lines(self.lines_input)
+            if 'title_base' not in lines.columns:
+                lines['title_base'] = utils.get_title_base(lines['text_base'])
+            return lines
 
         if self.raw_lines is None:
             return None
 
-        lines = self.raw_lines.copy()
+        with span('lines'):
+            lines = self.raw_lines.copy()
 
-        # Merge inline texts
-        lines = lines.merge_inline_text(
-            exclude_texts=ChallengesLessonsLearnedExtractor().title_texts()
-        )
+            # Merge inline texts
+            lines = lines.merge_inline_text(
+                exclude_texts=ALL_TITLE_TEXTS
+            )
 
-        # Sort lines by y of blocks
-        lines = lines.sort_blocks_by_y()
+            # Sort lines by y of blocks
+            lines = lines.sort_blocks_by_y()
 
-        # Combine spans on same line with same styles
-        lines = lines.combine_spans_same_style()
+            # Combine spans on same line with same styles
+            lines = lines.combine_spans_same_style()
 
-        # Combine bullet points and lines
-        lines = lines.combine_bullet_spans()
+            # Combine bullet points and lines
+            lines = lines.combine_bullet_spans()
 
-        # Add text_base
-        lines['text_base'] = lines['text']\
-            .str.replace(r'[^A-Za-z0-9 ]+', ' ', regex=True)\
-            .str.replace(' +', ' ', regex=True)\
-            .str.lower()\
-            .str.strip()
+            # Add text_base
+            lines['text_base'] = lines['text']\
+                .str.replace(r'[^A-Za-z0-9 ]+', ' ', regex=True)\
+                .str.replace(' +', ' ', regex=True)\
+                .str.lower()\
+                .str.strip()
 
-        # Remove photo blocks, page numbers, references
-        lines = self.remove_photo_blocks(lines=lines)
-        lines = self.remove_page_labels_references(lines=lines)
-        lines = self.drop_all_repeating_headers_footers(lines=lines)
+            # Add text_base normalised for comparing with section title texts
+            lines['title_base'] = utils.get_title_base(lines['text_base'])
 
-        # Have to run again in case repeating headers or footers were below or above the page labels or references
-        lines = self.remove_page_labels_references(lines=lines)
-        lines = self.drop_all_repeating_headers_footers(lines=lines)
+            # Remove photo blocks, page numbers, references
+            lines = self.remove_photo_blocks(lines=lines)
+            lines = self.remove_page_labels_references(lines=lines)
+            lines = self.drop_all_repeating_headers_footers(lines=lines)
 
-        # Remove reference numbers
-        lines = self.remove_reference_labels(lines=lines)
+            # Have to run again in case repeating headers or footers were below or above the page labels or references
+            lines = self.remove_page_labels_references(lines=lines)
+            lines = self.drop_all_repeating_headers_footers(lines=lines)
 
-        # Remove date superscript (th, st, etc)
-        lines = self.remove_date_superscripts(lines=lines)
+            # Remove reference numbers
+            lines = self.remove_reference_labels(lines=lines)
+
+            # Remove date superscript (th, st, etc)
+            lines = self.remove_date_superscripts(lines=lines)
 
         return lines
 
@@ -323,42 +564,32 @@ class AppealDocument:
         for option in ['headers', 'footers']:
 
             # For each page, get the order of the blocks by vertical y distance
-            ordered_blocks_by_page = lines\
-                .sort_values(
-                    by=['page_number', 'origin_y'],
-                    ascending=[True, (True if option == 'headers' else False)]
-                )\
-                .groupby('page_number')['block_number'].unique()
-
-            # Loop through pages
-            for page_number, block_numbers in ordered_blocks_by_page.items():
-                page_lines = lines.loc[lines['page_number'] == page_number]
-
-                # Loop through blocks and remove page labels and references
-                for block_number in block_numbers:
-
-                    block = page_lines.loc[page_lines['block_number'] == block_number]
-
-                    # Check if the whole block is a page label or reference
-                    # only for footers otherwise risk of dropping too much
-                    if option == 'footers':
-                        if block.is_page_label() or block.is_reference():
-                            lines.drop(labels=block.index, inplace=True)
-                            continue
-
-                    # Loop through lines and remove page numbers and references
-                    lines_page_label_or_reference = block.groupby(['line_number']).apply(
-                        lambda block_lines:
-                            block_lines.is_page_label() or block_lines.is_reference()
-                    )
-                    block_lines_to_drop = block.loc[
-                        block['line_number'].isin(lines_page_label_or_reference[lines_page_label_or_reference].index)
-                    ]
-                    lines.drop(labels=block_lines_to_drop.index, inplace=True)
-                    if lines_page_label_or_reference.all():
-                        continue
-
-                    break
+            block = lines.groupby(['page_number', 'block_number'], sort=False).ngroup()
+            first_block_lines = block\
+                .loc[
+                    lines.sort_values(
+                        by=['page_number', 'origin_y'],
+                        ascending=[True, (True if option == 'headers' else False)]
+                    ).index
+                ]\
+                .drop_duplicates()
+            blocks = pd.DataFrame({
+                'page_number': lines.loc[first_block_lines.index, 'page_number'].values,
+            }, index=first_block_lines.values)
+
+            # Find lines which are page labels or references
+            to_drop = lines.is_page_label_or_reference_by(by=['page_number', 'block_number', 'line_number'])
+
+            # Check if the whole block is a page label or reference
+            # only for footers otherwise risk of dropping too much
+            if option == 'footers':
+                to_drop |= lines.is_page_label_or_reference_by(by=['page_number', 'block_number'])
+
+            # Go through the blocks of each page in order until a block is not completely dropped
+            blocks['kept'] = (~to_drop.groupby(block.values).all()).astype(int)
+            blocks['checked'] = (blocks.groupby('page_number')['kept'].cumsum() - blocks['kept']) == 0
+            checked_blocks = blocks.loc[blocks['checked']].index
+            lines = lines.loc[~(to_drop & block.isin(checked_blocks))]
 
         return lines
 
@@ -367,108 +598,79 @@ class AppealDocument:
         Drop all repeating headers and footers.
         Run until there are no more repeating headers or footers.
         """
-        # Drop header blocks
-        while True:
-            repeating_blocks = self.get_repeating_blocks(which='top', lines=lines)
-            if repeating_blocks.empty:
-                break
-            lines = lines.drop(repeating_blocks['index'].explode())
-
-        # Drop header lines
-        while True:
-            repeating_lines = self.get_repeating_lines(which='top', lines=lines)
-            if repeating_lines.empty:
-                break
-            lines = lines.drop(repeating_lines['index'].explode())
-
-        # Drop footer blocks
-        while True:
-            repeating_blocks = self.get_repeating_blocks(which='bottom', lines=lines)
-            if repeating_blocks.empty:
-                break
-            lines = lines.drop(repeating_blocks['index'].explode())
-
-        # Drop footer lines
-        while True:
-            repeating_lines = self.get_repeating_lines(which='bottom', lines=lines)
-            if repeating_lines.empty:
-                break
-            lines = lines.drop(repeating_lines['index'].explode())
+        # Block ID on each page, kept in the lines
+        lines['page_block'] = lines['page_number'].astype(str)+'_'+lines['block_number'].astype(str)
+
+        # Drop header blocks and lines, then footer blocks and lines
+        for which in ['top', 'bottom']:
+            lines = lines.drop(self.get_repeating_blocks(which=which, lines=lines))
+            lines = lines.drop(self.get_repeating_lines(which=which, lines=lines))
 
         return lines
 
-    def get_repeating_blocks(self, which, lines):
+    def get_stacks(self, which, lines, by):
         """
-        Drop any repeating elements at the top or bottom of pages.
+        Get the groups of lines ("by", e.g. blocks) on each page, ordered from the top or the bottom of the page.
+        Groups are ordered by their top (or bottom) line, the first of the lines if they are at the same position.
         """
-        # Get spans in blocks at top of each page
-        lines['page_block'] = lines['page_number'].astype(str)+'_'+lines['block_number'].astype(str)
-
-        # Get the top and bottom blocks on each page
-        if which == 'top':
-            page_blocks = lines.loc[lines.groupby(['page_number'])['origin_y'].idxmin()]
-        elif which == 'bottom':
-            page_blocks = lines.loc[lines.groupby(['page_number'])['origin_y'].idxmax()]
-        else:
+        if which not in ['top', 'bottom']:
             raise RuntimeError('Unrecognised value for "which", should be "top" or "bottom"')
 
-        # Get repeating texts
-        elements = lines.loc[lines['page_block'].isin(page_blocks['page_block'].unique())]
-        elements = elements\
-            .reset_index()\
-            .groupby(['page_number'])\
-            .agg({'text_base': lambda x: ' '.join(x), 'index': tuple})
-        elements = elements.loc[elements['text_base'].astype(bool)]
-        repeating_texts = elements\
-            .groupby(['text_base'])\
-            .filter(lambda x: len(x) > 2)
+        # Order by vertical position, first lines first if same position
+        ordered = pd.DataFrame({
+            'page_number': lines['page_number'].values,
+            'origin_y': lines['origin_y'].values,
+            'position': np.arange(len(lines)),
+            'group': by
+        })\
+            .sort_values(
+                by=['page_number', 'origin_y', 'position'],
+                ascending=[True, (which == 'top'), True]
+            )\
+            .drop_duplicates(subset=['group'])
+
+        return ordered.groupby('page_number', sort=False)['group'].agg(list).to_list()
+
+    def get_repeating_blocks(self, which, lines):
+        """
+        Get the index of repeating blocks at the top or bottom of pages.
+        Blocks are dropped from the top or bottom of pages until there are no more repeating blocks.
+        """
+        # Get the text of each block
+        block = lines.groupby(['page_number', 'block_number'], sort=False).ngroup().values
+        blocks = lines\
+            .groupby(block)\
+            .agg({
+                'text_base': lambda x: ' '.join(x),
+                'title_base': lambda x: ' '.join(filter(None, x))
+            })
 
         # Don't remove lessons learned or challenges titles
-        section_title_texts = ChallengesLessonsLearnedExtractor().title_texts()
-        repeating_texts = repeating_texts.loc[~(
-            repeating_texts['text_base']
-            .str.replace(r'[^A-Za-z ]+', ' ', regex=True)
-            .str.strip()
-            .apply(utils.remove_filler_words)
-            .isin(section_title_texts)
-        )]
+        removed_blocks = utils.peel_repeating_layers(
+            stacks=self.get_stacks(which=which, lines=lines, by=block),
+            keys=blocks['text_base'].to_dict(),
+            removable=(~blocks['title_base'].isin(ALL_TITLE_TEXTS)).to_dict()
+        )
 
-        return repeating_texts
+        return lines.index[np.isin(block, removed_blocks)]
 
     def get_repeating_lines(self, which, lines):
         """
+        Get the index of repeating lines at the top or bottom of pages.
+        Lines are dropped from the top or bottom of pages until there are no more repeating lines.
         """
-        # Get the top and bottom lines on each page
-        if which == 'top':
-            page_lines = lines.loc[lines.groupby(['page_number'])['origin_y'].idxmin()]
-        elif which == 'bottom':
-            page_lines = lines.loc[lines.groupby(['page_number'])['origin_y'].idxmax()]
-        else:
-            raise RuntimeError('Unrecognised value for "which", should be "top" or "bottom"')
-
-        # Get repeating texts
-        page_lines = page_lines.loc[page_lines['text_base'].astype(bool)]
-        repeating_texts = page_lines\
-            .reset_index()\
-            .groupby(['text_base'])\
-            .filter(lambda x: len(x) > 2)
-
-        # Don't remove lessons learned or challenges titles
-        section_title_texts = ChallengesLessonsLearnedExtractor().title_texts()
-        repeating_texts = repeating_texts.loc[~(
-            repeating_texts['text_base']
-            .str.replace(r'[^A-Za-z ]+', ' ', regex=True)
-            .str.strip()
-            .apply(utils.remove_filler_words)
-            .isin(section_title_texts)
-        )]
-
-        # Don't remove bullets
-        repeating_texts = repeating_texts.loc[~(
-            repeating_texts['text'].str.strip().isin(ea_parsing.definitions.BULLETS)
-        )]
+        # Don't remove lessons learned or challenges titles, or bullets
+        removable = ~(
+            lines['title_base'].isin(ALL_TITLE_TEXTS) |
+            lines['text'].str.strip().isin(ea_parsing.definitions.BULLETS)
+        )
+        removed_lines = utils.peel_repeating_layers(
+            stacks=self.get_stacks(which=which, lines=lines, by=np.arange(len(lines))),
+            keys=lines['text_base'].where(lines['text_base'].notna(), None).to_list(),
+            removable=removable.to_list()
+        )
 
-        return repeating_texts
+        return lines.index[sorted(removed_lines)]
 
     def remove_reference_labels(self, lines):
         """
@@ -8,6 +8,22 @@ LESSONS_LEARNED_TITLES = yaml.safe_load(open(os.path.join(DEFINITIONS_DIR, 'less
 SECTORS = yaml.safe_load(open(os.path.join(DEFINITIONS_DIR, 'sectors.yml')))
 ABBREVIATIONS = yaml.safe_load(open(os.path.join(DEFINITIONS_DIR, 'abbreviations.yml')))
 
+# Number of processes used to extract the page layouts of a document,
+# and the minimum number of pages for which the processes are started.
+# Off (1) by default: the endpoints of the app are async and run in the event loop
+# of the server process, so a pool for each document would fork the whole server
+# for every parsed document
+PAGE_WORKERS = int(os.environ.get('EA_PARSING_PAGE_WORKERS', 1))
+PARALLEL_MIN_PAGES = 8
+
+# IFRC GO API: base URL (can point to a local stub server, e.g. for tests),
+# timeout of a request in seconds, number of retries of failed requests,
+# and the maximum number of concurrent requests
+GO_API_URL = os.environ.get('GO_API_URL', 'https://goadmin.ifrc.org/api/v2/')
+GO_API_TIMEOUT = float(os.environ.get('GO_API_TIMEOUT', 60))
+GO_API_RETRIES = int(os.environ.get('GO_API_RETRIES', 5))
+GO_API_CONCURRENCY = int(os.environ.get('GO_API_CONCURRENCY', 4))
+
 BULLETS = [
     '•', '●', '▪', '-', 'o',
     '❖', '◆', '♢', '◇', '⬖',
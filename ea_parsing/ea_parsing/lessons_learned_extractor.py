@@ -7,6 +7,35 @@ import ea_parsing.definitions
 from ea_parsing.utils import generate_sentence_variations, remove_filler_words
 
 
+def get_title_texts():
+    """
+    Get the title texts without filler words, including abbreviations.
+    """
+    # Get title definitions and abbreviations
+    section_titles_details = ea_parsing.definitions.LESSONS_LEARNED_TITLES
+
+    # Get all possible title variations, considering abbreviations
+    title_texts = {'lessons_learned': [], 'challenges': []}
+    for section_type in title_texts:
+        section_titles = section_titles_details.get(f'{section_type}_titles')
+        for title in section_titles:
+            title_texts[section_type] += generate_sentence_variations(
+                sentence=title,
+                abbreviations=section_titles_details['abbreviations']
+            )
+
+    # Remove filler words from titles
+    return {
+        section_type: frozenset(remove_filler_words(x) for x in texts)
+        for section_type, texts in title_texts.items()
+    }
+
+
+# Title texts are compiled once, when the module is imported
+TITLE_TEXTS = get_title_texts()
+ALL_TITLE_TEXTS = TITLE_TEXTS['lessons_learned'] | TITLE_TEXTS['challenges']
+
+
 class ChallengesLessonsLearnedExtractor:
     def __init__(self, section_type=None):
         """
@@ -19,44 +48,14 @@ class ChallengesLessonsLearnedExtractor:
             if section_type not in ['challenges', 'lessons_learned']:
                 raise ValueError("'section_type' must be 'challenges' or 'lessons_learned'")
 
-    @cached_property
-    def _title_texts_dict(self):
-        """
-        Get the title texts, including abbreviations.
-        """
-        # Get title definitions and abbreviations
-        section_titles_details = ea_parsing.definitions.LESSONS_LEARNED_TITLES
-
-        # Get all possible title variations, considering abbreviations
-        title_texts = {'lessons_learned': [], 'challenges': []}
-        for section_type in title_texts:
-            section_titles = section_titles_details.get(f'{section_type}_titles')
-            for title in section_titles:
-                title_texts[section_type] += generate_sentence_variations(
-                    sentence=title,
-                    abbreviations=section_titles_details['abbreviations']
-                )
-
-        # Remove filler words from titles
-        for section_type in title_texts:
-            title_texts[section_type] = list(set([
-                remove_filler_words(x)
-                for x in title_texts[section_type]
-            ]))
-
-        return title_texts
-
     def title_texts(self, section_type=None):
         """
-        Return a list of lessons learned title texts and challenges title texts, without repititions.
+        Return a set of lessons learned title texts and challenges title texts.
         """
         if section_type is None:
-            return list(set(
-                self._title_texts_dict['lessons_learned'] +
-                self._title_texts_dict['challenges']
-            ))
+            return ALL_TITLE_TEXTS
         else:
-            return self._title_texts_dict[section_type]
+            return TITLE_TEXTS[section_type]
 
     @cached_property
     def section_titles(self):
@@ -64,11 +63,7 @@ class ChallengesLessonsLearnedExtractor:
         Get section titles
         """
         section_titles = self.document.titles.loc[
-            self.document.titles['text_base']
-                .str.replace(r'[^A-Za-z ]+', ' ', regex=True)
-                .str.strip()
-                .apply(remove_filler_words)
-                .isin(self.title_texts(self.section_type))
+            self.document.titles['title_base'].isin(self.title_texts(self.section_type))
         ]
         return section_titles
 
@@ -392,11 +387,7 @@ class ChallengesLessonsLearnedExtractor:
 
         # Section must end before the next "Lessons Learned" or "Challenges" section
         lessons_learned_challenges_titles = self.document.titles.loc[
-            self.document.titles['text_base']
-                .str.replace(r'[^A-Za-z ]+', ' ', regex=True)
-                .str.strip()
-                .apply(remove_filler_words)
-                .isin(self.title_texts())
+            self.document.titles['title_base'].isin(self.title_texts())
         ]
         lessons_learned_challenges_titles_after_section = lessons_learned_challenges_titles.drop(title.name).loc[
             lessons_learned_challenges_titles['total_y'] > title['total_y']
@@ -2,6 +2,7 @@
 """
 import re
 from functools import cached_property
+import numpy as np
 import pandas as pd
 import ea_parsing.definitions
 from ea_parsing import utils
@@ -148,11 +149,7 @@ class Lines(pd.DataFrame):
                 .str.lower()\
                 .str.strip()
             exclude_indexes = lines.loc[
-                lines['text_base']
-                .str.replace(r'[^A-Za-z ]+', ' ', regex=True)
-                .str.strip()
-                .apply(utils.remove_filler_words)
-                .isin(exclude_texts)
+                utils.get_title_base(lines['text_base']).isin(exclude_texts)
             ].index
             lines.loc[exclude_indexes, 'ignore'] = True
             lines.loc[
@@ -221,10 +218,63 @@ class Lines(pd.DataFrame):
         lines = self.copy()
 
         # Get bullets: span zero, bullet character
-        bullets = lines.loc[
+        is_bullet = (
             (lines['text'].str.strip().isin(ea_parsing.definitions.BULLETS)) &
             (lines['span_number'] == 0)
-        ]
+        )
+
+        # Get the first text at the level of each bullet: span zero, same block and total_y, different line
+        spans = pd.DataFrame({
+            'position': np.arange(len(lines)),
+            'page_number': lines['page_number'].values,
+            'block_number': lines['block_number'].values,
+            'line_number': lines['line_number'].values,
+            'span_number': lines['span_number'].values,
+            'total_y': lines['total_y'].values,
+        })
+        bullets = spans.loc[is_bullet.values].dropna(subset=['page_number', 'block_number', 'total_y'])
+        texts_at_bullet_level = bullets.merge(
+            spans.loc[spans['span_number'] == 0],
+            on=['page_number', 'block_number', 'total_y'],
+            suffixes=('', '_text')
+        )
+        texts_at_bullet_level = texts_at_bullet_level\
+            .loc[texts_at_bullet_level['line_number_text'] != texts_at_bullet_level['line_number']]\
+            .sort_values(by=['position', 'position_text'])\
+            .drop_duplicates(subset=['position'])
+
+        # Bullets are combined one after the other if a text is at the level of several bullets,
+        # or if texts are moved from or to lines with other bullets
+        line_keys = ['page_number', 'block_number', 'line_number']
+        bullet_lines = pd.MultiIndex.from_frame(bullets[line_keys])
+        text_lines = pd.MultiIndex.from_arrays([
+            texts_at_bullet_level['page_number'],
+            texts_at_bullet_level['block_number'],
+            texts_at_bullet_level['line_number_text']
+        ])
+        if (
+            texts_at_bullet_level['position_text'].duplicated().any() or
+            texts_at_bullet_level['position_text'].isin(bullets['position']).any() or
+            bullet_lines.duplicated().any() or
+            text_lines.isin(bullet_lines).any()
+        ):
+            return lines._combine_bullet_spans_sequentially(bullets=lines.loc[is_bullet])
+
+        # Put bullet item text on the same line_number, after the spans of the bullet line
+        line_max_span = spans.groupby(line_keys)['span_number'].max()
+        positions = texts_at_bullet_level['position_text'].values
+        lines.iloc[positions, lines.columns.get_loc('line_number')] = \
+            texts_at_bullet_level['line_number'].values
+        lines.iloc[positions, lines.columns.get_loc('span_number')] = \
+            line_max_span.reindex(pd.MultiIndex.from_frame(texts_at_bullet_level[line_keys])).values + 1
+
+        return lines
+
+    def _combine_bullet_spans_sequentially(self, bullets):
+        """
+        Combine bullet points with the text which follows them (see combine_bullet_spans), one bullet after the other.
+        """
+        lines = self.copy()
 
         # Loop through bullets and put bullet item text on the same line_number
         for i, bullet in bullets.iterrows():
@@ -295,6 +345,67 @@ class Lines(pd.DataFrame):
 
         return False
 
+    def is_page_label_or_reference_by(self, by):
+        """
+        Check for each group of lines whether it is a page label (see is_page_label) or a reference (see is_reference).
+        All groups are checked at once with string operations over the whole frame.
+
+        Parameters
+        ----------
+        by : list of strings (required)
+            Columns to group the lines by, e.g. ['page_number', 'block_number'] to check blocks.
+
+        Returns
+        -------
+        flags : pandas Series of bools
+            For each line, whether the group of the line is a page label or a reference.
+        """
+        group = self.groupby(by, sort=False).ngroup()
+
+        # Lines with text, ordered within each group
+        lines = pd.DataFrame({
+            'group': group,
+            'text_base': self['text_base'],
+            'size': self['size'],
+            'line_number': self['line_number'],
+            'span_number': self['span_number'],
+        }).dropna(subset=['text_base', 'group'])
+        lines = lines.loc[lines['group'] >= 0].sort_values(by=['group', 'line_number', 'span_number'])
+        text = lines['text_base'].astype(str)
+        position = lines.groupby('group').cumcount()
+        group_sizes = lines.groupby('group').size()
+        first = lines.loc[position == 0].set_index('group')
+        second = lines.loc[position == 1].set_index('group')
+
+        # If the the first word is page, assume page label
+        has_chars = text.str.contains('[a-z]')
+        lines_with_chars = lines.loc[has_chars]
+        first_with_chars = lines_with_chars.loc[lines_with_chars.groupby('group').cumcount() == 0].set_index('group')
+        starts_with_page = first_with_chars['text_base'].str.startswith('page')\
+            .reindex(group_sizes.index, fill_value=False)
+
+        # If only a single number, assume page label
+        first_is_digit = first['text_base'].str.isdigit()
+        single_number = (group_sizes == 1) & first_is_digit
+
+        # If only contains "page" and number, assume page label
+        only_page_and_numbers = (~has_chars) | (
+            text.str.replace(r'[0-9]', '', regex=True)
+                .str.replace('page', '', regex=False)
+                .str.strip() == ''
+        )
+        only_page_and_numbers = only_page_and_numbers.groupby(lines['group']).all()
+
+        # References: the first span is a number, and smaller than the next span
+        smaller_than_next = ((second['size'] - first['size']) >= 1).reindex(group_sizes.index, fill_value=False)
+        is_reference = first_is_digit & ((group_sizes == 1) | smaller_than_next)
+
+        flags = starts_with_page | single_number | only_page_and_numbers | is_reference
+        return pd.Series(
+            flags.reindex(group.values, fill_value=False).values,
+            index=self.index
+        )
+
     @cached_property
     def is_nothing(self):
         """
@@ -356,16 +467,13 @@ class Lines(pd.DataFrame):
         first_section_line_with_chars = lines_with_chars.iloc[0]
 
         # Filter to only consider titles in section
-        section_titles = self.loc[self.index.isin(
-            [idx for idx in self.index if idx in self.titles.index]
-        )].sort_values(by=['total_y'])
+        section_titles = self.loc[self.index.isin(self.titles.index)].sort_values(by=['total_y'])
 
         # Get the next title which is more titley than the title
-        more_titley = None
-        for idx, line in section_titles.iterrows():
-            if line.more_titley(title, first_section_line_with_chars):
-                more_titley = line
-                break
+        more_titley_titles = section_titles.loc[
+            section_titles.is_more_titley(title, first_section_line_with_chars)
+        ]
+        more_titley = None if more_titley_titles.empty else more_titley_titles.iloc[0]
 
         # Cut the section at the minimum y position of the more_titley line
         if more_titley is None:
@@ -392,22 +500,19 @@ class Lines(pd.DataFrame):
 
             # Remove bullet points from the text
             lines = lines.loc[~(
-                lines['text'].str.strip().apply(utils.is_bullet) &
+                lines['text'].str.strip().str.match(utils.bullet_patterns[True], na=False) &
                 (lines['span_number'] == 0)
             )]
 
             # Get the approximate size of the first word
             lines['end_gap'] = lines['bbox_x2'].max() - lines['bbox_x2']
-            lines['first_word_size'] = lines.apply(
-                lambda row:
-                    (row['bbox_x2'] - row['bbox_x1']) *
-                    len(row['text'].split(' ')[0]) / len(row['text']),
-                axis=1
-            )
+            lines['first_word_size'] = \
+                (lines['bbox_x2'] - lines['bbox_x1']) * \
+                lines['text'].str.split(' ', n=1).str[0].str.len() / lines['text'].str.len()
 
             # Get sentence end and sentence start
-            lines['sentence_start'] = lines.apply(lambda row: row.is_sentence_start(), axis=1)
-            lines['sentence_end'] = lines.apply(lambda row: row.is_sentence_end(), axis=1)
+            lines['sentence_start'] = lines.is_sentence_start()
+            lines['sentence_end'] = lines.is_sentence_end()
 
             # Get whether or not the sentence is the start of a new "item"
             # # 1. line starts with a bullet point
@@ -438,9 +543,8 @@ class Lines(pd.DataFrame):
             lines.loc[
                 lines['sentence_start'].fillna(True) & (
                     (lines['page_number'] == lines['page_number'].shift(1).fillna(0)) &
-                    ((lines['total_y'] - lines['total_y'].shift(1).fillna(-1)) > lines['size'].apply(
-                        lambda size: max(size*1.5, line_spacing_min*1.5)
-                    ))
+                    ((lines['total_y'] - lines['total_y'].shift(1).fillna(-1)) >
+                        (lines['size']*1.5).clip(lower=line_spacing_min*1.5))
                 ),
                 'vertical_gap'
             ] = True
@@ -475,6 +579,67 @@ class Lines(pd.DataFrame):
 
         return items
 
+    def is_sentence_start(self):
+        """
+        Check whether each row in a dataframe is a sentence start (see Line.is_sentence_start).
+        None if the first character is not a letter.
+        """
+        alphanumeric = utils.remove_bullets(self['text'])\
+            .str.replace(r'[^A-Za-z0-9 ]+', ' ', regex=True)\
+            .str.strip()
+        first_char = alphanumeric.str[0]
+
+        sentence_start = pd.Series([None]*len(self), index=self.index, dtype=object)
+        sentence_start.loc[alphanumeric == ''] = False
+        first_char_is_alpha = first_char.str.isalpha().fillna(False).astype(bool)
+        sentence_start.loc[first_char_is_alpha] = first_char.loc[first_char_is_alpha].str.isupper()
+
+        return sentence_start
+
+    def is_sentence_end(self):
+        """
+        Check whether each row in a dataframe is a sentence end (see Line.is_sentence_end).
+        """
+        sentence_enders = ['.', '?', '!']
+        exceptions = ['e.g.', 'i.e.']
+
+        text = self['text'].astype(str).str.strip().str.lower()
+        sentence_end = text.str[-1].isin(sentence_enders)
+        for exception in exceptions:
+            sentence_end &= ~text.str.endswith(exception)
+
+        return sentence_end
+
+    def is_more_titley(self, title, nontitle):
+        """
+        Check whether each row in a dataframe is more titley, or just as titley, as title (see Line.more_titley).
+        """
+        size = self['double_fontsize_int']
+        bold = self['bold'].astype(bool)
+        upper = self['text'].astype(str).str.isupper()
+        title_bold = bool(title['bold'])
+        title_upper = title['text'].isupper()
+
+        # If same size, bolder or uppercase = more titley.
+        # Same boldness and case, compare title with nontitle
+        same_size_more_titley = (
+            (bold & (not title_bold)) |
+            ((bold == title_bold) & (
+                (upper & (not title_upper)) |
+                ((upper == title_upper) & (
+                    (title['double_fontsize_int'] > nontitle['double_fontsize_int']) or
+                    (title_bold and not nontitle['bold'])
+                ))
+            ))
+        )
+
+        # Don't consider titles in images as titles.
+        # If line is larger, it is more titley
+        return ~self['img'].astype(bool) & (
+            (size > max(title['double_fontsize_int'], nontitle['double_fontsize_int'])) |
+            ((size == title['double_fontsize_int']) & same_size_more_titley)
+        )
+
     def is_bullet_start(self):
         """
         Check whether each row in a dataframe is the start of a bullet point.
@@ -485,13 +650,13 @@ class Lines(pd.DataFrame):
 
         # The row is a bullet start if it meets a bullet format (i.e. bullet point character, "a)", "a.", etc.)
         lines.loc[
-            lines['text'].str.strip().apply(utils.is_bulleted) &
+            lines['text'].str.strip().str.match(utils.bullet_patterns[False], na=False) &
             (lines['span_number'] == 0),
             'bullet_start'
         ] = True
 
         # The row is a bullet start if the previous row is a bullet, and is on the same level
-        lines['bullet'] = lines['text'].str.strip().apply(utils.is_bullet)
+        lines['bullet'] = lines['text'].str.strip().str.match(utils.bullet_patterns[True], na=False)
         lines.loc[
             (lines['total_y'] == lines['total_y'].shift(1).fillna(-1)) &
             lines['bullet'].shift(1).fillna(False),
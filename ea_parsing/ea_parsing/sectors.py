@@ -3,13 +3,20 @@ from ea_parsing.utils import strip_non_alpha, remove_filler_words, generate_sent
 
 
 class Sectors:
+    # Sector vocabulary, built once per process and shared by all instances
+    _vocabulary = None
+
     def __init__(self):
         """
+        Sector titles with their variations, and lookups of the titles and of the titles without filler words.
         """
-        self.sectors = self._process_sectors(
-            sectors=ea_parsing.definitions.SECTORS,
-            abbreviations=ea_parsing.definitions.ABBREVIATIONS
-        )
+        if Sectors._vocabulary is None:
+            sectors = self._process_sectors(
+                sectors=ea_parsing.definitions.SECTORS,
+                abbreviations=ea_parsing.definitions.ABBREVIATIONS
+            )
+            Sectors._vocabulary = (sectors, *self._build_lookups(sectors))
+        self.sectors, self.exact_titles, self.filler_titles = Sectors._vocabulary
 
     def _process_sectors(self, sectors, abbreviations):
         """
@@ -55,6 +62,20 @@ class Sectors:
 
         return sectors_with_abbs
 
+    def _build_lookups(self, sectors):
+        """
+        Map each title, and each title without filler words, to the sector name.
+        If a title belongs to several sectors, the first sector is kept.
+        """
+        exact_titles = {}
+        filler_titles = {}
+        for sector_name, titles in sectors.items():
+            for title in titles:
+                exact_titles.setdefault(title, sector_name)
+                filler_titles.setdefault(remove_filler_words(title), sector_name)
+
+        return exact_titles, filler_titles
+
     def get_similar_sector(self, text):
         """
         Get the sector that is most similar to the given text.
@@ -70,15 +91,13 @@ class Sectors:
                     text_base = text_base[len(prefix):].strip()
 
         # First, check if there is an exact match with the titles
-        for sector_name, titles in self.sectors.items():
-            for title in titles:
-                if text_base == title:
-                    return sector_name, 1
+        sector_name = self.exact_titles.get(text_base)
+        if sector_name is not None:
+            return sector_name, 1
 
         # Next, check if the title is any title plus filler words
-        for sector_name, titles in self.sectors.items():
-            for title in titles:
-                if remove_filler_words(text_base) == remove_filler_words(title):
-                    return sector_name, 1
+        sector_name = self.filler_titles.get(remove_filler_words(text_base))
+        if sector_name is not None:
+            return sector_name, 1
 
         return None, 0
@@ -1,5 +1,7 @@
 import re
+import math
 import itertools
+import numpy as np
 import ea_parsing.definitions
 
 
@@ -39,6 +41,14 @@ def generate_sentence_variations(sentence, abbreviations):
     return sentence_options
 
 
+def split_range(n, n_chunks):
+    """
+    Split range(n) into at most n_chunks contiguous ranges of similar length.
+    """
+    chunk_size = max(1, -(-n // n_chunks))
+    return [range(i, min(i+chunk_size, n)) for i in range(0, n, chunk_size)]
+
+
 def contains(bbox1, bbox2):
     # Check if bbox1 contains bbox2
     if (
@@ -59,6 +69,160 @@ def get_overlap(bbox1, bbox2):
         return dx*dy
 
 
+class BoxGrid:
+    def __init__(self, boxes, cell_size=50, max_cells=64):
+        """
+        Spatial index of boxes (x0, y0, x1, y1), e.g. drawings or images of a page.
+        The page is divided into a uniform grid of square cells, and each box is listed in the cells it covers.
+        A query only checks the boxes listed in the cells of the query box: boxes which overlap or contain
+        the query box share at least one cell with it.
+        Boxes covering more than max_cells cells (e.g. page backgrounds) are checked by every query.
+
+        Parameters
+        ----------
+        boxes : list of bboxes (required)
+            Boxes to index, their positions in this list are returned by the queries.
+
+        cell_size : float (default=50)
+            Width and height of the cells of the grid.
+
+        max_cells : int (default=64)
+            Maximum number of cells of a box listed in the grid.
+        """
+        self.boxes = np.array([tuple(box) for box in boxes], dtype=float).reshape(-1, 4)
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        cells = {}
+        large_boxes = []
+        for position, box in enumerate(self.boxes):
+            box_cells = self._get_cells(box)
+            if box_cells is None:
+                large_boxes.append(position)
+                continue
+            for cell in box_cells:
+                cells.setdefault(cell, []).append(position)
+
+        # Positions of the boxes listed in each cell, in increasing order
+        self.large_boxes = np.array(large_boxes, dtype=int)
+        self.cells = {cell: np.array(positions, dtype=int) for cell, positions in cells.items()}
+
+    def _get_cells(self, bbox):
+        """
+        Get the cells covered by bbox, None if there are more than max_cells or the box is not finite.
+        """
+        x0, x1 = sorted((bbox[0], bbox[2]))
+        y0, y1 = sorted((bbox[1], bbox[3]))
+        if not all(math.isfinite(coordinate) for coordinate in (x0, y0, x1, y1)):
+            return None
+        xs = range(math.floor(x0/self.cell_size), math.floor(x1/self.cell_size)+1)
+        ys = range(math.floor(y0/self.cell_size), math.floor(y1/self.cell_size)+1)
+        if len(xs)*len(ys) > self.max_cells:
+            return None
+        return [(x, y) for x in xs for y in ys]
+
+    def candidates(self, bbox):
+        """
+        Get the positions of the boxes which may overlap or contain bbox (a box may be listed more than once).
+        """
+        cells = self._get_cells(bbox)
+        if cells is None:
+            return np.arange(len(self.boxes))
+        return np.concatenate([self.large_boxes] + [self.cells[cell] for cell in cells if cell in self.cells])
+
+    def largest_overlap(self, bbox):
+        """
+        Get the position of the box with the largest overlap area with bbox, the first one if tied.
+        As with get_overlap, boxes which only touch bbox (zero area) don't overlap it.
+        Returns None if no box overlaps bbox.
+        """
+        positions = self.candidates(bbox)
+        if len(positions) == 0:
+            return None
+        boxes = self.boxes[positions]
+        dx = np.minimum(bbox[2], boxes[:, 2]) - np.maximum(bbox[0], boxes[:, 0])
+        dy = np.minimum(bbox[3], boxes[:, 3]) - np.maximum(bbox[1], boxes[:, 1])
+        areas = dx*dy
+        overlapping = (dx >= 0) & (dy >= 0) & (areas != 0)
+        if not overlapping.any():
+            return None
+        largest = overlapping & (areas == areas[overlapping].max())
+        return int(positions[largest].min())
+
+    def any_contains(self, bbox):
+        """
+        Check if any box contains bbox (see contains).
+        """
+        boxes = self.boxes[self.candidates(bbox)]
+        return bool((
+            (boxes[:, 0] < bbox[0]) &
+            (boxes[:, 1] < bbox[1]) &
+            (boxes[:, 2] > bbox[2]) &
+            (boxes[:, 3] > bbox[3])
+        ).any())
+
+
+def peel_repeating_layers(stacks, keys, removable, min_repeats=3):
+    """
+    Peel repeating elements from the outside of stacks, e.g. headers from the tops of pages.
+    In each round, the elements on the outside of the stacks whose key is on the outside of at least min_repeats stacks are removed (if removable).
+    Rounds are run until nothing more can be removed.
+    Stacks are tracked with a hash map of the keys on the outside, so only the stacks which changed are looked at again in each round.
+
+    Parameters
+    ----------
+    stacks : list of lists (required)
+        Elements of each stack, ordered from the outside in.
+
+    keys : dict or list (required)
+        Key of each element. Elements with an empty key are not counted and are never removed.
+
+    removable : dict or list (required)
+        Whether each element can be removed.
+
+    min_repeats : int (default=3)
+        Number of stacks an element key must be on the outside of to be removed.
+
+    Returns
+    -------
+    removed : list
+        Removed elements.
+    """
+    positions = [0]*len(stacks)
+    outside = {}
+
+    def next_key(stack):
+        if positions[stack] < len(stacks[stack]):
+            key = keys[stacks[stack][positions[stack]]]
+            if key:
+                outside.setdefault(key, set()).add(stack)
+                return key
+
+    changed = {next_key(stack) for stack in range(len(stacks))}
+    changed.discard(None)
+    removed = []
+    while changed:
+
+        # Get the elements to remove in this round
+        peeled = []
+        for key in changed:
+            if len(outside[key]) >= min_repeats:
+                peeled += [
+                    (key, stack) for stack in outside[key]
+                    if removable[stacks[stack][positions[stack]]]
+                ]
+
+        # Remove the elements, and count the elements underneath
+        changed = set()
+        for key, stack in peeled:
+            outside[key].discard(stack)
+            removed.append(stacks[stack][positions[stack]])
+            positions[stack] += 1
+            changed.add(next_key(stack))
+        changed.discard(None)
+
+    return removed
+
+
 def get_area(bbox):
     return abs((bbox[2]-bbox[0])*(bbox[1]-bbox[3]))
 
@@ -96,48 +260,66 @@ def remove_filler_words(text):
     return text_without_fillers
 
 
-def is_bulleted(text, end=False):
+def get_title_base(text_base):
     """
-    Check whether the text is a bullet point, i.e. it starts with a bullet point or other format ("a)", "a.", etc.)
+    Normalise text_base (pandas Series) for comparing with section title texts: keep only letters and remove filler words.
+    """
+    return text_base\
+        .str.replace(r'[^A-Za-z ]+', ' ', regex=True)\
+        .str.strip()\
+        .apply(remove_filler_words)
+
+
+def compile_bullet_pattern(end=False):
+    """
+    Compile one pattern for all bullet point formats (bullet point character, "a)", "a.", etc.), see is_bulleted.
 
     Parameters
     ----------
-    text : string (required)
-        Text to check.
-
     end : bool (default=False)
-        If True, force pattern end. I.e. will only return True if the whole text is a bullet point.
+        If True, force pattern end. I.e. will only match if the whole text is a bullet point.
     """
-    text = text.strip()
+    close_bracket_or_point = r'(\)|\.)'
+    patterns = [
+        # First character is a bullet point character
+        r'('+r'|'.join(ea_parsing.definitions.BULLETS)+r')',
+        # Text matches the format: 1), 1.
+        r'^[1-9]' + close_bracket_or_point,
+        # Text matches the format: a), a.
+        r'^[a-zA-Z]' + close_bracket_or_point,
+        # Text matches the format: i) ii) ... xx)
+        r'(?i:^(X{0,3})(IX|IV|V?I{0,3})' + close_bracket_or_point + r')',
+    ]
+    pattern_end = '$' if end else r'\s'
 
-    # First character is a bullet point character
-    pattern = r'('+r'|'.join(ea_parsing.definitions.BULLETS)+r')'
-    pattern += '$' if end else r'\s'
-    if re.match(pattern, text):
-        return True
+    return re.compile(r'|'.join(r'(?:' + pattern + pattern_end + r')' for pattern in patterns))
 
-    close_bracket_or_point = r'(\)|\.)'
 
-    # Text matches the format: 1), 1.
-    pattern = r'^[1-9]' + close_bracket_or_point
-    pattern += '$' if end else r'\s'
-    if re.match(pattern, text):
-        return True
+# Bullet point patterns, compiled once: bullets followed by text (end=False), and bullets only (end=True)
+bullet_patterns = {
+    False: compile_bullet_pattern(end=False),
+    True: compile_bullet_pattern(end=True)
+}
 
-    # Text matches the format: a), a.
-    pattern = r'^[a-zA-Z]' + close_bracket_or_point
-    pattern += '$' if end else r'\s'
-    if re.match(pattern, text):
-        return True
+# Patterns of the bullet formats removed by remove_bullet
+bullet_number_pattern = re.compile(r'^[1-9](\)|\.)\s')
+bullet_letter_pattern = re.compile(r'^[a-zA-Z](\)|\.)\s')
+bullet_roman_numeral_pattern = re.compile(r'^(X{0,3})(IX|IV|V?I{0,3})(\)|\.)\s')
 
-    # Text matches the format: i) ii) ... xx)
-    regex_roman_numerals = r'^(X{0,3})(IX|IV|V?I{0,3})'
-    pattern = regex_roman_numerals + close_bracket_or_point
-    pattern += '$' if end else r'\s'
-    if re.match(pattern, text, re.IGNORECASE):
-        return True
 
-    return False
+def is_bulleted(text, end=False):
+    """
+    Check whether the text is a bullet point, i.e. it starts with a bullet point or other format ("a)", "a.", etc.)
+
+    Parameters
+    ----------
+    text : string (required)
+        Text to check.
+
+    end : bool (default=False)
+        If True, force pattern end. I.e. will only return True if the whole text is a bullet point.
+    """
+    return bool(bullet_patterns[end].match(text.strip()))
 
 
 def is_bullet(text):
@@ -158,17 +340,36 @@ def remove_bullet(text):
         return text[1:]
 
     # Remove 1), 1.
-    text = re.sub(r'^[1-9](\)|\.)\s', '', text)
+    text = bullet_number_pattern.sub('', text)
 
     # Remove a), a.
-    text = re.sub(r'^[a-zA-Z](\)|\.)\s', '', str(text)).strip()
+    text = bullet_letter_pattern.sub('', str(text)).strip()
 
     # Remove i, ii, etc.
-    text = re.sub(r'^(X{0,3})(IX|IV|V?I{0,3})(\)|\.)\s', '', str(text)).strip()
+    text = bullet_roman_numeral_pattern.sub('', str(text)).strip()
 
     return text
 
 
+def remove_bullets(texts):
+    """
+    Remove bullet characters from the beginning of texts (pandas Series), see remove_bullet.
+    """
+    texts = texts.str.strip()
+    texts_without_bullets = texts\
+        .str.replace(bullet_number_pattern, '', regex=True)\
+        .str.replace(bullet_letter_pattern, '', regex=True)\
+        .str.strip()\
+        .str.replace(bullet_roman_numeral_pattern, '', regex=True)\
+        .str.strip()
+
+    # Remove bullet point
+    starts_with_bullet = texts.str[0].isin(ea_parsing.definitions.BULLETS)
+    texts_without_bullets.loc[starts_with_bullet] = texts.loc[starts_with_bullet].str[1:]
+
+    return texts_without_bullets
+
+
 def tidy_sentence(text):
     """
     Tidy a sentence, including:
@@ -0,0 +1,208 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import fitz
+import numpy as np
+import pandas as pd
+import ea_parsing.definitions
+from ea_parsing import utils
+from ea_parsing.appeal_document import SpanColumns, AppealDocument, extract_pages_spans, extract_document_spans
+from tests.test_lines import make_lines
+
+
+def span_values(page_number, line_number, text, y, font='Arial-BoldMT', highlight_color=None):
+    return dict(
+        text=text, size=10.5, flags=20, font=font, color='#000000', ascender=0.9, descender=-0.2,
+        bold=True, highlight_color=highlight_color, page_number=page_number, block_number=0,
+        line_number=line_number, span_number=0, origin_x=72.5, origin_y=y, total_y=y, img=False,
+        bbox_x1=72.5, bbox_y1=y - 10, bbox_x2=200.25, bbox_y2=y + 2.5
+    )
+
+
+class TestSpanColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.pages = [
+            [span_values(0, 0, 'Title', 50.5), span_values(0, 1, 'Text', 70, font='Arial', highlight_color='#ffff00')],
+            [span_values(1, 0, 'Next page', 30, font='Calibri'), span_values(1, 1, 'Text', 80.25, font='Arial')],
+        ]
+
+    def get_page_columns(self, page):
+        columns = SpanColumns()
+        for values in page:
+            values = values.copy()
+            columns.append(values.pop('text'), **values)
+        return columns
+
+    def test_extend_same_as_list_of_dicts(self):
+        """
+        Spans of pages extended page by page give the same frame as a list of span dicts,
+        with total_y moved down by the height of the previous pages.
+        """
+        spans = SpanColumns()
+        for page_number, page in enumerate(self.pages):
+            spans.extend(self.get_page_columns(page), y_offset=842 * page_number)
+        self.assertEqual(len(spans), 4)
+
+        expected = pd.DataFrame([
+            {**values, 'total_y': values['total_y'] + 842 * page_number}
+            for page_number, page in enumerate(self.pages)
+            for values in page
+        ])[SpanColumns.columns]
+        frame = spans.to_frame()
+        self.assertEqual(frame.columns.to_list(), SpanColumns.columns)
+        pd.testing.assert_frame_equal(
+            frame.astype({name: object for name in SpanColumns.categorical_columns}),
+            expected,
+            check_dtype=False
+        )
+
+    def test_to_frame_dtypes(self):
+        frame = self.get_page_columns(self.pages[0]).to_frame()
+        self.assertEqual(frame['total_y'].dtype, np.float64)
+        self.assertEqual(frame['bbox_x1'].dtype, np.float32)
+        self.assertEqual(frame['page_number'].dtype, np.int16)
+        self.assertEqual(frame['bold'].dtype, bool)
+        self.assertEqual(frame['font'].dtype, 'category')
+        self.assertEqual(frame['font'].cat.categories.to_list(), ['Arial-BoldMT', 'Arial'])
+        self.assertTrue(pd.isna(frame.loc[0, 'highlight_color']))
+        self.assertEqual(frame.loc[1, 'highlight_color'], '#ffff00')
+
+    def test_empty(self):
+        frame = SpanColumns().to_frame()
+        self.assertTrue(frame.empty)
+        self.assertEqual(frame.columns.to_list(), SpanColumns.columns)
+
+
+class TestRemovePageLabelsReferences(unittest.TestCase):
+
+    def test_remove_page_labels_references(self):
+        """
+        Page labels and references are removed from the blocks at the top and bottom of pages,
+        until a block which is not completely a page label or reference.
+        """
+        lines = make_lines([
+            (0, 0, 0, 0, 20, 'Page 1', 10),
+            (0, 1, 0, 0, 40, 'Emergency appeal final report', 12),
+            (0, 2, 0, 0, 300, '12', 10),
+            (0, 3, 0, 0, 400, 'Body text of the page.', 10),
+            (0, 4, 0, 0, 780, '1', 6),
+            (0, 4, 0, 1, 780, 'See the report of the assessment', 9),
+            (0, 5, 0, 0, 800, '3', 10),
+            (1, 0, 0, 0, 20, 'Page 2', 10),
+            (1, 0, 1, 0, 35, 'Operation overview', 12),
+            (1, 1, 0, 0, 400, 'Body', 10),
+            (1, 2, 0, 0, 800, 'IFRC', 10),
+        ])
+        lines.index = lines.index + 100
+        document = AppealDocument(name='Final report', document_url=None, created_at=None)
+
+        lines = document.remove_page_labels_references(lines=lines)
+        self.assertEqual(
+            lines['text'].to_list(),
+            ['Emergency appeal final report', '12', 'Body text of the page.', 'Operation overview', 'Body', 'IFRC']
+        )
+        self.assertEqual(lines.index.to_list(), [101, 102, 103, 108, 109, 110])
+
+
+class TestDropRepeatingHeadersFooters(unittest.TestCase):
+
+    def test_drop_all_repeating_headers_footers(self):
+        """
+        Repeating blocks and then repeating lines are dropped from the top and bottom of pages,
+        but not section titles.
+        """
+        rows = []
+        for page in range(4):
+            rows += [
+                (page, 0, 0, 0, 10, 'IFRC Emergency appeal', 8),
+                (page, 1, 0, 0, 30, 'Operation update' if page < 3 else 'Summary', 12),
+                (page, 2, 0, 0, 50, 'Lessons learned' if page < 3 else 'More body text', 12),
+                (page, 3, 0, 0, 400, f'Body text {page}', 10),
+                (page, 3, 1, 0, 420, 'Footer note', 8),
+                (page, 4, 0, 0, 800, 'www.ifrc.org', 8),
+            ]
+        lines = make_lines(rows)
+        lines['title_base'] = utils.get_title_base(lines['text_base'])
+        document = AppealDocument(name='Final report', document_url=None, created_at=None)
+
+        lines = document.drop_all_repeating_headers_footers(lines=lines)
+        self.assertEqual(lines['text'].to_list(), [
+            'Lessons learned', 'Body text 0',
+            'Lessons learned', 'Body text 1',
+            'Lessons learned', 'Body text 2',
+            'Summary', 'More body text', 'Body text 3',
+        ])
+
+    def test_no_repeats(self):
+        lines = make_lines([(page, 0, 0, 0, 10, f'Text {page}', 10) for page in range(4)])
+        lines['title_base'] = utils.get_title_base(lines['text_base'])
+        document = AppealDocument(name='Final report', document_url=None, created_at=None)
+        self.assertEqual(len(document.drop_all_repeating_headers_footers(lines=lines)), 4)
+
+
+def make_pdf(n_pages):
+    """
+    PDF with pages of different heights, each with a title and some paragraphs.
+    """
+    doc = fitz.open()
+    for page_number in range(n_pages):
+        page = doc.new_page(width=595, height=842 + 10 * (page_number % 3))
+        page.insert_text((72, 60), f'Operation update {page_number + 1}', fontsize=14, fontname='helvetica-bold')
+        for i in range(page_number % 4 + 1):
+            page.insert_text((72, 120 + 80 * i), f'Paragraph {i} of page {page_number + 1}\nwith a second line',
+                             fontsize=10)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+class TestExtractPagesSpans(unittest.TestCase):
+
+    def setUp(self):
+        self.pdf = make_pdf(11)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.filename = os.path.join(folder.name, 'document.pdf')
+        with open(self.filename, 'wb') as f:
+            f.write(self.pdf)
+
+    def test_pooled_same_as_serial(self):
+        """
+        Pages extracted by a pool of processes give the same spans and page heights, in the page order,
+        and the same positions in the whole document (total_y), from a file and from bytes.
+        """
+        self.assertGreaterEqual(11, ea_parsing.definitions.PARALLEL_MIN_PAGES)
+        serial = list(extract_pages_spans(self.filename, n_workers=1))
+        self.assertEqual([height for _, height in serial], [842 + 10 * (i % 3) for i in range(11)])
+
+        for pdf in [self.filename, self.pdf]:
+            pooled = list(extract_pages_spans(pdf, n_workers=3))
+            self.assertEqual(len(pooled), len(serial))
+            for (pooled_spans, pooled_height), (serial_spans, serial_height) in zip(pooled, serial):
+                self.assertEqual(pooled_height, serial_height)
+                pd.testing.assert_frame_equal(pooled_spans.to_frame(), serial_spans.to_frame())
+
+            pd.testing.assert_frame_equal(
+                extract_document_spans(pdf, n_workers=3),
+                extract_document_spans(self.filename, n_workers=1)
+            )
+
+    def test_document_spans(self):
+        spans = extract_document_spans(self.filename, n_workers=1)
+        titles = spans.loc[spans['text'].str.startswith('Operation update')]
+        self.assertEqual(titles['page_number'].to_list(), list(range(11)))
+        # each page is below the previous pages
+        page_tops = np.cumsum([0] + [842 + 10 * (i % 3) for i in range(10)])
+        np.testing.assert_allclose(titles['total_y'] - titles['origin_y'], page_tops)
+
+    def test_small_document_not_pooled(self):
+        with mock.patch('ea_parsing.appeal_document.ProcessPoolExecutor') as executor:
+            pages = list(extract_pages_spans(make_pdf(3), n_workers=3))
+        executor.assert_not_called()
+        self.assertEqual(len(pages), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import io
+import unittest
+from ea_parsing.appeal_document import GOAPI
+from dref_parsing.go_api_stub import StubGOServer
+
+
+APPEALS = [{'id': i, 'code': f'MDRXX{i:03d}'} for i in range(23)]
+DOCUMENTS = [{'id': i, 'appeal': i % 3, 'name': f'Report {i}'} for i in range(12)]
+
+
+class TestGOAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubGOServer({'appeal': APPEALS, 'appeal_document': DOCUMENTS}).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.base_url = self.server.base_url
+
+    def test_get_results_all_pages_in_order(self):
+        """
+        All pages are requested (concurrently by offsets) and merged in the page order.
+        """
+        results = GOAPI(base_url=self.base_url)._get_results(call='appeal')
+        self.assertEqual(results, APPEALS)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_get_appeal_data(self):
+        appeal = GOAPI(base_url=self.base_url).get_appeal_data(mdr_code='MDRXX007')
+        self.assertEqual(appeal, {'id': 7, 'code': 'MDRXX007'})
+
+        with self.assertRaises(RuntimeError):
+            GOAPI(base_url=self.base_url).get_appeal_data(mdr_code='MDRXX999')
+
+    def test_get_appeal_document_data(self):
+        documents = GOAPI(base_url=self.base_url).get_appeal_document_data(id=1)
+        self.assertEqual(documents, [document for document in DOCUMENTS if document['appeal'] == 1])
+
+    def test_retry_failed_requests(self):
+        """
+        Requests failing with 503 are retried.
+        """
+        self.server.failures = 2
+        results = GOAPI(base_url=self.base_url)._get_results(call='appeal')
+        self.assertEqual(results, APPEALS)
+
+    def test_get_document(self):
+        content = GOAPI(base_url=self.base_url).get_document(self.base_url + 'report.pdf')
+        self.assertEqual(content, b'%PDF-1.4')
+
+    def test_download_document(self):
+        file = io.BytesIO()
+        GOAPI(base_url=self.base_url).download_document(self.base_url + 'report.pdf', file, chunk_size=3)
+        self.assertEqual(file.getvalue(), b'%PDF-1.4')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import random
+import itertools
+import unittest
+from unittest import mock
+import pandas as pd
+import ea_parsing.definitions
+from ea_parsing.lines import Lines
+
+
+def make_lines(rows, **columns):
+    """
+    Lines from rows of (page_number, block_number, line_number, span_number, origin_y, text, size).
+    """
+    lines = Lines(
+        pd.DataFrame(rows, columns=[
+            'page_number', 'block_number', 'line_number', 'span_number', 'origin_y', 'text', 'size'
+        ]).assign(**columns)
+    )
+    lines['total_y'] = lines['page_number'] * 1000 + lines['origin_y']
+    lines['text_base'] = lines['text']\
+        .str.replace(r'[^A-Za-z0-9 ]+', ' ', regex=True)\
+        .str.replace(' +', ' ', regex=True)\
+        .str.lower()\
+        .str.strip()
+    return lines
+
+
+class TestPageLabelOrReference(unittest.TestCase):
+
+    def test_same_as_checking_each_group(self):
+        """
+        Groups flagged at once are the groups where is_page_label or is_reference is true.
+        """
+        random.seed(0)
+        texts = ['Page 3', '3', '12', 'page', 'PAGE 4 of 10', 'Appeal report', '2 Footnote text', '-', '', None]
+        rows = [
+            (page, random.randrange(4), random.randrange(3), random.randrange(3), random.uniform(0, 800),
+             random.choice(texts), random.choice([6, 8, 10]))
+            for page in range(20) for _ in range(random.randrange(1, 12))
+        ]
+        lines = make_lines(rows)
+
+        for by in [['page_number', 'block_number'], ['page_number', 'block_number', 'line_number']]:
+            flags = lines.is_page_label_or_reference_by(by=by)
+            for _, group in lines.groupby(by):
+                expected = bool(group.is_page_label() or group.is_reference())
+                self.assertEqual(flags.loc[group.index].to_list(), [expected] * len(group), group)
+
+    def test_page_label_and_reference(self):
+        lines = make_lines([
+            (0, 0, 0, 0, 10, 'Page 2', 10),
+            (0, 1, 0, 0, 20, '4', 6),
+            (0, 1, 0, 1, 20, 'Reference to a report', 8),
+            (0, 2, 0, 0, 30, '4', 10),
+            (0, 2, 0, 1, 30, 'people were reached', 10),
+            (0, 3, 0, 0, 40, 'Operation update', 10),
+        ])
+        flags = lines.is_page_label_or_reference_by(by=['page_number', 'block_number'])
+        self.assertEqual(flags.to_list(), [True, True, True, False, False, False])
+
+
+class TestCombineBulletSpans(unittest.TestCase):
+
+    def combine_sequentially(self, lines):
+        is_bullet = lines['text'].str.strip().isin(ea_parsing.definitions.BULLETS) & (lines['span_number'] == 0)
+        return lines._combine_bullet_spans_sequentially(bullets=lines.loc[is_bullet])
+
+    def assert_combined(self, lines, expected, sequentially):
+        with mock.patch.object(
+            Lines, '_combine_bullet_spans_sequentially', autospec=True,
+            side_effect=Lines._combine_bullet_spans_sequentially
+        ) as fallback:
+            combined = lines.combine_bullet_spans()
+        self.assertEqual(fallback.called, sequentially)
+        if expected is not None:
+            self.assertEqual(
+                list(zip(combined['text'], combined['line_number'], combined['span_number'])),
+                expected
+            )
+        pd.testing.assert_frame_equal(pd.DataFrame(combined), pd.DataFrame(self.combine_sequentially(lines)))
+
+    def test_bullet_texts_moved_to_bullet_lines(self):
+        lines = make_lines([
+            (0, 0, 0, 0, 100, '•', 10),
+            (0, 0, 1, 0, 120, '•', 10),
+            (0, 0, 2, 0, 100, 'First item', 10),
+            (0, 0, 3, 0, 120, 'Second item', 10),
+            (0, 0, 3, 1, 120, 'in bold', 10),
+            (0, 1, 0, 0, 140, '•', 10),
+            (1, 0, 0, 0, 100, 'Text on the next page', 10),
+        ])
+        self.assert_combined(lines, [
+            ('•', 0, 0), ('•', 1, 0), ('First item', 0, 1), ('Second item', 1, 1), ('in bold', 3, 1),
+            ('•', 0, 0), ('Text on the next page', 0, 0),
+        ], sequentially=False)
+
+    def test_text_at_level_of_several_bullets(self):
+        """
+        Bullets are combined one after the other if a text is at the level of several bullets,
+        or if texts are moved from lines with other bullets.
+        """
+        lines = make_lines([
+            (0, 0, 0, 0, 100, '•', 10),
+            (0, 0, 1, 0, 100, '-', 10),
+            (0, 0, 2, 0, 100, 'Item', 10),
+        ])
+        self.assert_combined(lines, expected=None, sequentially=True)
+
+    def test_bullets_on_same_line(self):
+        lines = make_lines([
+            (0, 0, 0, 0, 100, '•', 10),
+            (0, 0, 0, 0, 120, '•', 10),
+            (0, 0, 1, 0, 100, 'First item', 10),
+            (0, 0, 2, 0, 120, 'Second item', 10),
+        ])
+        self.assert_combined(lines, [('•', 0, 0), ('•', 0, 0), ('First item', 0, 1), ('Second item', 0, 2)],
+                             sequentially=True)
+
+    def test_same_as_sequentially(self):
+        random.seed(0)
+        for _ in range(100):
+            rows = [
+                (random.randrange(2), random.randrange(2), random.randrange(4), random.choice([0, 0, 1]),
+                 random.choice([100, 120, 140]), random.choice(['•', '-', 'Text', 'More text', None]), 10)
+                for _ in range(random.randrange(1, 15))
+            ]
+            lines = make_lines(rows)
+            pd.testing.assert_frame_equal(
+                pd.DataFrame(lines.combine_bullet_spans()),
+                pd.DataFrame(self.combine_sequentially(lines))
+            )
+
+
+class TestMoreTitley(unittest.TestCase):
+
+    def test_same_as_line_more_titley(self):
+        """
+        Rows flagged by is_more_titley are the rows where Line.more_titley is true.
+        """
+        rows = list(itertools.product([20, 24, 28], [False, True], ['Operation overview', 'OPERATION'], [False, True]))
+        lines = Lines(pd.DataFrame(rows, columns=['double_fontsize_int', 'bold', 'text', 'img']))
+
+        for title, nontitle in itertools.product(lines.loc[~lines['img']].index, repeat=2):
+            expected = [line.more_titley(lines.loc[title], lines.loc[nontitle]) for _, line in lines.iterrows()]
+            self.assertEqual(
+                lines.is_more_titley(lines.loc[title], lines.loc[nontitle]).to_list(),
+                expected,
+                (title, nontitle)
+            )
+
+
+class TestSentenceStartEnd(unittest.TestCase):
+
+    texts = [
+        'The operation started.', 'the operation', 'a) First item', 'b. second item', '• Bullet point',
+        '- lower case bullet', '1) Numbered', '2020 was a year', '(Continued)', 'i.e.', 'For example e.g.',
+        'Done!', 'Why?', '...', '', ' ', '•', 'ii) roman', 'IV. Roman', '"Quoted" text', None
+    ]
+
+    def test_same_as_line(self):
+        """
+        Sentence starts and ends of all rows are the same as checked line by line.
+        Line by line, the start of empty texts can't be checked.
+        """
+        lines = Lines(pd.DataFrame({'text': self.texts}))
+        lines = lines.loc[lines['text'].fillna('').str.strip() != '']
+
+        sentence_start = lines.is_sentence_start()
+        sentence_end = lines.is_sentence_end()
+        for i, line in lines.iterrows():
+            self.assertIs(sentence_start[i], line.is_sentence_start(), line['text'])
+            self.assertEqual(sentence_end[i], line.is_sentence_end(), line['text'])
+
+    def test_values(self):
+        lines = Lines(pd.DataFrame({'text': ['The operation started.', 'the operation', '2020 was a year', '', None]}))
+        self.assertEqual(lines.is_sentence_start().to_list(), [True, False, None, False, None])
+        self.assertEqual(lines.is_sentence_end().to_list(), [True, False, False, False, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import random
+import unittest
+import numpy as np
+import pandas as pd
+from ea_parsing import utils
+from ea_parsing.lessons_learned_extractor import ALL_TITLE_TEXTS, TITLE_TEXTS
+
+
+def random_box(size):
+    x0, y0 = random.uniform(-50, 650), random.uniform(-50, 850)
+    return (x0, y0, x0 + random.uniform(-5, size), y0 + random.uniform(-5, size))
+
+
+class TestBoxGrid(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        # Small and large boxes, boxes on grid lines, inverted boxes
+        self.boxes = (
+            [random_box(60) for _ in range(300)]
+            + [random_box(900) for _ in range(5)]
+            + [(50, 50, 100, 100), (100, 100, 150, 150), (0, 0, 600, 800)]
+        )
+        self.queries = (
+            [random_box(80) for _ in range(500)]
+            + [(60, 60, 90, 90), (100, 100, 120, 120), (50, 50, 100, 100), (float('nan'), 0, 10, 10)]
+        )
+
+    def test_largest_overlap_same_as_brute_force(self):
+        """
+        The first box with the largest overlap area, as when all boxes are checked.
+        """
+        grid = utils.BoxGrid(self.boxes, cell_size=50, max_cells=16)
+        for query in self.queries:
+            overlaps = [utils.get_overlap(query, box) for box in self.boxes]
+            overlapping = [position for position, overlap in enumerate(overlaps) if overlap]
+            expected = max(overlapping, key=lambda position: overlaps[position]) if overlapping else None
+            self.assertEqual(grid.largest_overlap(query), expected)
+
+    def test_any_contains_same_as_brute_force(self):
+        grid = utils.BoxGrid(self.boxes, cell_size=50, max_cells=16)
+        for query in self.queries:
+            expected = any(utils.contains(box, query) for box in self.boxes)
+            self.assertEqual(grid.any_contains(query), expected)
+
+    def test_no_boxes(self):
+        grid = utils.BoxGrid([])
+        self.assertIsNone(grid.largest_overlap((0, 0, 10, 10)))
+        self.assertFalse(grid.any_contains((0, 0, 10, 10)))
+
+    def test_candidates_only_from_query_cells(self):
+        """
+        Queries don't check boxes far away from the query box.
+        """
+        grid = utils.BoxGrid([(0, 0, 10, 10), (500, 500, 510, 510), (-10, -10, 1000, 1000)], max_cells=16)
+        self.assertEqual(sorted(set(grid.candidates((1, 1, 5, 5)))), [0, 2])
+
+
+class TestTitleBase(unittest.TestCase):
+
+    def test_matches_title_texts(self):
+        """
+        Section titles match the title texts after removing numbers and filler words.
+        """
+        text_base = pd.Series(['lessons learned', 'challenges and lessons learned', '2 key lessons learnt',
+                               'challenges', 'health 2', 'the a to', np.nan])
+        title_base = utils.get_title_base(text_base)
+        self.assertEqual(
+            title_base.to_list(),
+            ['lessons learned', 'challenges lessons learned', 'lessons learnt', 'challenges', 'health', '', None]
+        )
+        self.assertEqual(title_base.isin(ALL_TITLE_TEXTS).to_list(), [True, True, True, True, False, False, False])
+        self.assertEqual(title_base.isin(TITLE_TEXTS['challenges']).to_list(),
+                         [False, True, False, True, False, False, False])
+
+
+def peel_repeating_layers_one_by_one(stacks, keys, removable, min_repeats=3):
+    """
+    Reference for peel_repeating_layers: count the keys on the outside of all stacks in each round.
+    """
+    stacks = [list(stack) for stack in stacks]
+    removed = []
+    while True:
+        outside = [keys[stack[0]] if stack else None for stack in stacks]
+        counts = {key: outside.count(key) for key in outside if key}
+        peeled = [
+            i for i, stack in enumerate(stacks)
+            if outside[i] and counts[outside[i]] >= min_repeats and removable[stack[0]]
+        ]
+        if not peeled:
+            return removed
+        for i in peeled:
+            removed.append(stacks[i].pop(0))
+
+
+class TestPeelRepeatingLayers(unittest.TestCase):
+
+    def test_headers(self):
+        """
+        Repeating elements are peeled layer by layer, non-removable and empty keys stop the peeling of a stack.
+        """
+        keys = ['header', 'header', 'header', 'header', 'subheader', 'subheader', 'subheader', 'title', 'title',
+                'title', 'text 1', 'text 2', 'text 3', None, 'text 4']
+        removable = [True] * len(keys)
+        removable[7] = removable[8] = False
+        stacks = [[0, 4, 7, 10], [1, 5, 8, 11], [2, 6, 9, 12], [3, 13, 14]]
+        removed = utils.peel_repeating_layers(stacks, keys, removable)
+        self.assertEqual(sorted(removed), [0, 1, 2, 3, 4, 5, 6, 9])
+
+    def test_min_repeats(self):
+        keys = {'a': 'x', 'b': 'x', 'c': 'y', 'd': 'y'}
+        removable = dict.fromkeys(keys, True)
+        self.assertEqual(utils.peel_repeating_layers([['a', 'c'], ['b', 'd']], keys, removable), [])
+        self.assertEqual(
+            sorted(utils.peel_repeating_layers([['a', 'c'], ['b', 'd']], keys, removable, min_repeats=2)),
+            ['a', 'b', 'c', 'd']
+        )
+
+    def test_same_as_one_by_one(self):
+        random.seed(0)
+        for _ in range(200):
+            n_elements = random.randrange(1, 60)
+            keys = [random.choice(['a', 'b', 'c', 'd', '', None]) for _ in range(n_elements)]
+            removable = [random.random() > 0.1 for _ in range(n_elements)]
+            elements = list(range(n_elements))
+            random.shuffle(elements)
+            cuts = sorted(random.randrange(n_elements + 1) for _ in range(random.randrange(1, 8)))
+            stacks = [elements[i:j] for i, j in zip([0] + cuts, cuts + [n_elements])]
+            min_repeats = random.choice([2, 3])
+
+            self.assertEqual(
+                sorted(utils.peel_repeating_layers(stacks, keys, removable, min_repeats=min_repeats)),
+                sorted(peel_repeating_layers_one_by_one(stacks, keys, removable, min_repeats=min_repeats))
+            )
@@ -1,37 +1,47 @@
 # main.py for DREF_PARSETAG
 
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Query, HTTPException, BackgroundTasks
 from fastapi import File, UploadFile
 from typing import Optional
 from importlib import resources
-import io
-from enum import Enum
+from types import MappingProxyType
 
 from dref_parsing.parser_utils import *
+from dref_parsing.tracing import add_tracing, span
+from dref_parsing.uploads import add_upload_limit, check_pdf_upload, ExceptionNotPDF, ExceptionTooManyPages
+from dref_parsing.outputs import OutputFormat, output_response
 from dref_tagging.prediction import predict_tags_any_length
 
 app = FastAPI()
+add_tracing(app)
+add_upload_limit(app)
 
-# This Enum class allows us to see a dropdown menu with possible choices
-class OuputFormat(str, Enum):
-    json = "json"
-    csv = "csv"
+# Dimension of each Subdimension, from DREF_spec.csv of dref_tagging.
+# The file is read once into a read-only dict, reload_DREF_spec reads it again
+no_Dimension = 'ERROR: No Dimension matches this Subdimension :('
 
+def load_DREF_spec():
+    with resources.path("dref_tagging.config", "DREF_spec.csv") as DREF_spec_file:
+        spec = pd.read_csv(DREF_spec_file)
+    return MappingProxyType(dict(zip(spec['Subdimension'], spec['Dimension'])))
+
+DREF_Dimensions = load_DREF_spec()
+
+def reload_DREF_spec():
+    global DREF_Dimensions
+    DREF_Dimensions = load_DREF_spec()
 
-# Once Subdimension is found, this function helps select the corresponding Dimension
-def get_Dimension_from_Subdimension(subdim, spec):
-    if subdim in list(spec.index):
-        return spec.loc[subdim,'Dimension']
-    return 'ERROR: No Dimension matches this Subdimension :('
+# Once Subdimensions are found, this function helps select the corresponding Dimensions
+def get_Dimensions_from_Subdimensions(subdims):
+    return subdims.map(DREF_Dimensions).fillna(no_Dimension)
 
 
 
 # ------------------------------------------------------
 # Main function for Parsing+Tagging
 @app.post("/parse_and_tag/{output_format}")
-async def parse_and_tag(output_format: OuputFormat, 
-    pdf_file: Optional[bytes] = File(None, 
+async def parse_and_tag(output_format: OutputFormat, 
+    pdf_file: Optional[UploadFile] = File(None, 
               description='Optional input of PDF file. If given, overwrites MDR code'), 
     Appeal_code: str = Query(
         'MDRDO013',
@@ -45,7 +55,8 @@ async def parse_and_tag(output_format: OuputFormat,
     <b>Output</b>:  
     &nbsp;&nbsp; a list of excerpts extracted from the PDF with its features: 'Learning', 'DREF_Sector',  
     &nbsp;&nbsp; and global features: 'Hazard', 'Country', 'Date', 'Region', 'Appeal code'.  
-    &nbsp;&nbsp; The output can be given as a dictionary in json format, or as a csv file for download
+    &nbsp;&nbsp; The output can be given as a dictionary in json format, or for download as a csv file,  
+    &nbsp;&nbsp; ndjson (one json record per line), Apache Arrow IPC stream or Parquet file
 
     The app uses IFRC GO API to determine the global features (call 'appeal')  
     and to get the URL of the PDF report (call 'appeal_document')
@@ -55,21 +66,30 @@ async def parse_and_tag(output_format: OuputFormat,
     <li> Appeal code doesn't have a DREF Final Report in IFRC GO appeal database 
     <li> PDF URL for Appeal code was not found using IFRC GO API call appeal_document
     <li> PDF Parsing didn't work
+    <li> Uploaded file is too large (the size and the number of pages are limited) or is not a PDF
     </ul>
     """
 
     # Renaming: In the program we call it 'lead', while IFRC calls it 'Appeal_code'
     lead = Appeal_code 
     
-    # if PDF file is given, lead input is ignored
+    # if PDF file is given, lead input is ignored.
+    # The upload is checked before parsing (its size is limited by add_upload_limit)
     if pdf_file:
         lead = 'Unknown'
+        try:
+            check_pdf_upload(pdf_file.file)
+        except ExceptionNotPDF as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ExceptionTooManyPages as e:
+            raise HTTPException(status_code=413, detail=str(e))
 
     # ---------------------------------------------------------
     # Parsing PDF
     try:
         # excerpts (and other relevant columns)
-        all_parsed = parse_PDF_combined(lead, pdf_file = pdf_file)
+        # the upload is read by the parser from its spooled file, not as bytes in memory
+        all_parsed = parse_PDF_combined(lead, pdf_file = pdf_file.file if pdf_file else None)
     except ExceptionNotInAPI:
         raise HTTPException(status_code=404, 
                             detail=f"{lead} doesn't have a DREF Final Report in IFRC GO appeal database")
@@ -84,15 +104,13 @@ async def parse_and_tag(output_format: OuputFormat,
     # -----------------------------------------------------------
     # Tagging excerpts and cleaning/renaming
 
-    df.loc[:,'Subdimension'] = df['Modified Excerpt'].apply(lambda x: predict_tags_any_length(x)[0])
+    with span('tagging'):
+        df.loc[:,'Subdimension'] = df['Modified Excerpt'].apply(lambda x: predict_tags_any_length(x)[0])
     # Split to "row per tag"
     df = df.explode('Subdimension')
 
-    # Define Dimensions from Subdimensions using a dics from csv file
-    with resources.path("dref_tagging.config", "DREF_spec.csv") as DREF_spec_file:
-        spec = pd.read_csv(DREF_spec_file).set_index('Subdimension')    
-    
-    df['Dimension'] = df['Subdimension'].apply(lambda x: get_Dimension_from_Subdimension(x, spec))     
+    # Define Dimensions from Subdimensions using a dict from csv file
+    df['Dimension'] = get_Dimensions_from_Subdimensions(df['Subdimension'])
     df = df.fillna('Unknown')   
 
     df = df.rename(columns={'lead':'Appeal code','Modified Excerpt':'Excerpt'})
@@ -102,46 +120,31 @@ async def parse_and_tag(output_format: OuputFormat,
     df = df[cols_order]
 
     # -----------------------------------
-    # Return DataFrame as Json or Csv:
-
-    if output_format == 'json':
-        return df.to_dict()
-
-    else: 
-        # prepare csv output
-        stream = io.StringIO()
-        # NB: comma as a separator works OK even if there exist commas in some excerpts 
-        # since pandas is smart to insert quotes where needed
-        df.to_csv(stream, index = False, sep=',')
-
-        response = StreamingResponse(iter([stream.getvalue()]), media_type="text/csv")
-        response.headers["Content-Disposition"] = "attachment; filename=export.csv"
-        return response    
+    # Return DataFrame as Json, or stream it as Csv, NDJson, Arrow or Parquet:
+    return output_response(df, output_format)
 
 
 # *********************************************************************
 
 @app.get("/refresh/")
-async def reload_GO_API_data():
+async def reload_GO_API_data(background_tasks: BackgroundTasks, 
+    full: bool = Query(False, description="Download all GO data again, not only the records changed since the last sync")):
     """
-    Reload data from GO database.  
+    Sync data from GO database.  
     This may be needed since the Parse-and-Tag app downloads data from GO
     the first time it runs and never checks for updates.  
-    To refresh data from GO, run this app.
+    To refresh data from GO, run this app.  
+    The sync runs in background and downloads only the records changed 
+    since the last sync (all records if full=true).
+    Records deleted in GO are removed only by a full sync (full=true).
+    The output tells the result of the previous sync.  
+    Dimensions of tags (DREF_spec.csv) are read again too.
     """    
-    try:
-        initialize_apdo(refresh=True)
-        initialize_aadf(refresh=True)
-
-        # NB: we need to do import again, 
-        # otherwise updated apdo, aadf won't be accessible here
-        # (even though they got updated in parser_utils)
-        from dref_parsing.parser_utils import apdo, aadf
-        output = f'GO API Reload: {len(aadf)} items in appeal, {len(apdo)} items in appeal_documents'
-        output += ' (only DREF Final Reports are selected)'
-    except:
-        raise HTTPException(status_code=500, detail="Error while accessing GO API data")
-    return output 
+    reload_DREF_spec()
+    if GO_sync_status.running:
+        return 'GO API sync is already running. ' + GO_API_data_summary()
+    background_tasks.add_task(sync_GO_API_data, full=full)
+    return 'GO API sync started. ' + GO_API_data_summary()
 
     # Command to start API:
     # uvicorn main:app --reload
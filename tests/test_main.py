@@ -0,0 +1,60 @@
+import os
+import tempfile
+import contextlib
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+try:
+    import main
+except ImportError:
+    # the PARSE+TAG app needs dref_tagging with its model (torch, transformers)
+    main = None
+
+
+@unittest.skipIf(main is None, 'PARSE+TAG app can not be imported (dref_tagging is not installed)')
+class TestDREFspec(unittest.TestCase):
+
+    def setUp(self):
+        # the spec of dref_tagging is read again after each test
+        self.addCleanup(main.reload_DREF_spec)
+
+    def use_spec(self, spec):
+        "Makes load_DREF_spec read spec (a df) instead of DREF_spec.csv of dref_tagging"
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        spec_file = os.path.join(tmpdir.name, 'DREF_spec.csv')
+        spec.to_csv(spec_file, index=False)
+
+        @contextlib.contextmanager
+        def path(package, resource):
+            yield spec_file
+
+        patch = mock.patch.object(main.resources, 'path', side_effect=path)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_dimensions_from_subdimensions(self):
+        subdimension, dimension = next(iter(main.DREF_Dimensions.items()))
+        dimensions = main.get_Dimensions_from_Subdimensions(pd.Series([subdimension, 'Unknown subdimension', None]))
+        self.assertEqual(dimensions.to_list(), [dimension, main.no_Dimension, main.no_Dimension])
+
+    def test_spec_is_read_only(self):
+        with self.assertRaises(TypeError):
+            main.DREF_Dimensions['Subdimension'] = 'Dimension'
+
+    def test_reload(self):
+        self.use_spec(pd.DataFrame({'Subdimension': ['Cash', 'Shelter'], 'Dimension': ['Assistance', 'Sectors']}))
+        subdims = pd.Series(['Shelter', 'Cash', 'Health'])
+        self.assertNotEqual(main.get_Dimensions_from_Subdimensions(subdims).to_list(),
+                            ['Sectors', 'Assistance', main.no_Dimension])
+
+        main.reload_DREF_spec()
+        self.assertEqual(dict(main.DREF_Dimensions), {'Cash': 'Assistance', 'Shelter': 'Sectors'})
+        self.assertEqual(main.get_Dimensions_from_Subdimensions(subdims).to_list(),
+                         ['Sectors', 'Assistance', main.no_Dimension])
+
+
+if __name__ == '__main__':
+    unittest.main()